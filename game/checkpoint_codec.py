@@ -0,0 +1,275 @@
+# game/checkpoint_codec.py
+"""Binary encoding of Simulation checkpoints.
+
+A checkpoint in memory is the dict built by Simulation._make_checkpoint
+(schema version 1), optionally with a mid-wave "snapshot" (see
+Simulation.snapshot). Stored, it is one bytes value of fixed-layout
+little-endian struct records:
+
+    header    magic b"GDCK", format version
+    strings   every tower/enemy kind and mode name once; records refer to them by index
+    body      level, mode, lives, gold, score, kills, wave counters, selected tower
+    towers    kind, gx, gy, cooldown_left per tower
+    snapshot  optional: scalar state, message, towers, enemies, bullets
+
+Snapshot towers are stored without their coverage intervals (most of a
+tower's size); they decode as None and Simulation.restore recomputes them.
+
+decode() always returns a version 1 dict, and load() also accepts the
+version 1 dicts that older saves stored directly. encode_snapshot() and
+decode_snapshot() store a snapshot on its own (string table and snapshot
+record, no header), e.g. for replay keyframes.
+"""
+import struct
+from typing import Any, Dict, List, Optional
+
+MAGIC = b"GDCK"
+FORMAT_VERSION = 2  # version 1 is the plain dict itself
+
+_HEAD = struct.Struct("<4sB")
+_COUNT = struct.Struct("<I")
+_LEN8 = struct.Struct("<B")
+_LEN16 = struct.Struct("<H")
+# level_id, mode, lives, gold, score, kills, waves_cleared, current_wave_number, selected_tower, has_snapshot
+_BODY = struct.Struct("<HBiidIHHBB")
+_TOWER = struct.Struct("<BBBd")  # kind, gx, gy, cooldown_left
+
+# Simulation.SNAPSHOT_FIELDS of snapshot version 1 except msg, which follows as UTF-8:
+# mode, lives, gold, score, kills, waves_cleared, current_wave_number, campaign_completed,
+# selected_tower, wave_in_progress, spawn_timer, spawned_this_wave, enemies_this_wave,
+# victory_choice_active, lost, tick
+_SNAP_STATE = struct.Struct("<BiidIHHBBBdIIBBq")
+_SNAP_MSG_AT = 14  # index of msg in the snapshot state tuple
+_SNAP_TOWER = struct.Struct("<BBBddid")  # kind, gx, gy, range_px, fire_cd, dmg, cooldown_left
+_ENEMY = struct.Struct("<BdddiiIBd")  # kind, x, y, speed, hp, max_hp, path_index, alive, dist
+_BULLET = struct.Struct("<ddddiB")  # x, y, vx, vy, dmg, alive
+
+SNAPSHOT_VERSION = 1
+
+
+class CheckpointFormatError(ValueError):
+    pass
+
+
+# ----- version 1 dicts -----
+
+def migrate(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    """A version 1 dict with every field present and of the type _make_checkpoint writes."""
+    cp = {
+        "version": 1,
+        "level_id": int(checkpoint.get("level_id", 1)),
+        "mode": str(checkpoint.get("mode", "campaign")),
+        "lives": int(checkpoint.get("lives", 15)),
+        "gold": int(checkpoint.get("gold", 150)),
+        "score": float(checkpoint.get("score", 0.0)),
+        "kills": int(checkpoint.get("kills", 0)),
+        "waves_cleared": int(checkpoint.get("waves_cleared", 0)),
+        "current_wave_number": int(checkpoint.get("current_wave_number", 1)),
+        "selected_tower": str(checkpoint.get("selected_tower", "basic")),
+        "towers": [{
+            "kind": str(t.get("kind", "basic")),
+            "gx": int(t.get("gx", 0)),
+            "gy": int(t.get("gy", 0)),
+            "cooldown_left": float(t.get("cooldown_left", 0.0)),
+        } for t in checkpoint.get("towers", [])],
+    }
+    if checkpoint.get("snapshot") is not None:
+        cp["snapshot"] = checkpoint["snapshot"]
+    return cp
+
+
+def load(stored) -> Optional[Dict[str, Any]]:
+    """What PlayerProfile.saved_game holds (None, encoded bytes or an old dict) as a version 1 dict."""
+    if stored is None:
+        return None
+    if isinstance(stored, (bytes, bytearray)):
+        return decode(stored)
+    return migrate(stored)
+
+
+# ----- encoding -----
+
+class Strings:
+    def __init__(self):
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __call__(self, name: str) -> int:
+        i = self._index.get(name)
+        if i is None:
+            i = len(self.names)
+            if i > 255:
+                raise CheckpointFormatError("more than 256 distinct names")
+            self._index[name] = i
+            self.names.append(name)
+        return i
+
+
+def pack_text(parts: list, fmt: struct.Struct, text: str):
+    raw = text.encode("utf-8")
+    parts.append(fmt.pack(len(raw)))
+    parts.append(raw)
+
+
+def pack_records(fmt: struct.Struct, rows) -> bytes:
+    """Many records in one pack() call: much faster than one call per record."""
+    if not rows:
+        return b""
+    return struct.pack("<" + fmt.format[1:] * len(rows), *[v for row in rows for v in row])
+
+
+def encode(checkpoint: Dict[str, Any]) -> bytes:
+    cp = migrate(checkpoint)
+    name = Strings()
+    snap = cp.get("snapshot")
+
+    parts = [_BODY.pack(cp["level_id"], name(cp["mode"]), cp["lives"], cp["gold"], cp["score"], cp["kills"],
+                        cp["waves_cleared"], cp["current_wave_number"], name(cp["selected_tower"]),
+                        snap is not None)]
+    parts.append(_COUNT.pack(len(cp["towers"])))
+    parts.append(pack_records(_TOWER, [(name(t["kind"]), t["gx"], t["gy"], t["cooldown_left"]) for t in cp["towers"]]))
+    if snap is not None:
+        _encode_snapshot(parts, snap, name)
+
+    head = [_HEAD.pack(MAGIC, FORMAT_VERSION), _LEN8.pack(len(name.names))]
+    for s in name.names:
+        pack_text(head, _LEN8, s)
+    return b"".join(head + parts)
+
+
+def encode_snapshot(snap: Dict[str, Any]) -> bytes:
+    name = Strings()
+    parts: list = []
+    _encode_snapshot(parts, snap, name)
+    head = [_LEN8.pack(len(name.names))]
+    for s in name.names:
+        pack_text(head, _LEN8, s)
+    return b"".join(head + parts)
+
+
+def _encode_snapshot(parts: list, snap: Dict[str, Any], name: Strings):
+    if snap.get("snapshot") != SNAPSHOT_VERSION:
+        raise CheckpointFormatError(f"unsupported snapshot version {snap.get('snapshot')}")
+    state = list(snap["state"])
+    msg = state.pop(_SNAP_MSG_AT)
+    state[0] = name(state[0])  # mode
+    state[8] = name(state[8])  # selected_tower
+    parts.append(_LEN16.pack(int(snap["level_id"])))
+    parts.append(_SNAP_STATE.pack(*state))
+    pack_text(parts, _LEN16, msg)
+
+    parts.append(_COUNT.pack(len(snap["towers"])))
+    parts.append(pack_records(_SNAP_TOWER, [(name(t[0]),) + tuple(t[1:7]) for t in snap["towers"]]))
+
+    parts.append(_COUNT.pack(len(snap["enemies"])))
+    parts.append(pack_records(_ENEMY, [(name(en[0]),) + tuple(en[1:]) for en in snap["enemies"]]))
+    parts.append(_COUNT.pack(len(snap["bullets"])))
+    parts.append(pack_records(_BULLET, snap["bullets"]))
+
+
+# ----- decoding -----
+
+class Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def read(self, fmt: struct.Struct) -> tuple:
+        try:
+            values = fmt.unpack_from(self.data, self.pos)
+        except struct.error as e:
+            raise CheckpointFormatError(f"truncated checkpoint: {e}") from None
+        self.pos += fmt.size
+        return values
+
+    def records(self, fmt: struct.Struct) -> list:
+        n, = self.read(_COUNT)
+        end = self.pos + n * fmt.size
+        if end > len(self.data):
+            raise CheckpointFormatError("truncated checkpoint")
+        values = list(fmt.iter_unpack(self.data[self.pos:end]))
+        self.pos = end
+        return values
+
+    def raw(self, n: int) -> bytes:
+        data = bytes(self.data[self.pos:self.pos + n])
+        if len(data) != n:
+            raise CheckpointFormatError("truncated checkpoint")
+        self.pos += n
+        return data
+
+    def text(self, fmt: struct.Struct) -> str:
+        n, = self.read(fmt)
+        return self.raw(n).decode("utf-8")
+
+
+def decode(data: bytes) -> Dict[str, Any]:
+    r = Reader(data)
+    magic, version = r.read(_HEAD)
+    if magic != MAGIC:
+        raise CheckpointFormatError("not an encoded checkpoint")
+    if version != FORMAT_VERSION:
+        raise CheckpointFormatError(f"unsupported checkpoint format {version}")
+
+    n, = r.read(_LEN8)
+    names = [r.text(_LEN8) for _ in range(n)]
+    try:
+        return _decode_body(r, names)
+    except IndexError:
+        raise CheckpointFormatError("name index out of range") from None
+
+
+def decode_snapshot(data: bytes) -> Dict[str, Any]:
+    r = Reader(data)
+    n, = r.read(_LEN8)
+    names = [r.text(_LEN8) for _ in range(n)]
+    try:
+        return _decode_snapshot(r, names)
+    except IndexError:
+        raise CheckpointFormatError("name index out of range") from None
+
+
+def _decode_body(r: Reader, names: List[str]) -> Dict[str, Any]:
+    (level_id, mode, lives, gold, score, kills, waves_cleared, current_wave_number,
+     selected_tower, has_snapshot) = r.read(_BODY)
+    cp = {
+        "version": 1,
+        "level_id": level_id,
+        "mode": names[mode],
+        "lives": lives,
+        "gold": gold,
+        "score": score,
+        "kills": kills,
+        "waves_cleared": waves_cleared,
+        "current_wave_number": current_wave_number,
+        "selected_tower": names[selected_tower],
+        "towers": [{"kind": names[kind], "gx": gx, "gy": gy, "cooldown_left": cooldown_left}
+                   for kind, gx, gy, cooldown_left in r.records(_TOWER)],
+    }
+    if has_snapshot:
+        cp["snapshot"] = _decode_snapshot(r, names)
+    return cp
+
+
+def _decode_snapshot(r: Reader, names: List[str]) -> Dict[str, Any]:
+    level_id, = r.read(_LEN16)
+    state = list(r.read(_SNAP_STATE))
+    state[0] = names[state[0]]
+    state[8] = names[state[8]]
+    for i in (7, 9, 13, 14):  # campaign_completed, wave_in_progress, victory_choice_active, lost
+        state[i] = bool(state[i])
+    state.insert(_SNAP_MSG_AT, r.text(_LEN16))
+
+    towers = tuple((names[kind], gx, gy, range_px, fire_cd, dmg, cooldown_left, None)
+                   for kind, gx, gy, range_px, fire_cd, dmg, cooldown_left in r.records(_SNAP_TOWER))
+    enemies = tuple((names[kind], x, y, speed, hp, max_hp, path_index, bool(alive), dist)
+                    for kind, x, y, speed, hp, max_hp, path_index, alive, dist in r.records(_ENEMY))
+    bullets = tuple((x, y, vx, vy, dmg, bool(alive)) for x, y, vx, vy, dmg, alive in r.records(_BULLET))
+    return {
+        "snapshot": SNAPSHOT_VERSION,
+        "level_id": level_id,
+        "state": tuple(state),
+        "towers": towers,
+        "enemies": enemies,
+        "bullets": bullets,
+    }
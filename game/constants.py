@@ -8,6 +8,8 @@ GRID_H = 12
 CELL = 48
 GRID_OFFSET = (24, 24)
 
+TICK_RATE = 60
+
 COLORS = {
     "bg": (18, 20, 26),
     "grid_bg": (28, 32, 40),
@@ -0,0 +1,70 @@
+# game/path.py
+import math
+from bisect import bisect_right
+from typing import List, Sequence, Tuple
+
+
+class PathTable:
+    """Cumulative arc-length table for a level's polyline path.
+
+    An enemy's progress is one scalar `s` (pixels walked from the start).
+    cum[i] is the distance at waypoint i, and segment i runs from waypoint i
+    to waypoint i + 1 along the unit direction (ux[i], uy[i]).
+    """
+
+    def __init__(self, points: Sequence):
+        self.xs: List[float] = [float(p[0]) for p in points]
+        self.ys: List[float] = [float(p[1]) for p in points]
+        self.cum: List[float] = [0.0]
+        self.ux: List[float] = []
+        self.uy: List[float] = []
+        for i in range(len(points) - 1):
+            dx = self.xs[i + 1] - self.xs[i]
+            dy = self.ys[i + 1] - self.ys[i]
+            seg = math.hypot(dx, dy)
+            self.cum.append(self.cum[-1] + seg)
+            self.ux.append(dx / seg if seg > 0 else 0.0)
+            self.uy.append(dy / seg if seg > 0 else 0.0)
+        self.length: float = self.cum[-1]
+        self.segments: int = len(self.ux)
+
+    def segment_at(self, s: float) -> int:
+        """Index of the segment containing distance `s` (clamped to the path)."""
+        i = bisect_right(self.cum, s) - 1
+        return min(max(i, 0), max(self.segments - 1, 0))
+
+    def point_on(self, i: int, s: float) -> Tuple[float, float]:
+        """Position at distance `s`, given that it lies on segment `i`."""
+        if self.segments == 0:
+            return self.xs[0], self.ys[0]
+        t = s - self.cum[i]
+        return self.xs[i] + self.ux[i] * t, self.ys[i] + self.uy[i] * t
+
+    def point_at(self, s: float) -> Tuple[float, float]:
+        return self.point_on(self.segment_at(s), s)
+
+    def coverage(self, cx: float, cy: float, r: float) -> List[Tuple[float, float]]:
+        """Sorted, merged [s0, s1] intervals of the path lying within `r` of (cx, cy)."""
+        out: List[Tuple[float, float]] = []
+        for i in range(self.segments):
+            seg_len = self.cum[i + 1] - self.cum[i]
+            px = self.xs[i] - cx
+            py = self.ys[i] - cy
+            # |p + u*t|^2 <= r^2  ->  t^2 + 2*b*t + c <= 0
+            b = px * self.ux[i] + py * self.uy[i]
+            c = px * px + py * py - r * r
+            disc = b * b - c
+            if disc < 0:
+                continue
+            root = math.sqrt(disc)
+            t0 = max(-b - root, 0.0)
+            t1 = min(-b + root, seg_len)
+            if t0 > t1:
+                continue
+            s0 = self.cum[i] + t0
+            s1 = self.cum[i] + t1
+            if out and s0 <= out[-1][1]:
+                out[-1] = (out[-1][0], max(out[-1][1], s1))
+            else:
+                out.append((s0, s1))
+        return out
@@ -0,0 +1,69 @@
+# game/profiling.py
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List
+
+
+class FrameProfiler:
+    """Per-phase timings and entity counts for the last `history` frames.
+
+    The simulation and renderer call add()/count() only when `enabled` is
+    set, so a disabled profiler costs one attribute check per update/draw.
+    A frame is everything recorded between two end_frame() calls; with a
+    fixed timestep that can be several simulation ticks.
+    """
+
+    PHASES = ("wave", "enemies", "index", "towers", "bullets", "compact", "draw")
+
+    def __init__(self, history: int = 240):
+        self.enabled = False
+        self.frames: Deque[Dict[str, float]] = deque(maxlen=history)
+        self.current: Dict[str, float] = {}
+        self._last_frame_end = None
+        self._blocks_at_frame_start = 0
+
+    def enable(self, on: bool = True):
+        self.enabled = on
+        self.current = {}
+        self._last_frame_end = None
+        self._blocks_at_frame_start = sys.getallocatedblocks()
+
+    def add(self, phase: str, seconds: float):
+        self.current[phase] = self.current.get(phase, 0.0) + seconds
+
+    def count(self, name: str, n: int):
+        self.current[name] = self.current.get(name, 0) + n
+
+    def end_frame(self):
+        """Close the current frame and add wall frame time and net allocated blocks."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        frame = self.current
+        if self._last_frame_end is not None:
+            frame["frame"] = now - self._last_frame_end
+        blocks = sys.getallocatedblocks()
+        frame["alloc_blocks"] = blocks - self._blocks_at_frame_start
+        self._blocks_at_frame_start = blocks
+        self._last_frame_end = now
+        self.frames.append(frame)
+        self.current = {}
+
+    def samples(self, key: str) -> List[float]:
+        return [f[key] for f in self.frames if key in f]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Mean/max per phase in ms, plus mean/max of every count, over the history."""
+        out: Dict[str, Dict[str, float]] = {}
+        keys = set()
+        for f in self.frames:
+            keys.update(f)
+        for key in sorted(keys):
+            vals = self.samples(key)
+            if key in self.PHASES or key == "frame":
+                vals = [v * 1000.0 for v in vals]
+                out[key] = {"mean_ms": sum(vals) / len(vals), "max_ms": max(vals)}
+            else:
+                out[key] = {"mean": sum(vals) / len(vals), "max": max(vals)}
+        return out
@@ -0,0 +1,298 @@
+# game/replay.py
+"""Recorded games: the starting state, every player input and periodic keyframes.
+
+Simulation has no randomness and steps with a fixed dt, so the state a game
+started from plus every apply_input() action tagged with its tick replays
+it exactly; the starting keyframe plays the part of a seed. A keyframe (the
+full snapshot) is also taken every `keyframe_every` ticks, so seeking
+restores keyframe (tick - start) // keyframe_every and re-simulates at most
+that many ticks.
+
+Encoded layout (little-endian struct records; everything after the header
+is zlib-compressed, which takes keyframes to about a third):
+
+    header     magic b"GDRP", format version
+    strings    tower kind and mode names once; records refer to them by index
+    game       level, mode, tick rate, keyframe interval, start/end tick, final score, kills, waves, lost
+    inputs     tick offset, op, two arguments per input
+    keyframes  tick offset, inputs applied so far, checkpoint_codec.encode_snapshot() bytes
+"""
+import bisect
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+from game import checkpoint_codec
+from game.constants import TICK_RATE
+from game.rewind import RewindBuffer
+from game.simulation import Simulation
+from game.timestep import FixedTimestep
+
+MAGIC = b"GDRP"
+FORMAT_VERSION = 1
+
+KEYFRAME_EVERY = 10 * TICK_RATE
+
+_HEAD = struct.Struct("<4sB")
+_COUNT = struct.Struct("<I")
+_LEN8 = struct.Struct("<B")
+# level_id, mode, tick_rate, keyframe_every, start_tick, end_tick, score, kills, waves_cleared, lost
+_GAME = struct.Struct("<HBHIqqdIHB")
+_INPUT = struct.Struct("<IBBB")  # tick - start_tick, op, a, b
+_KEYFRAME = struct.Struct("<III")  # tick - start_tick, inputs applied, snapshot length
+
+_OPS = ("select", "build", "start", "endless")
+_OP_CODES = {name: i for i, name in enumerate(_OPS)}
+
+Input = Tuple[int, tuple]  # (tick, action) as passed to Simulation.on_input
+Keyframe = Tuple[int, int, bytes]  # (tick, inputs applied, encoded snapshot)
+
+
+class ReplayFormatError(checkpoint_codec.CheckpointFormatError):
+    pass
+
+
+class Replay:
+    def __init__(self, level_id: int, mode: str, start_tick: int, tick_rate: int = TICK_RATE,
+                 keyframe_every: int = KEYFRAME_EVERY):
+        self.level_id = int(level_id)
+        self.mode = str(mode)
+        self.tick_rate = int(tick_rate)
+        self.keyframe_every = int(keyframe_every)
+        self.start_tick = int(start_tick)
+        self.end_tick = int(start_tick)
+        self.inputs: List[Input] = []
+        self.keyframes: List[Keyframe] = []
+        # final state, to check a replay against
+        self.score = 0.0
+        self.kills = 0
+        self.waves_cleared = 0
+        self.lost = False
+
+    def seconds(self) -> float:
+        return (self.end_tick - self.start_tick) / self.tick_rate
+
+    def keyframe_at(self, tick: int) -> Keyframe:
+        """The newest keyframe at or before `tick`."""
+        i = min(max(0, tick - self.start_tick) // self.keyframe_every, len(self.keyframes) - 1)
+        while i > 0 and self.keyframes[i][0] > tick:
+            i -= 1
+        return self.keyframes[i]
+
+    # ----- encoding -----
+
+    def encode(self) -> bytes:
+        name = checkpoint_codec.Strings()
+        parts = [_GAME.pack(self.level_id, name(self.mode), self.tick_rate, self.keyframe_every, self.start_tick,
+                            self.end_tick, self.score, self.kills, self.waves_cleared, self.lost)]
+        rows = []
+        for tick, action in self.inputs:
+            op = action[0]
+            if op == "select":
+                a, b = name(action[1]), 0
+            elif op == "build":
+                a, b = action[1], action[2]
+            else:
+                a = b = 0
+            rows.append((tick - self.start_tick, _OP_CODES[op], a, b))
+        parts.append(_COUNT.pack(len(rows)))
+        parts.append(checkpoint_codec.pack_records(_INPUT, rows))
+        parts.append(_COUNT.pack(len(self.keyframes)))
+        for tick, applied, data in self.keyframes:
+            parts.append(_KEYFRAME.pack(tick - self.start_tick, applied, len(data)))
+            parts.append(data)
+
+        head = [_LEN8.pack(len(name.names))]
+        for s in name.names:
+            checkpoint_codec.pack_text(head, _LEN8, s)
+        return _HEAD.pack(MAGIC, FORMAT_VERSION) + zlib.compress(b"".join(head + parts))
+
+    @classmethod
+    def decode(cls, data: bytes) -> "Replay":
+        try:
+            magic, version = _HEAD.unpack_from(data)
+        except struct.error:
+            raise ReplayFormatError("not a replay") from None
+        if magic != MAGIC:
+            raise ReplayFormatError("not a replay")
+        if version != FORMAT_VERSION:
+            raise ReplayFormatError(f"unsupported replay format {version}")
+        try:
+            body = zlib.decompress(data[_HEAD.size:])
+        except zlib.error as e:
+            raise ReplayFormatError(f"corrupt replay: {e}") from None
+        r = checkpoint_codec.Reader(body)
+        n, = r.read(_LEN8)
+        names = [r.text(_LEN8) for _ in range(n)]
+        try:
+            return cls._decode_body(r, names)
+        except IndexError:
+            raise ReplayFormatError("name index out of range") from None
+
+    @classmethod
+    def _decode_body(cls, r: checkpoint_codec.Reader, names: List[str]) -> "Replay":
+        (level_id, mode, tick_rate, keyframe_every, start_tick, end_tick, score, kills, waves_cleared,
+         lost) = r.read(_GAME)
+        replay = cls(level_id, names[mode], start_tick, tick_rate, keyframe_every)
+        replay.end_tick = end_tick
+        replay.score, replay.kills, replay.waves_cleared, replay.lost = score, kills, waves_cleared, bool(lost)
+        for offset, op, a, b in r.records(_INPUT):
+            op = _OPS[op]
+            if op == "select":
+                action = (op, names[a])
+            elif op == "build":
+                action = (op, a, b)
+            else:
+                action = (op,)
+            replay.inputs.append((start_tick + offset, action))
+        n, = r.read(_COUNT)
+        for _ in range(n):
+            offset, applied, size = r.read(_KEYFRAME)
+            data = r.raw(size)
+            replay.keyframes.append((start_tick + offset, applied, data))
+        if not replay.keyframes:
+            raise ReplayFormatError("replay has no keyframes")
+        return replay
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.encode())
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        with open(path, "rb") as f:
+            return cls.decode(f.read())
+
+
+class ReplayRecorder:
+    """Records a Simulation from its current state until finish().
+
+    Hooks the simulation's on_input and on_tick; nothing else about the
+    game changes, and a keyframe costs one snapshot every `keyframe_every` ticks.
+    """
+
+    def __init__(self, sim: Simulation, keyframe_every: int = KEYFRAME_EVERY):
+        self.sim = sim
+        self.replay = Replay(sim.level_id, sim.mode, sim.tick, keyframe_every=keyframe_every)
+        self._keyframe(sim)
+        sim.on_input = self._input
+        sim.on_tick = self._tick
+
+    def _keyframe(self, sim: Simulation):
+        snap = checkpoint_codec.encode_snapshot(sim.snapshot())
+        self.replay.keyframes.append((sim.tick, len(self.replay.inputs), snap))
+
+    def _input(self, tick: int, action: tuple):
+        self.replay.inputs.append((tick, action))
+
+    def _tick(self, sim: Simulation):
+        if sim.tick > self.replay.start_tick and (sim.tick - self.replay.start_tick) % self.replay.keyframe_every == 0:
+            self._keyframe(sim)
+
+    def finish(self) -> Replay:
+        sim = self.sim
+        sim.on_input = None
+        sim.on_tick = None
+        replay = self.replay
+        replay.end_tick = sim.tick
+        replay.score, replay.kills, replay.waves_cleared, replay.lost = (
+            float(sim.score), int(sim.kills), int(sim.waves_cleared), bool(sim.lost))
+        return replay
+
+
+class ReplayPlayer:
+    """Plays a Replay on a Simulation (or a CampusDefenseEngine to watch it).
+
+    advance() plays frame time at `speed` for a render loop; seek() jumps to
+    any tick through the nearest keyframe; rewind() jumps back through the
+    snapshots of the last few seconds played; run_to_end() fast-forwards headless.
+    """
+
+    MAX_STEPS = 64  # ticks per advance(), i.e. the top speed at a low frame rate
+
+    def __init__(self, replay: Replay, sim: Simulation):
+        if sim.level_id != replay.level_id:
+            raise ValueError(f"replay is for level {replay.level_id}, not {sim.level_id}")
+        self.replay = replay
+        self.sim = sim
+        self.speed = 1.0
+        self.paused = False
+        self.dt = 1.0 / replay.tick_rate
+        self.timestep = FixedTimestep(replay.tick_rate, max_steps=self.MAX_STEPS)
+        self._next = 0  # index of the next input to apply
+        self._input_ticks = [tick for tick, _ in replay.inputs]
+        self.history = RewindBuffer()
+        self._restore(replay.keyframes[0])
+
+    @property
+    def done(self) -> bool:
+        return self.sim.tick >= self.replay.end_tick or self.sim.lost
+
+    def _restore(self, keyframe: Keyframe):
+        tick, applied, data = keyframe
+        self.sim.restore(checkpoint_codec.decode_snapshot(data))
+        self._next = applied
+        self._apply_due()
+        # the replay is deterministic, so older snapshots still hold
+        self.history.truncate(tick)
+        self.history.record(self.sim)
+
+    def _apply_due(self):
+        inputs = self.replay.inputs
+        while self._next < len(inputs) and inputs[self._next][0] <= self.sim.tick:
+            self.sim.apply_input(inputs[self._next][1])
+            self._next += 1
+
+    def _step(self, dt: float):
+        if self.done:
+            return
+        self.sim.update(self.dt)
+        self._apply_due()
+        self.history.record(self.sim)
+
+    def advance(self, frame_dt: float) -> int:
+        """Play `frame_dt * speed` seconds of the game in whole ticks. Returns the ticks played."""
+        if self.paused or self.done:
+            return 0
+        return self.timestep.advance(frame_dt * self.speed, self._step)
+
+    def seek(self, tick: int) -> int:
+        """Jump to `tick` (clamped to the replay). Returns the ticks simulated to get there."""
+        tick = max(self.replay.start_tick, min(int(tick), self.replay.end_tick))
+        keyframe = self.replay.keyframe_at(tick)
+        if not keyframe[0] <= self.sim.tick <= tick:  # otherwise stepping on from here is shorter
+            self._restore(keyframe)
+        self.timestep.reset()
+        ticks = 0
+        while self.sim.tick < tick and not self.sim.lost:
+            self._step(self.dt)
+            ticks += 1
+        return ticks
+
+    def rewind(self, seconds: float) -> int:
+        """Jump `seconds` back, from the rewind buffer if it reaches that far. Returns the ticks simulated."""
+        tick = self.sim.tick - int(round(seconds * self.replay.tick_rate))
+        if self.history.rewind(self.sim, seconds):
+            # snapshots are taken after the tick's inputs were applied
+            self._next = bisect.bisect_right(self._input_ticks, self.sim.tick)
+        return self.seek(tick)
+
+    def run_to_end(self) -> int:
+        """Fast-forward headless from here to the end, simulating every tick. Returns the ticks simulated.
+
+        Unlike seek() this never skips ahead to a keyframe, so from the start
+        it checks that the inputs alone reproduce the game (see matches()).
+        """
+        ticks = 0
+        while not self.done:
+            self._step(self.dt)
+            ticks += 1
+        return ticks
+
+    def matches(self) -> Optional[bool]:
+        """At the end: whether the final score, kills, waves and outcome are the recorded ones."""
+        if not self.done:
+            return None
+        sim, replay = self.sim, self.replay
+        return (float(sim.score), int(sim.kills), int(sim.waves_cleared), bool(sim.lost)) == (
+            replay.score, replay.kills, replay.waves_cleared, replay.lost)
@@ -0,0 +1,55 @@
+# game/rewind.py
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from game.constants import TICK_RATE
+from game.simulation import Simulation
+
+
+class RewindBuffer:
+    """Ring of Simulation snapshots taken every `interval` ticks.
+
+    Call record() once per tick (it only snapshots when `interval` ticks
+    have passed); rewind() restores the newest snapshot at least `seconds`
+    old. With the defaults that is the last 30 seconds at 1 s resolution,
+    about 30 small tuples-of-tuples.
+    """
+
+    def __init__(self, interval: int = TICK_RATE, capacity: int = 30):
+        self.interval = interval
+        self._snaps: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=capacity)
+
+    def __len__(self) -> int:
+        return len(self._snaps)
+
+    def record(self, sim: Simulation) -> bool:
+        if self._snaps and sim.tick - self._snaps[-1][0] < self.interval:
+            return False
+        self._snaps.append((sim.tick, sim.snapshot()))
+        return True
+
+    def find(self, tick: int) -> Optional[Dict[str, Any]]:
+        """Newest snapshot taken at or before `tick`."""
+        for t, snap in reversed(self._snaps):
+            if t <= tick:
+                return snap
+        return None
+
+    def rewind(self, sim: Simulation, seconds: float) -> bool:
+        """Restore `sim` to the newest snapshot at least `seconds` old; later snapshots are dropped."""
+        target = sim.tick - int(round(seconds * TICK_RATE))
+        snap = self.find(target)
+        if snap is None:
+            return False
+        while self._snaps and self._snaps[-1][1] is not snap:
+            self._snaps.pop()
+        sim.restore(snap)
+        return True
+
+    def truncate(self, tick: int):
+        """Drop the snapshots taken after `tick`, e.g. when the game jumped back past them."""
+        while self._snaps and self._snaps[-1][0] > tick:
+            self._snaps.pop()
+
+    def clear(self):
+        self._snaps.clear()
@@ -0,0 +1,704 @@
+# game/simulation.py
+import copy
+import math
+import time
+import pygame
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from game.constants import GRID_W, GRID_H, CELL, GRID_OFFSET, SCREEN_W, SCREEN_H, TICK_RATE
+from game.path import PathTable
+from game.profiling import FrameProfiler
+from game.spatial import SpatialHash
+from objects.enemies import Enemy
+from objects.projectiles import Bullet
+from objects.towers import Tower
+
+Vec2 = pygame.Vector2
+
+SNAPSHOT_VERSION = 1
+
+# Coverage intervals are solved from the range circle, so an enemy right on a
+# tower's range edge can round to either side of them. Enemies this close
+# (in path px) to an interval end get the plain distance check instead.
+RANGE_EDGE = 1e-3
+
+
+class Simulation:
+    """Display-free game core: waves, towers, enemies, bullets and checkpoints.
+
+    Needs no Surface, fonts or initialised display, so it can be stepped with a
+    fixed dt as fast as the CPU allows. CampusDefenseEngine adds input and
+    rendering on top of it.
+    """
+
+    # scalar state captured by snapshot(), in this order
+    SNAPSHOT_FIELDS = (
+        "mode", "lives", "gold", "score", "kills", "waves_cleared", "current_wave_number", "campaign_completed",
+        "selected_tower", "wave_in_progress", "spawn_timer", "spawned_this_wave", "enemies_this_wave",
+        "victory_choice_active", "msg", "lost", "tick",
+    )
+
+    def __init__(self, level_data: dict, mode: str = "campaign", load_state: Optional[dict] = None,
+                 bounds: Tuple[int, int] = (SCREEN_W, SCREEN_H)):
+        self.w, self.h = bounds
+
+        self.grid_w = GRID_W
+        self.grid_h = GRID_H
+        self.cell = CELL
+        self.grid_offset = GRID_OFFSET
+
+        self.level_data = level_data
+        self.level_id = int(level_data["id"])
+        self.level_name = str(level_data.get("name", f"Level {self.level_id}"))
+        self.path_grid = list(level_data["path_grid"])
+        self.campaign_waves = int(level_data.get("campaign_waves", 6))
+
+        self.mode = mode  # "campaign" or "endless"
+        self.waves_cleared = 0
+        self.current_wave_number = 1
+        self.campaign_completed = False
+
+        self.grid_px_w = self.grid_w * self.cell
+        self.grid_px_h = self.grid_h * self.cell
+
+        self.path_px = [self._grid_to_px(gx, gy) for gx, gy in self.path_grid]
+        self.path_cells = self._expand_path_cells(self.path_grid)
+        self.path_table = PathTable(self.path_px)
+
+        self.lives = 15
+        self.gold = 150
+        self.score = 0
+        self.kills = 0
+
+        self.towers: List[Tower] = []
+        self.towers_version = 0  # bumped whenever the tower list changes
+        self.enemies: List[Enemy] = []
+        self.bullets: List[Bullet] = []
+
+        # enemies bucketed by grid cell and sorted by progress, rebuilt every tick after movement
+        self.enemy_grid = SpatialHash(self.cell, self.grid_offset)
+        self._by_progress: List[Enemy] = []
+        self._progress: List[float] = []
+
+        # Tornjevi
+        self.tower_defs = {
+            "basic": {
+                "cost": 50, "range": 140, "cd": 0.55,
+                "dmg": 20, "bullet_speed": 430
+            },
+            "sniper": {
+                "cost": 90, "range": 300, "cd": 1.0,
+                "dmg": 56, "bullet_speed": 560
+            },
+            "shotgun": {
+                "cost": 100, "range": 120, "cd": 1.5,
+                "dmg": 15, "bullet_speed": 380,
+                "pellets": 12,
+                "spread_deg": 30
+            },
+        }
+        self.selected_tower = "basic"
+
+        self.enemy_defs = {
+            "fast": {"hp": 40, "speed": 80, "reward": 15, "score": 18},
+            "tank": {"hp": 90, "speed": 70, "reward": 20, "score": 30},
+        }
+
+        # wave
+        self.wave_in_progress = False
+        self.spawn_timer = 0.0
+        self.spawned_this_wave = 0
+        self.enemies_this_wave = 0
+
+        self.victory_choice_active = False
+
+        self.msg = "1=BASIC, 2=SNIPER, 3=SHOTGUN. Gradi između waveova."
+
+        self.running = True
+        self.lost = False
+
+        # simulation ticks run so far; with a fixed dt this is the simulation clock
+        self.tick = 0
+        self.profiler = FrameProfiler()
+
+        self.exit_reason: str = "running"
+        self.saved_checkpoint: Optional[Dict[str, Any]] = None
+
+        self._wave_start_checkpoint: Optional[Dict[str, Any]] = None
+        # called with every new wave-start checkpoint (e.g. to autosave it); must not block
+        self.on_checkpoint: Optional[Callable[[Dict[str, Any]], None]] = None
+        # called with (tick, action) for every input apply_input() applied
+        self.on_input: Optional[Callable[[int, Tuple], None]] = None
+        # called at the start of every tick, before self.tick advances (e.g. to take replay keyframes)
+        self.on_tick: Optional[Callable[["Simulation"], None]] = None
+
+        if load_state is not None:
+            self._load_from_checkpoint(load_state)
+        else:
+            self._wave_start_checkpoint = self._make_checkpoint()
+
+    def _make_checkpoint(self) -> Dict[str, Any]:
+        """Return a serializable snapshot for continuing later (build phase)."""
+        towers = []
+        for t in self.towers:
+            towers.append({
+                "kind": str(t.kind),
+                "gx": int(t.gx),
+                "gy": int(t.gy),
+                "cooldown_left": float(getattr(t, "cooldown_left", 0.0)),
+            })
+
+        return {
+            "version": 1,
+            "level_id": int(self.level_id),
+            "mode": str(self.mode),
+            "lives": int(self.lives),
+            "gold": int(self.gold),
+            "score": float(self.score),
+            "kills": int(self.kills),
+            "waves_cleared": int(self.waves_cleared),
+            "current_wave_number": int(self.current_wave_number),
+            "selected_tower": str(self.selected_tower),
+            "towers": towers,
+        }
+
+    def _load_from_checkpoint(self, state: dict):
+        """Restore a saved checkpoint. Always resumes in build phase."""
+        self.mode = str(state.get("mode", self.mode))
+        self.lives = int(state.get("lives", self.lives))
+        self.gold = int(state.get("gold", self.gold))
+        self.score = float(state.get("score", self.score))
+        self.kills = int(state.get("kills", self.kills))
+        self.waves_cleared = int(state.get("waves_cleared", self.waves_cleared))
+        self.current_wave_number = int(state.get("current_wave_number", self.current_wave_number))
+        self.selected_tower = str(state.get("selected_tower", self.selected_tower))
+
+        self.wave_in_progress = False
+        self.spawn_timer = 0.0
+        self.spawned_this_wave = 0
+        self.enemies_this_wave = 0
+        self.enemies = []
+        self.bullets = []
+        self.lost = False
+        self.campaign_completed = False
+        self.victory_choice_active = False
+
+        self.towers = []
+        for td in list(state.get("towers", [])):
+            kind = str(td.get("kind", "basic"))
+            gx = int(td.get("gx", 0))
+            gy = int(td.get("gy", 0))
+            if kind not in self.tower_defs:
+                kind = "basic"
+            t = self._make_tower(kind, gx, gy)
+            t.cooldown_left = float(td.get("cooldown_left", 0.0))
+            self.towers.append(t)
+        self.towers_version += 1
+
+        self.msg = f"Loaded save: Wave {self.current_wave_number}. Build and press Start Wave."
+        self._wave_start_checkpoint = self._make_checkpoint()
+
+        snap = state.get("snapshot")
+        if snap is not None and int(snap["level_id"]) == self.level_id:
+            # saved mid-wave: resume exactly where it was left
+            self.restore(snap)
+            self.msg = f"Loaded save: Wave {self.current_wave_number} in progress."
+
+    # ----- snapshots -----
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The complete simulation state as tuples of plain values.
+
+        Unlike a checkpoint this includes enemies, bullets, spawn timers and
+        tower cooldowns, so restore() continues tick for tick as if nothing
+        happened. Snapshots are immutable and can be kept, shared and pickled.
+        A tower's coverage may be None (see checkpoint_codec); restore()
+        then recomputes it from the path.
+        """
+        enemies, bullets = self._snapshot_entities()
+        return {
+            "snapshot": SNAPSHOT_VERSION,
+            "level_id": self.level_id,
+            "state": tuple(getattr(self, name) for name in self.SNAPSHOT_FIELDS),
+            "towers": tuple((t.kind, t.gx, t.gy, t.range_px, t.fire_cd, t.dmg, t.cooldown_left, tuple(t.coverage))
+                            for t in self.towers),
+            "enemies": enemies,
+            "bullets": bullets,
+        }
+
+    def restore(self, snap: Dict[str, Any]):
+        if int(snap["level_id"]) != self.level_id:
+            raise ValueError(f"snapshot is for level {snap['level_id']}, not {self.level_id}")
+        if snap["snapshot"] != SNAPSHOT_VERSION:
+            raise ValueError(f"unknown snapshot version {snap['snapshot']}")
+        for name, value in zip(self.SNAPSHOT_FIELDS, snap["state"]):
+            setattr(self, name, value)
+        self.towers = []
+        for kind, gx, gy, range_px, fire_cd, dmg, cooldown_left, coverage in snap["towers"]:
+            t = Tower(kind, gx, gy, range_px, fire_cd, dmg, cooldown_left)
+            if coverage is None:
+                c = t.center_px(self.cell, self.grid_offset)
+                coverage = self.path_table.coverage(c.x, c.y, t.range_px)
+            t.coverage = list(coverage)
+            self.towers.append(t)
+        self.towers_version += 1
+        self._restore_entities(snap["enemies"], snap["bullets"])
+        self._index_enemies()
+
+    def fork(self, cls: Optional[type] = None) -> "Simulation":
+        """An independent headless copy of the current state, e.g. to play out a what-if."""
+        sim = (cls or self._fork_class())(self.level_data, mode=self.mode, bounds=(self.w, self.h))
+        sim.tower_defs = copy.deepcopy(self.tower_defs)
+        sim.enemy_defs = copy.deepcopy(self.enemy_defs)
+        sim.restore(self.snapshot())
+        return sim
+
+    def _fork_class(self) -> type:
+        return type(self)
+
+    def _snapshot_entities(self) -> Tuple[tuple, tuple]:
+        enemies = tuple((en.kind, en.pos.x, en.pos.y, en.speed, en.hp, en.max_hp, en.path_index, en.alive, en.dist)
+                        for en in self.enemies)
+        bullets = tuple((b.pos.x, b.pos.y, b.vel.x, b.vel.y, b.dmg, b.alive) for b in self.bullets)
+        return enemies, bullets
+
+    def _restore_entities(self, enemies: tuple, bullets: tuple):
+        self.enemies = [Enemy(kind, Vec2(x, y), speed, hp, max_hp, path_index, alive, dist)
+                        for kind, x, y, speed, hp, max_hp, path_index, alive, dist in enemies]
+        self.bullets = [Bullet(Vec2(x, y), Vec2(vx, vy), dmg, alive) for x, y, vx, vy, dmg, alive in bullets]
+
+    # ----- grid -----
+
+    def _grid_to_px(self, gx: int, gy: int) -> Vec2:
+        ox, oy = self.grid_offset
+        return Vec2(ox + gx * self.cell + self.cell / 2, oy + gy * self.cell + self.cell / 2)
+
+    def _mouse_to_grid(self, mx: int, my: int) -> Optional[Tuple[int, int]]:
+        ox, oy = self.grid_offset
+        if mx < ox or my < oy or mx >= ox + self.grid_px_w or my >= oy + self.grid_px_h:
+            return None
+        gx = int((mx - ox) // self.cell)
+        gy = int((my - oy) // self.cell)
+        if 0 <= gx < self.grid_w and 0 <= gy < self.grid_h:
+            return gx, gy
+        return None
+
+    def _expand_path_cells(self, pts: List[Tuple[int, int]]) -> set:
+        cells = set()
+        for i in range(len(pts) - 1):
+            x1, y1 = pts[i]
+            x2, y2 = pts[i + 1]
+            if x1 == x2:
+                step = 1 if y2 > y1 else -1
+                for y in range(y1, y2 + step, step):
+                    cells.add((x1, y))
+            elif y1 == y2:
+                step = 1 if x2 > x1 else -1
+                for x in range(x1, x2 + step, step):
+                    cells.add((x, y1))
+            else:
+                cells.add((x1, y1))
+                cells.add((x2, y2))
+        return cells
+
+    # ----- actions -----
+
+    def _switch_to_endless(self):
+        self.mode = "endless"
+        self.msg = "Endless mode! Good luck."
+
+    def _save_and_exit(self):
+        if self.lost:
+            self.exit_reason = "end"
+            self.saved_checkpoint = None
+            self.running = False
+            return
+
+        self.exit_reason = "save"
+        if self.wave_in_progress and self._wave_start_checkpoint is not None:
+            # the wave-start build state plus the exact mid-wave state to resume from
+            self.saved_checkpoint = dict(self._wave_start_checkpoint, snapshot=self.snapshot())
+        else:
+            self.saved_checkpoint = self._make_checkpoint()
+        self.running = False
+
+    def _publish_checkpoint(self):
+        self._wave_start_checkpoint = self._make_checkpoint()
+        if self.on_checkpoint is not None:
+            self.on_checkpoint(self._wave_start_checkpoint)
+
+    def _start_wave(self):
+        self._publish_checkpoint()
+        self.wave_in_progress = True
+        self.spawn_timer = 0.0
+        self.spawned_this_wave = 0
+
+        self.enemies_this_wave = 6 + self.current_wave_number * 2
+
+        self.msg = f"Wave {self.current_wave_number} started!"
+
+    def _spawn_enemy(self):
+        kind = "tank" if (self.spawned_this_wave % 5 == 2) else "fast"
+        base = self.enemy_defs[kind]
+
+        hp = int(base["hp"] * (1.0 + 0.18 * (self.current_wave_number - 1)))
+        if kind == "tank":
+            hp = int(hp * 1.15)
+
+        speed = float(base["speed"] + (self.current_wave_number - 1) * (2 if kind == "fast" else 1))
+
+        self._add_enemy(kind, speed, hp)
+
+    def _add_enemy(self, kind: str, speed: float, hp: int):
+        self.enemies.append(Enemy(kind, self.path_px[0].copy(), speed, hp, hp))
+
+    def _make_tower(self, kind: str, gx: int, gy: int) -> Tower:
+        td = self.tower_defs[kind]
+        t = Tower(kind, gx, gy, td["range"], td["cd"], td["dmg"])
+        c = t.center_px(self.cell, self.grid_offset)
+        t.coverage = self.path_table.coverage(c.x, c.y, t.range_px)
+        return t
+
+    def _try_build(self, gx: int, gy: int):
+        if (gx, gy) in self.path_cells:
+            self.msg = "Ne možeš graditi na putanji."
+            return
+        if any(t.gx == gx and t.gy == gy for t in self.towers):
+            self.msg = "Tu već postoji kula."
+            return
+
+        td = self.tower_defs[self.selected_tower]
+        if self.gold < td["cost"]:
+            self.msg = "Nemaš dovoljno golda."
+            return
+
+        self.gold -= td["cost"]
+        self.towers.append(self._make_tower(self.selected_tower, gx, gy))
+        self.towers_version += 1
+        self.msg = f"Postavljena {self.selected_tower.upper()}."
+
+    # ----- inputs -----
+
+    def apply_input(self, action: Tuple) -> bool:
+        """Apply one player input: ("select", kind), ("build", gx, gy), ("start",) or ("endless",).
+
+        Every player action that changes the game goes through here, so with
+        a fixed dt the initial state plus the (tick, action) stream passed to
+        on_input replays the game exactly. Returns False for inputs the game
+        ignores in its current state (those are not passed on). While the
+        victory choice is up only ("endless",) is taken, as in the game screen.
+        """
+        op = action[0]
+        if self.victory_choice_active and op in ("select", "build", "start"):
+            return False
+        if op == "select":
+            if action[1] not in self.tower_defs:
+                return False
+            self.selected_tower = action[1]
+            self.msg = f"Selected: {action[1].upper()}"
+        elif op == "build":
+            gx, gy = action[1], action[2]
+            if self.wave_in_progress or self.lost or not (0 <= gx < self.grid_w and 0 <= gy < self.grid_h):
+                return False
+            self._try_build(gx, gy)
+        elif op == "start":
+            if self.wave_in_progress or self.lost:
+                return False
+            self._start_wave()
+        elif op == "endless":
+            if not self.victory_choice_active:
+                return False
+            self._switch_to_endless()
+            self.victory_choice_active = False
+        else:
+            raise ValueError(f"unknown input {op!r}")
+        if self.on_input is not None:
+            self.on_input(self.tick, action)
+        return True
+
+    # ----- headless -----
+
+    def run_wave(self, dt: float = 1.0 / TICK_RATE, max_ticks: int = 1_000_000) -> int:
+        """Start the next wave and step it to completion. Returns ticks simulated."""
+        if self.wave_in_progress or self.lost:
+            return 0
+        self._start_wave()
+        ticks = 0
+        while self.wave_in_progress and not self.lost and ticks < max_ticks:
+            self.update(dt)
+            ticks += 1
+        return ticks
+
+    def run_waves(self, count: int, dt: float = 1.0 / TICK_RATE, endless: bool = False) -> int:
+        """Play up to `count` waves headless. Returns the number of waves cleared.
+
+        Stops on defeat, or when the campaign is won unless `endless` is set,
+        in which case the game continues as if the player picked Endless.
+        """
+        start = self.waves_cleared
+        for _ in range(count):
+            if self.victory_choice_active:
+                if not endless:
+                    break
+                self._switch_to_endless()
+                self.victory_choice_active = False
+            self.run_wave(dt)
+            if self.lost:
+                break
+        return self.waves_cleared - start
+
+    # ----- update -----
+
+    def update(self, dt: float):
+        if self.lost:
+            return
+        if self.on_tick is not None:
+            self.on_tick(self)
+        self.tick += 1
+        if self.profiler.enabled:
+            self._update_profiled(dt)
+            return
+
+        if self._update_wave(dt):
+            return
+        self._move_enemies(dt)
+        self._index_enemies()
+        self._fire_towers(dt)
+        self._move_bullets(dt)
+        self._compact()
+
+        if self.wave_in_progress:
+            self.score += dt * 2.0
+
+    def _update_profiled(self, dt: float):
+        """Same phases as update(), each timed into self.profiler."""
+        prof = self.profiler
+        clock = time.perf_counter
+        spawned = self.spawned_this_wave
+
+        t0 = clock()
+        skip = self._update_wave(dt)
+        t1 = clock()
+        prof.add("wave", t1 - t0)
+        prof.count("ticks", 1)
+        prof.count("enemies_spawned", max(0, self.spawned_this_wave - spawned))
+        if skip:
+            return
+
+        self._move_enemies(dt)
+        t2 = clock()
+        self._index_enemies()
+        t3 = clock()
+        bullets_before = self.entity_counts()[1]
+        self._fire_towers(dt)
+        bullets_fired = self.entity_counts()[1] - bullets_before
+        t4 = clock()
+        self._move_bullets(dt)
+        t5 = clock()
+        self._compact()
+        t6 = clock()
+
+        if self.wave_in_progress:
+            self.score += dt * 2.0
+
+        prof.add("enemies", t2 - t1)
+        prof.add("index", t3 - t2)
+        prof.add("towers", t4 - t3)
+        prof.add("bullets", t5 - t4)
+        prof.add("compact", t6 - t5)
+        prof.count("bullets_fired", bullets_fired)
+        enemies, bullets = self.entity_counts()
+        prof.current["enemies_alive"] = enemies
+        prof.current["bullets_alive"] = bullets
+
+    def entity_counts(self) -> Tuple[int, int]:
+        """(enemies, bullets) currently stored, without building any objects."""
+        return len(self.enemies), len(self.bullets)
+
+    def _update_wave(self, dt: float) -> bool:
+        """Spawn and wave-clear logic. Returns True when the rest of the tick is skipped."""
+        if not self.wave_in_progress:
+            return False
+
+        self.spawn_timer -= dt
+        spawn_interval = max(0.25, 0.85 - self.current_wave_number * 0.06)
+
+        if self.spawned_this_wave < self.enemies_this_wave and self.spawn_timer <= 0:
+            self.spawn_timer = spawn_interval
+            self._spawn_enemy()
+            self.spawned_this_wave += 1
+
+        if self.spawned_this_wave >= self.enemies_this_wave and not self._has_live_enemies():
+            self.wave_in_progress = False
+
+            bonus = 25 + self.current_wave_number * 8
+            if self.mode == "endless":
+                bonus += self.waves_cleared * 1  # tiny ramp
+            self.gold += bonus
+
+            self.msg = f"Wave cleared! +{bonus} gold. Build now."
+
+            self.waves_cleared += 1
+            self.current_wave_number += 1
+
+            self._publish_checkpoint()
+
+            if (self.mode == "campaign") and (self.waves_cleared >= self.campaign_waves):
+                self.campaign_completed = True
+                self.victory_choice_active = True
+                return True
+        return False
+
+    def _has_live_enemies(self) -> bool:
+        return any(e.alive for e in self.enemies)
+
+    def _enemy_reached_end(self):
+        self.lives -= 1
+        if self.lives <= 0:
+            self.lost = True
+
+    def _reward_kill(self, kind: str):
+        self.kills += 1
+
+        base = self.enemy_defs[kind]
+        reward = int(base["reward"] + self.current_wave_number * 0.5)
+        self.gold += reward
+        self.score += int(base["score"] + self.current_wave_number * 3)
+
+    def _move_enemies(self, dt: float):
+        table = self.path_table
+        cum, xs, ys, ux, uy = table.cum, table.xs, table.ys, table.ux, table.uy
+        end = table.segments
+
+        for en in self.enemies:
+            if not en.alive:
+                continue
+
+            # path_index is the current segment; past the last one the enemy is through
+            i = en.path_index
+            if i >= end:
+                en.alive = False
+                self._enemy_reached_end()
+                continue
+
+            # An enemy stops on reaching a waypoint and takes the corner next tick;
+            # movement left over in the tick is dropped, as the game always did.
+            # The distance left is measured from the position, not from dist, so
+            # float rounding decides arrival exactly as it always has.
+            pos = en.prev = en.pos
+            left = math.hypot(xs[i + 1] - pos.x, ys[i + 1] - pos.y)
+            if left < 1e-6:
+                en.path_index = i + 1
+                continue
+            step = en.speed * dt
+            if step >= left:
+                en.dist = cum[i + 1]
+                en.pos = Vec2(xs[i + 1], ys[i + 1])
+                en.path_index = i + 1
+            else:
+                en.dist += step
+                en.pos = Vec2(pos.x + ux[i] * step, pos.y + uy[i] * step)
+
+    def _shotgun_offsets(self) -> List[float]:
+        td = self.tower_defs["shotgun"]
+        pellets = int(td["pellets"])
+        spread = math.radians(float(td["spread_deg"]))
+        if pellets <= 1:
+            return [0.0]
+        return [spread * (i / (pellets - 1) - 0.5) for i in range(pellets)]
+
+    def _fire_towers(self, dt: float):
+        for t in self.towers:
+            t.cooldown_left = max(0.0, t.cooldown_left - dt)
+            if t.cooldown_left > 0:
+                continue
+
+            tp = t.center_px(self.cell, self.grid_offset)
+
+            if t.kind == "shotgun":
+                target = self._find_target(t)
+                if target is None:
+                    continue
+                base_dir = (target.pos - tp)
+                if base_dir.length_squared() == 0:
+                    continue
+
+                base_angle = math.atan2(base_dir.y, base_dir.x)
+                speed = float(self.tower_defs["shotgun"]["bullet_speed"])
+
+                for off in self._shotgun_offsets():
+                    ang = base_angle + off
+                    vel = Vec2(math.cos(ang), math.sin(ang)) * speed
+                    self.bullets.append(Bullet(tp.copy(), vel, t.dmg))
+
+                t.cooldown_left = t.fire_cd
+                continue
+
+            target = self._find_target(t)
+            if target is None:
+                continue
+
+            v = target.pos - tp
+            if v.length_squared() == 0:
+                continue
+
+            speed = float(self.tower_defs[t.kind]["bullet_speed"])
+            vel = v.normalize() * speed
+            self.bullets.append(Bullet(tp.copy(), vel, t.dmg))
+            t.cooldown_left = t.fire_cd
+
+    def _move_bullets(self, dt: float):
+        for b in self.bullets:
+            if not b.alive:
+                continue
+
+            b.prev = b.pos
+            b.pos = b.pos + b.vel * dt
+            if b.pos.x < 0 or b.pos.y < 0 or b.pos.x > self.w or b.pos.y > self.h:
+                b.alive = False
+                continue
+
+            px, py = int(b.pos.x), int(b.pos.y)
+            for en in self.enemy_grid.at_point(px, py):
+                if en.alive and en.rect().collidepoint(px, py):
+                    en.hp -= b.dmg
+                    b.alive = False
+                    if en.hp <= 0:
+                        en.alive = False
+                        self._reward_kill(en.kind)
+                    break
+
+    def _compact(self):
+        self.enemies = [e for e in self.enemies if e.alive]
+        self.bullets = [b for b in self.bullets if b.alive]
+
+    def _index_enemies(self):
+        grid = self.enemy_grid
+        grid.clear()
+        for en in self.enemies:
+            if en.alive:
+                # same box as Enemy.rect(): [x - 10, x + 10) on both axes
+                x0 = int(en.pos.x - 10)
+                y0 = int(en.pos.y - 10)
+                grid.insert_box(en, x0, y0, x0 + 19, y0 + 19)
+
+        self._by_progress = sorted((en for en in self.enemies if en.alive), key=lambda en: en.dist)
+        self._progress = [en.dist for en in self._by_progress]
+
+    def _find_target(self, tower: Tower) -> Optional[Enemy]:
+        """Furthest-along enemy inside the tower's coverage intervals."""
+        progress = self._progress
+        tp = None
+        for lo, hi in reversed(tower.coverage):
+            j = bisect_right(progress, hi + RANGE_EDGE) - 1
+            while j >= 0 and progress[j] >= lo - RANGE_EDGE:
+                en = self._by_progress[j]
+                if lo + RANGE_EDGE <= progress[j] <= hi - RANGE_EDGE:
+                    return en
+                if tp is None:
+                    tp = tower.center_px(self.cell, self.grid_offset)
+                if (en.pos - tp).length() <= tower.range_px:
+                    return en
+                j -= 1
+        return None
@@ -0,0 +1,38 @@
+# game/spatial.py
+from typing import Dict, List, Tuple
+
+from game.constants import CELL, GRID_OFFSET
+
+
+class SpatialHash:
+    """Uniform-grid bucket index aligned with the tower grid (CELL / GRID_OFFSET).
+
+    Items are inserted by bounding box into every cell they overlap, so a point
+    lookup only has to look at one bucket. Buckets keep insertion order.
+    """
+
+    def __init__(self, cell: int = CELL, offset: Tuple[int, int] = GRID_OFFSET):
+        self.cell = cell
+        self.ox, self.oy = offset
+        self.buckets: Dict[Tuple[int, int], List] = {}
+
+    def clear(self):
+        self.buckets.clear()
+
+    def key(self, x: float, y: float) -> Tuple[int, int]:
+        return int((x - self.ox) // self.cell), int((y - self.oy) // self.cell)
+
+    def insert_box(self, item, x0: float, y0: float, x1: float, y1: float):
+        kx0, ky0 = self.key(x0, y0)
+        kx1, ky1 = self.key(x1, y1)
+        buckets = self.buckets
+        for kx in range(kx0, kx1 + 1):
+            for ky in range(ky0, ky1 + 1):
+                b = buckets.get((kx, ky))
+                if b is None:
+                    buckets[(kx, ky)] = [item]
+                else:
+                    b.append(item)
+
+    def at_point(self, x: float, y: float) -> List:
+        return self.buckets.get(self.key(x, y), ())
@@ -0,0 +1,107 @@
+# game/sprites.py
+import math
+from typing import Dict, Iterable, Tuple
+
+import pygame
+
+ENEMY_SIZE = 20
+BAR_W = 24
+BAR_H = 4
+BULLET_R = 3
+
+# no sprite uses this colour; the atlas is opaque with a colour key, which
+# blits faster than per-pixel alpha (nothing is antialiased)
+COLORKEY = (255, 0, 255)
+
+
+class SpriteAtlas:
+    """Every entity sprite pre-drawn once onto one surface.
+
+    The renderer blits sub-rects of `surface` with Surface.blits, one call
+    per layer, instead of issuing pygame.draw calls per entity per frame.
+    Health bars are a background sprite plus one fill sprite per whole
+    pixel of width, so a bar is two area blits.
+    """
+
+    def __init__(self, colors: dict, cell: int, tower_kinds: Iterable[str], enemy_kinds: Iterable[str]):
+        self.cell = cell
+        sprites: Dict[str, pygame.Surface] = {}
+
+        for kind in tower_kinds:
+            sprites["tower_" + kind] = self._tower_sprite(kind, colors)
+
+        for kind in enemy_kinds:
+            s = self._blank(ENEMY_SIZE, ENEMY_SIZE)
+            col = (220, 90, 110) if kind == "fast" else (220, 170, 90)
+            pygame.draw.rect(s, col, (0, 0, ENEMY_SIZE, ENEMY_SIZE), border_radius=6)
+            sprites["enemy_" + kind] = s
+
+        s = self._blank(BAR_W, BAR_H)
+        pygame.draw.rect(s, (60, 60, 60), (0, 0, BAR_W, BAR_H), border_radius=2)
+        sprites["bar_bg"] = s
+        for w in range(BAR_W + 1):
+            s = self._blank(BAR_W, BAR_H)
+            pygame.draw.rect(s, colors["good"], (0, 0, w, BAR_H), border_radius=2)
+            sprites[f"bar_{w}"] = s
+
+        d = BULLET_R * 2 + 1
+        s = self._blank(d, d)
+        pygame.draw.circle(s, (240, 240, 240), (BULLET_R, BULLET_R), BULLET_R)
+        sprites["bullet"] = s
+
+        self.surface, self.areas = self._pack(sprites)
+        self.bars = [self.areas[f"bar_{w}"] for w in range(BAR_W + 1)]
+
+    def _blank(self, w: int, h: int) -> pygame.Surface:
+        s = pygame.Surface((w, h), pygame.SRCALPHA)
+        s.fill((0, 0, 0, 0))
+        return s
+
+    def _tower_sprite(self, kind: str, colors: dict) -> pygame.Surface:
+        """A tower drawn into a cell-sized sprite, blitted at the cell's top-left corner."""
+        cell = self.cell
+        s = self._blank(cell, cell)
+        cx = cy = cell / 2
+
+        if kind == "shotgun":
+            radius = 14
+            pts = []
+            for i in range(5):
+                ang = math.radians(90 + i * 72)
+                pts.append((
+                    int(cx + math.cos(ang) * radius),
+                    int(cy - math.sin(ang) * radius)
+                ))
+            pygame.draw.polygon(s, (160, 200, 120), pts)
+            pygame.draw.polygon(s, (90, 110, 80), pts, 2)
+        else:
+            r = pygame.Rect(0, 0, cell, cell).inflate(-10, -10)
+            base = (45, 55, 70) if kind == "basic" else (55, 50, 80)
+            pygame.draw.rect(s, base, r, border_radius=10)
+            dot = colors["accent"] if kind == "basic" else (200, 160, 255)
+            pygame.draw.circle(s, dot, (int(cx), int(cy)), 10)
+        return s
+
+    def _pack(self, sprites: Dict[str, pygame.Surface]) -> Tuple[pygame.Surface, Dict[str, pygame.Rect]]:
+        """Shelf-pack the sprites into one surface, tallest first."""
+        width = max(256, self.cell * 4)
+        order = sorted(sprites, key=lambda k: -sprites[k].get_height())
+        areas: Dict[str, pygame.Rect] = {}
+        x = y = shelf_h = 0
+        for name in order:
+            w, h = sprites[name].get_size()
+            if x + w > width:
+                x, y = 0, y + shelf_h
+                shelf_h = 0
+            areas[name] = pygame.Rect(x, y, w, h)
+            x += w
+            shelf_h = max(shelf_h, h)
+
+        atlas = pygame.Surface((width, y + shelf_h))
+        atlas.fill(COLORKEY)
+        for name, area in areas.items():
+            atlas.blit(sprites[name], area)
+        if pygame.display.get_surface() is not None:
+            atlas = atlas.convert()
+        atlas.set_colorkey(COLORKEY)
+        return atlas, areas
@@ -0,0 +1,82 @@
+# game/text_cache.py
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+import pygame
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces plus memoized text layouts.
+
+    Surfaces are keyed by (font, text, color, antialias), so unchanged text
+    costs a dict lookup and a blit instead of glyph rasterization. layout()
+    memoizes any layout computation (e.g. word wrapping) under a caller key.
+    """
+
+    def __init__(self, max_surfaces: int = 512, max_layouts: int = 256):
+        self.max_surfaces = max_surfaces
+        self.max_layouts = max_layouts
+        self._surfaces: "OrderedDict[tuple, pygame.Surface]" = OrderedDict()
+        self._layouts: "OrderedDict[Hashable, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.layout_hits = 0
+        self.layout_misses = 0
+
+    def render(self, font: pygame.font.Font, text: str, color, antialias: bool = True) -> pygame.Surface:
+        key = (font, text, tuple(color), antialias)
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        surf = font.render(text, antialias, color)
+        self._surfaces[key] = surf
+        if len(self._surfaces) > self.max_surfaces:
+            self._surfaces.popitem(last=False)
+        return surf
+
+    def layout(self, key: Hashable, compute: Callable[[], object]):
+        value = self._layouts.get(key)
+        if value is not None:
+            self._layouts.move_to_end(key)
+            self.layout_hits += 1
+            return value
+
+        self.layout_misses += 1
+        value = compute()
+        self._layouts[key] = value
+        if len(self._layouts) > self.max_layouts:
+            self._layouts.popitem(last=False)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "surfaces": len(self._surfaces),
+            "layout_hits": self.layout_hits,
+            "layout_misses": self.layout_misses,
+            "layouts": len(self._layouts),
+        }
+
+    def clear(self):
+        self._surfaces.clear()
+        self._layouts.clear()
+
+
+TEXT_CACHE = TextCache()
+
+_fonts: Dict[Tuple[object, int], pygame.font.Font] = {}
+
+
+def get_font(size: int, name=None) -> pygame.font.Font:
+    """Shared Font objects, so every screen hits the same TEXT_CACHE entries."""
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.Font(name, size)
+        _fonts[key] = font
+    return font
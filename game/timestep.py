@@ -0,0 +1,42 @@
+# game/timestep.py
+from typing import Callable
+
+from game.constants import TICK_RATE
+
+
+class FixedTimestep:
+    """Turns variable frame times into whole simulation steps of a fixed dt.
+
+    Leftover time stays in the accumulator, and `alpha` (0..1) says how far
+    the renderer is between the last two simulated states. After a long
+    frame at most `max_steps` steps run, and the rest of the backlog is
+    dropped instead of being simulated as one huge step.
+    """
+
+    def __init__(self, tick_rate: int = TICK_RATE, max_steps: int = 5):
+        self.dt = 1.0 / tick_rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.dropped_time = 0.0
+
+    def advance(self, frame_dt: float, step: Callable[[float], None]) -> int:
+        """Run as many fixed steps as `frame_dt` allows. Returns the number of steps."""
+        self.accumulator += max(0.0, frame_dt)
+        steps = 0
+        while self.accumulator >= self.dt and steps < self.max_steps:
+            step(self.dt)
+            self.accumulator -= self.dt
+            steps += 1
+
+        if self.accumulator >= self.dt:
+            backlog = self.accumulator - self.accumulator % self.dt
+            self.dropped_time += backlog
+            self.accumulator -= backlog
+
+        self.alpha = self.accumulator / self.dt
+        return steps
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.alpha = 0.0
@@ -2,6 +2,8 @@
 import pygame
 from dataclasses import dataclass
 
+from game.text_cache import TEXT_CACHE
+
 
 @dataclass
 class Button:
@@ -14,7 +16,7 @@ class Button:
         border = colors["btn_border"]
         pygame.draw.rect(screen, bg, self.rect, border_radius=10)
         pygame.draw.rect(screen, border, self.rect, width=2, border_radius=10)
-        label = font.render(self.text, True, colors["text"] if self.enabled else colors["muted"])
+        label = TEXT_CACHE.render(font, self.text, colors["text"] if self.enabled else colors["muted"])
         screen.blit(label, (self.rect.centerx - label.get_width() // 2, self.rect.centery - label.get_height() // 2))
 
     def hit(self, pos) -> bool:
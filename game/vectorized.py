@@ -0,0 +1,373 @@
+# game/vectorized.py
+import math
+from bisect import bisect_right
+import numpy as np
+import pygame
+from typing import Dict, List, Optional, Tuple
+
+from game.constants import SCREEN_W, SCREEN_H
+from game.simulation import RANGE_EDGE, Simulation
+from objects.enemies import Enemy
+from objects.projectiles import Bullet
+from objects.towers import Tower
+
+Vec2 = pygame.Vector2
+
+# bullets tested against all enemies at once in chunks of this many rows
+_HIT_CHUNK = 4096
+
+
+def _resized(a: np.ndarray, cap: int) -> np.ndarray:
+    out = np.zeros((cap,) + a.shape[1:], dtype=a.dtype)
+    n = min(len(a), cap)
+    out[:n] = a[:n]
+    return out
+
+
+class VectorizedSimulation(Simulation):
+    """Simulation backend that keeps enemies and bullets as NumPy struct-of-arrays.
+
+    Movement, culling, collision and compaction run as batch array operations,
+    which is what keeps endless mode with 10k+ bullets inside a 60 Hz tick.
+    Game rules are the same as in Simulation. `enemies` and `bullets` still
+    work as lists of Enemy/Bullet, but they are built from the arrays on each
+    access and are meant for checkpoints and debugging, not per-tick use.
+    """
+
+    _ENEMY_FIELDS = ("e_pos", "e_dist", "e_speed", "e_hp", "e_max_hp", "e_path_index", "e_alive", "e_kind")
+    _BULLET_FIELDS = ("b_pos", "b_vel", "b_dmg", "b_alive")
+
+    def __init__(self, level_data: dict, mode: str = "campaign", load_state: Optional[dict] = None,
+                 bounds: Tuple[int, int] = (SCREEN_W, SCREEN_H)):
+        self._kind_ids: Dict[str, int] = {}
+        self._kind_names: List[str] = []
+
+        self.n_enemies = 0
+        self.e_pos = np.zeros((64, 2), dtype=np.float64)
+        self.e_dist = np.zeros(64, dtype=np.float64)
+        self.e_speed = np.zeros(64, dtype=np.float64)
+        self.e_hp = np.zeros(64, dtype=np.int64)
+        self.e_max_hp = np.zeros(64, dtype=np.int64)
+        self.e_path_index = np.zeros(64, dtype=np.int64)
+        self.e_alive = np.zeros(64, dtype=bool)
+        self.e_kind = np.zeros(64, dtype=np.int8)
+
+        self.n_bullets = 0
+        self.b_pos = np.zeros((256, 2), dtype=np.float64)
+        self.b_vel = np.zeros((256, 2), dtype=np.float64)
+        self.b_dmg = np.zeros(256, dtype=np.int64)
+        self.b_alive = np.zeros(256, dtype=bool)
+
+        super().__init__(level_data, mode=mode, load_state=load_state, bounds=bounds)
+
+        table = self.path_table
+        self._cum = np.array(table.cum, dtype=np.float64)
+        self._waypoints = np.column_stack((table.xs, table.ys)).astype(np.float64)
+        self._seg_dir = np.column_stack((table.ux, table.uy)).astype(np.float64)
+
+    # ----- list views -----
+
+    @property
+    def enemies(self) -> List[Enemy]:
+        n = self.n_enemies
+        return [
+            Enemy(self._kind_names[self.e_kind[i]], Vec2(float(self.e_pos[i, 0]), float(self.e_pos[i, 1])),
+                  float(self.e_speed[i]), int(self.e_hp[i]), int(self.e_max_hp[i]),
+                  int(self.e_path_index[i]), bool(self.e_alive[i]), float(self.e_dist[i]))
+            for i in range(n)
+        ]
+
+    @enemies.setter
+    def enemies(self, items: List[Enemy]):
+        self.n_enemies = 0
+        for en in items:
+            self._push_enemy(en.kind, en.pos.x, en.pos.y, en.speed, en.hp, en.max_hp,
+                             en.path_index, en.alive, en.dist)
+
+    @property
+    def bullets(self) -> List[Bullet]:
+        n = self.n_bullets
+        return [
+            Bullet(Vec2(float(self.b_pos[i, 0]), float(self.b_pos[i, 1])),
+                   Vec2(float(self.b_vel[i, 0]), float(self.b_vel[i, 1])),
+                   int(self.b_dmg[i]), bool(self.b_alive[i]))
+            for i in range(n)
+        ]
+
+    @bullets.setter
+    def bullets(self, items: List[Bullet]):
+        self.n_bullets = 0
+        if items:
+            self._push_bullets(np.array([(b.pos.x, b.pos.y) for b in items], dtype=np.float64),
+                               np.array([(b.vel.x, b.vel.y) for b in items], dtype=np.float64),
+                               np.array([b.dmg for b in items], dtype=np.int64))
+            self.b_alive[:self.n_bullets] = [b.alive for b in items]
+
+    def entity_counts(self) -> Tuple[int, int]:
+        return self.n_enemies, self.n_bullets
+
+    # ----- snapshots -----
+
+    def _snapshot_entities(self) -> Tuple[tuple, tuple]:
+        n = self.n_enemies
+        names = self._kind_names
+        enemies = tuple(zip(
+            [names[k] for k in self.e_kind[:n].tolist()],
+            self.e_pos[:n, 0].tolist(), self.e_pos[:n, 1].tolist(), self.e_speed[:n].tolist(),
+            self.e_hp[:n].tolist(), self.e_max_hp[:n].tolist(), self.e_path_index[:n].tolist(),
+            self.e_alive[:n].tolist(), self.e_dist[:n].tolist(),
+        ))
+        m = self.n_bullets
+        bullets = tuple(zip(
+            self.b_pos[:m, 0].tolist(), self.b_pos[:m, 1].tolist(),
+            self.b_vel[:m, 0].tolist(), self.b_vel[:m, 1].tolist(),
+            self.b_dmg[:m].tolist(), self.b_alive[:m].tolist(),
+        ))
+        return enemies, bullets
+
+    def _restore_entities(self, enemies: tuple, bullets: tuple):
+        n = len(enemies)
+        self._reserve(self._ENEMY_FIELDS, n)
+        self.n_enemies = n
+        if n:
+            kind, x, y, speed, hp, max_hp, path_index, alive, dist = zip(*enemies)
+            self.e_kind[:n] = [self._kind_id(k) for k in kind]
+            self.e_pos[:n, 0] = x
+            self.e_pos[:n, 1] = y
+            self.e_speed[:n] = speed
+            self.e_hp[:n] = hp
+            self.e_max_hp[:n] = max_hp
+            self.e_path_index[:n] = path_index
+            self.e_alive[:n] = alive
+            self.e_dist[:n] = dist
+
+        m = len(bullets)
+        self._reserve(self._BULLET_FIELDS, m)
+        self.n_bullets = m
+        if m:
+            x, y, vx, vy, dmg, alive = zip(*bullets)
+            self.b_pos[:m, 0] = x
+            self.b_pos[:m, 1] = y
+            self.b_vel[:m, 0] = vx
+            self.b_vel[:m, 1] = vy
+            self.b_dmg[:m] = dmg
+            self.b_alive[:m] = alive
+
+    # ----- storage -----
+
+    def _reserve(self, fields: Tuple[str, ...], needed: int):
+        cap = len(getattr(self, fields[0]))
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        for name in fields:
+            setattr(self, name, _resized(getattr(self, name), cap))
+
+    def _kind_id(self, kind: str) -> int:
+        k = self._kind_ids.get(kind)
+        if k is None:
+            k = len(self._kind_names)
+            self._kind_ids[kind] = k
+            self._kind_names.append(kind)
+        return k
+
+    def _push_enemy(self, kind: str, x: float, y: float, speed: float, hp: int, max_hp: int,
+                    path_index: int = 0, alive: bool = True, dist: float = 0.0):
+        i = self.n_enemies
+        self._reserve(self._ENEMY_FIELDS, i + 1)
+        self.e_pos[i] = (x, y)
+        self.e_dist[i] = dist
+        self.e_speed[i] = speed
+        self.e_hp[i] = hp
+        self.e_max_hp[i] = max_hp
+        self.e_path_index[i] = path_index
+        self.e_alive[i] = alive
+        self.e_kind[i] = self._kind_id(kind)
+        self.n_enemies = i + 1
+
+    def _push_bullets(self, pos: np.ndarray, vel: np.ndarray, dmg: np.ndarray):
+        i = self.n_bullets
+        j = i + len(pos)
+        self._reserve(self._BULLET_FIELDS, j)
+        self.b_pos[i:j] = pos
+        self.b_vel[i:j] = vel
+        self.b_dmg[i:j] = dmg
+        self.b_alive[i:j] = True
+        self.n_bullets = j
+
+    def _add_enemy(self, kind: str, speed: float, hp: int):
+        start = self.path_px[0]
+        self._push_enemy(kind, start.x, start.y, speed, hp, hp)
+
+    # ----- update phases -----
+
+    def _has_live_enemies(self) -> bool:
+        return bool(self.e_alive[:self.n_enemies].any())
+
+    def _index_enemies(self):
+        # Collision is done with array broad-phase tests; no bucket index needed.
+        pass
+
+    def _move_enemies(self, dt: float):
+        n = self.n_enemies
+        if n == 0:
+            return
+        alive = self.e_alive[:n]
+        idx = self.e_path_index[:n]
+        pos = self.e_pos[:n]
+        dist = self.e_dist[:n]
+
+        done = alive & (idx >= self.path_table.segments)
+        if done.any():
+            alive[done] = False
+            for _ in range(int(done.sum())):
+                self._enemy_reached_end()
+
+        moving = np.flatnonzero(alive)
+        if len(moving) == 0:
+            return
+
+        # Same rule as Simulation: stop at each waypoint, turn the corner next tick.
+        mi = idx[moving]
+        p = pos[moving]
+        target = self._waypoints[mi + 1]
+        d = target - p
+        left = np.hypot(d[:, 0], d[:, 1])
+        step = self.e_speed[moving] * dt
+
+        still = left < 1e-6
+        snap = ~still & (step >= left)
+        walk = ~still & ~snap
+
+        newpos = p.copy()
+        newpos[snap] = target[snap]
+        newpos[walk] += self._seg_dir[mi[walk]] * step[walk][:, None]
+        pos[moving] = newpos
+        s = dist[moving]
+        s[snap] = self._cum[mi[snap] + 1]
+        s[walk] += step[walk]
+        dist[moving] = s
+        idx[moving] = mi + (still | snap)
+
+    def _fire_towers(self, dt: float):
+        order = progress = None
+        new_pos, new_vel, new_dmg = [], [], []
+
+        for t in self.towers:
+            t.cooldown_left = max(0.0, t.cooldown_left - dt)
+            if t.cooldown_left > 0:
+                continue
+
+            if order is None:
+                live = np.flatnonzero(self.e_alive[:self.n_enemies])
+                order = live[np.argsort(self.e_dist[live], kind="stable")]
+                progress = self.e_dist[order].tolist()
+            if not progress:
+                continue
+
+            tp = t.center_px(self.cell, self.grid_offset)
+            j = self._find_target_index(t, tp, order, progress)
+            if j < 0:
+                continue
+
+            vx = float(self.e_pos[j, 0]) - tp.x
+            vy = float(self.e_pos[j, 1]) - tp.y
+            if vx == 0 and vy == 0:
+                continue
+
+            td = self.tower_defs[t.kind]
+            speed = float(td["bullet_speed"])
+            if t.kind == "shotgun":
+                ang = math.atan2(vy, vx) + np.array(self._shotgun_offsets())
+                vel = np.column_stack((np.cos(ang), np.sin(ang))) * speed
+            else:
+                length = math.hypot(vx, vy)
+                vel = np.array([[vx / length * speed, vy / length * speed]])
+
+            new_pos.append(np.broadcast_to((tp.x, tp.y), vel.shape))
+            new_vel.append(vel)
+            new_dmg.append(np.full(len(vel), t.dmg, dtype=np.int64))
+            t.cooldown_left = t.fire_cd
+
+        if new_vel:
+            self._push_bullets(np.concatenate(new_pos), np.concatenate(new_vel), np.concatenate(new_dmg))
+
+    def _find_target_index(self, t: Tower, tp: Vec2, order: np.ndarray, progress: List[float]) -> int:
+        """Enemy row Simulation._find_target would pick, or -1."""
+        for lo, hi in reversed(t.coverage):
+            k = bisect_right(progress, hi + RANGE_EDGE) - 1
+            while k >= 0 and progress[k] >= lo - RANGE_EDGE:
+                j = int(order[k])
+                if lo + RANGE_EDGE <= progress[k] <= hi - RANGE_EDGE:
+                    return j
+                dx = float(self.e_pos[j, 0]) - tp.x
+                dy = float(self.e_pos[j, 1]) - tp.y
+                if math.sqrt(dx * dx + dy * dy) <= t.range_px:
+                    return j
+                k -= 1
+        return -1
+
+    def _move_bullets(self, dt: float):
+        m = self.n_bullets
+        if m == 0:
+            return
+        alive = self.b_alive[:m]
+        pos = self.b_pos[:m]
+        pos += self.b_vel[:m] * dt
+
+        x = pos[:, 0]
+        y = pos[:, 1]
+        alive &= (x >= 0) & (y >= 0) & (x <= self.w) & (y <= self.h)
+
+        live_e = np.flatnonzero(self.e_alive[:self.n_enemies])
+        cand = np.flatnonzero(alive)
+        if len(live_e) == 0 or len(cand) == 0:
+            return
+
+        # Enemy.rect(): 20x20 box at int(pos - 10); bullets test at int(pos)
+        left = (self.e_pos[live_e, 0] - 10).astype(np.int64)
+        top = (self.e_pos[live_e, 1] - 10).astype(np.int64)
+        px = x[cand].astype(np.int64)
+        py = y[cand].astype(np.int64)
+
+        e_alive = self.e_alive
+        e_hp = self.e_hp
+        for c0 in range(0, len(cand), _HIT_CHUNK):
+            bx = px[c0:c0 + _HIT_CHUNK, None]
+            by = py[c0:c0 + _HIT_CHUNK, None]
+            hit = (bx >= left) & (bx < left + 20) & (by >= top) & (by < top + 20)
+            rows = np.flatnonzero(hit.any(axis=1))
+
+            # Hits resolve one bullet at a time, in bullet then enemy order,
+            # because a kill changes what later bullets can hit.
+            for r in rows:
+                b = cand[c0 + r]
+                for e in live_e[hit[r]]:
+                    if not e_alive[e]:
+                        continue
+                    e_hp[e] -= self.b_dmg[b]
+                    alive[b] = False
+                    if e_hp[e] <= 0:
+                        e_alive[e] = False
+                        self._reward_kill(self._kind_names[self.e_kind[e]])
+                    break
+
+    def _compact(self):
+        n = self.n_enemies
+        keep = self.e_alive[:n].copy()
+        k = int(keep.sum())
+        if k != n:
+            for name in self._ENEMY_FIELDS:
+                a = getattr(self, name)
+                a[:k] = a[:n][keep]
+            self.n_enemies = k
+
+        m = self.n_bullets
+        keep = self.b_alive[:m].copy()
+        k = int(keep.sum())
+        if k != m:
+            for name in self._BULLET_FIELDS:
+                a = getattr(self, name)
+                a[:k] = a[:m][keep]
+            self.n_bullets = k
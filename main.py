@@ -1,13 +1,19 @@
 # main.py
+import argparse
 import datetime
+import sys
 from typing import Optional
 import pygame
+import transaction
 
-from storage import open_storage, commit
+from storage import ZEO_CACHE_SIZE, open_storage, commit
 from models import GameState
+from persistence import Autosaver, PersistenceWorker
 from game.constants import SCREEN_W, SCREEN_H, COLORS
+from game.text_cache import TEXT_CACHE, get_font
 from game.ui import Button
 from game.engine import CampusDefenseEngine
+from game.replay import Replay, ReplayPlayer, ReplayRecorder
 
 from levels.level1 import get_level_1
 from levels.level2 import get_level_2
@@ -23,8 +29,55 @@ def ensure_state(root) -> GameState:
     return root["game_state"]
 
 
+# Posted by the persistence worker after each commit, so screens blocked in
+# wait_events() wake up and refresh.
+PERSISTED = pygame.USEREVENT + 1
+
+
+def refresh(worker: PersistenceWorker):
+    """Start a new transaction on the UI connection, so it sees what the worker (or another client) committed.
+
+    The UI connection only reads; every write goes through the worker.
+    """
+    for fut in worker.poll():
+        if fut.exception() is not None:
+            print(f"saving failed: {fut.exception()!r}", file=sys.stderr)
+    transaction.abort()
+
+
+def load_profile(gs: GameState, worker: PersistenceWorker, username: str):
+    """The profile as the UI connection sees it; waits for the worker only if it is new."""
+    refresh(worker)
+    profile = gs.profiles.get(username)
+    if profile is None:
+        worker.ensure_profile(username).result()
+        refresh(worker)
+        profile = gs.profiles[username]
+    return profile
+
+
+# Menu screens block in wait_events() and repaint only when what they show changes,
+# so an idle menu costs a wakeup every IDLE_WAIT_MS instead of 60 redraws a second.
+IDLE_WAIT_MS = 250
+
+
+def wait_events(timeout_ms: int = IDLE_WAIT_MS) -> list:
+    """Block until input arrives or `timeout_ms` passes; returns the drained queue ([] on timeout).
+
+    Expose events are handled here: the display surface still holds the last
+    frame, so it is presented again without redrawing.
+    """
+    first = pygame.event.wait(timeout_ms)
+    if first.type == pygame.NOEVENT:
+        return []
+    events = [first] + pygame.event.get()
+    if any(e.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED) for e in events):
+        pygame.display.flip()
+    return events
+
+
 def draw_center_text(screen, font, text, y, color):
-    s = font.render(text, True, color)
+    s = TEXT_CACHE.render(font, text, color)
     screen.blit(s, (screen.get_width() // 2 - s.get_width() // 2, y))
 
 
@@ -37,18 +90,35 @@ def get_levels():
 
 
 def run_text_input(screen, title: str, initial: str = ""):
-    font = pygame.font.Font(None, 30)
-    font_big = pygame.font.Font(None, 48)
+    font = get_font(30)
+    font_big = get_font(48)
 
     w, h = screen.get_size()
     panel = pygame.Rect(w // 2 - 280, 170, 560, 260)
     box = pygame.Rect(panel.x + 30, panel.y + 130, panel.w - 60, 56)
 
     text = initial
-    clock = pygame.time.Clock()
+    drawn = None
 
     while True:
-        for e in pygame.event.get():
+        if text != drawn:
+            screen.fill(COLORS["bg"])
+            pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
+            pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
+
+            draw_center_text(screen, font_big, title, panel.y + 28, COLORS["text"])
+            draw_center_text(screen, font, "ENTER = potvrdi, ESC = odustani", panel.y + 80, COLORS["muted"])
+
+            pygame.draw.rect(screen, (18, 20, 26), box, border_radius=12)
+            pygame.draw.rect(screen, COLORS["btn_border"], box, width=2, border_radius=12)
+
+            t = TEXT_CACHE.render(font_big, text if text else " ", COLORS["text"])
+            screen.blit(t, (box.x + 14, box.y + 10))
+
+            pygame.display.flip()
+            drawn = text
+
+        for e in wait_events():
             if e.type == pygame.QUIT:
                 return None
             if e.type == pygame.KEYDOWN:
@@ -63,45 +133,58 @@ def run_text_input(screen, title: str, initial: str = ""):
                     if e.unicode and len(e.unicode) == 1 and len(text) < 18:
                         text += e.unicode
 
-        screen.fill(COLORS["bg"])
-        pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
-        pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
-
-        draw_center_text(screen, font_big, title, panel.y + 28, COLORS["text"])
-        draw_center_text(screen, font, "ENTER = potvrdi, ESC = odustani", panel.y + 80, COLORS["muted"])
-
-        pygame.draw.rect(screen, (18, 20, 26), box, border_radius=12)
-        pygame.draw.rect(screen, COLORS["btn_border"], box, width=2, border_radius=12)
 
-        t = font_big.render(text if text else " ", True, COLORS["text"])
-        screen.blit(t, (box.x + 14, box.y + 10))
-
-        pygame.display.flip()
-        clock.tick(60)
+def run_menu(screen, gs: GameState, worker: PersistenceWorker, username: str):
+    font = get_font(30)
+    font_big = get_font(52)
 
-
-def run_menu(screen, gs: GameState, username: str):
-    font = pygame.font.Font(None, 30)
-    font_big = pygame.font.Font(None, 52)
-
-    profile = gs.get_or_create_profile(username)
-    commit()
+    worker.ensure_profile(username)
 
     w, h = screen.get_size()
-    panel = pygame.Rect(w // 2 - 260, 100, 520, 460)
+    panel = pygame.Rect(w // 2 - 260, 100, 520, 520)
 
     bx = panel.x + 24
     bw = panel.w - 48
     btn_start = Button(pygame.Rect(bx, panel.y + 170, bw, 50), "Start Game", True)
-    btn_continue = Button(pygame.Rect(bx, panel.y + 230, bw, 50), "Continue Saved Game", profile.has_saved_game())
-    btn_history = Button(pygame.Rect(bx, panel.y + 290, bw, 50), "Game History (ZODB)", True)
-    btn_change = Button(pygame.Rect(bx, panel.y + 350, bw, 50), "Change User", True)
-    btn_quit = Button(pygame.Rect(bx, panel.y + 410, bw, 50), "Quit", True)
+    btn_continue = Button(pygame.Rect(bx, panel.y + 230, bw, 50), "Continue Saved Game", False)
+    btn_rewind = Button(pygame.Rect(bx, panel.y + 290, bw, 50), "Jump Back to Wave", False)
+    btn_history = Button(pygame.Rect(bx, panel.y + 350, bw, 50), "Game History (ZODB)", True)
+    btn_change = Button(pygame.Rect(bx, panel.y + 410, bw, 50), "Change User", True)
+    btn_quit = Button(pygame.Rect(bx, panel.y + 470, bw, 50), "Quit", True)
 
-    clock = pygame.time.Clock()
+    drawn = None
 
     while True:
-        for e in pygame.event.get():
+        refresh(worker)
+        profile = gs.profiles.get(username)  # None until the worker has created it
+        games, wins, kills = (profile.stat(name) if profile else 0 for name in ("games_played", "wins", "total_kills"))
+        has_waves = profile is not None and profile.wave_history is not None and len(profile.wave_history.waves) > 0
+        view = (username, games, wins, kills, has_waves, profile is not None and profile.has_saved_game())
+        if view != drawn:
+            screen.fill(COLORS["bg"])
+            pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
+            pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
+
+            draw_center_text(screen, font_big, "Geometry defense", panel.y + 22, COLORS["text"])
+            draw_center_text(screen, font, "Save yourself from boxes", panel.y + 72, COLORS["muted"])
+
+            draw_center_text(screen, font, f"User: {username}", panel.y + 115, COLORS["text"])
+            stats_line = f"Games: {games}   Wins: {wins}   Total kills: {kills}"
+            draw_center_text(screen, font, stats_line, panel.y + 145, COLORS["muted"])
+
+            btn_start.draw(screen, font, COLORS)
+            btn_continue.enabled = view[-1]
+            btn_continue.draw(screen, font, COLORS)
+            btn_rewind.enabled = has_waves
+            btn_rewind.draw(screen, font, COLORS)
+            btn_history.draw(screen, font, COLORS)
+            btn_change.draw(screen, font, COLORS)
+            btn_quit.draw(screen, font, COLORS)
+
+            pygame.display.flip()
+            drawn = view
+
+        for e in wait_events():
             if e.type == pygame.QUIT:
                 return "quit", username
             if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
@@ -109,52 +192,87 @@ def run_menu(screen, gs: GameState, username: str):
                     return "level_select", username
                 if btn_continue.enabled and btn_continue.hit(e.pos):
                     return "continue", username
+                if btn_rewind.enabled and btn_rewind.hit(e.pos):
+                    return "rewind", username
                 if btn_history.hit(e.pos):
                     return "history", username
                 if btn_change.hit(e.pos):
                     newu = run_text_input(screen, "Enter username", initial=username)
+                    drawn = None  # the input screen painted over the menu
                     if newu:
                         username = newu
-                        profile = gs.get_or_create_profile(username)
-                        commit()
+                        worker.ensure_profile(username)
                 if btn_quit.hit(e.pos):
                     return "quit", username
 
-        screen.fill(COLORS["bg"])
-        pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
-        pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
 
-        draw_center_text(screen, font_big, "Geometry defense", panel.y + 22, COLORS["text"])
-        draw_center_text(screen, font, "Save yourself from boxes", panel.y + 72, COLORS["muted"])
-
-        draw_center_text(screen, font, f"User: {profile.username}", panel.y + 115, COLORS["text"])
-        stats_line = f"Games: {profile.stats['games_played']}   Wins: {profile.stats['wins']}   Total kills: {profile.stats['total_kills']}"
-        draw_center_text(screen, font, stats_line, panel.y + 145, COLORS["muted"])
-
-        btn_start.draw(screen, font, COLORS)
-        btn_continue.enabled = profile.has_saved_game()
-        btn_continue.draw(screen, font, COLORS)
-        btn_history.draw(screen, font, COLORS)
-        btn_change.draw(screen, font, COLORS)
-        btn_quit.draw(screen, font, COLORS)
-
-        pygame.display.flip()
-        clock.tick(60)
-
-
-def run_history(screen, profile):
-    font = pygame.font.Font(None, 28)
-    font_big = pygame.font.Font(None, 44)
+HISTORY_LINE_H = 28
+HISTORY_PREFETCH = 40
+
+
+class RunHistoryPager:
+    """Newest-first runs read ahead of the visible page, so scrolling only reads the database past the cache end."""
+
+    def __init__(self, profile, page_size: int, prefetch: int = HISTORY_PREFETCH):
+        self.profile = profile
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self._rows = []  # (key, run), newest first
+        self._count = None
+
+    def page(self, scroll: int, count: int) -> list:
+        if count != self._count:  # runs were added (possibly by another client): start over from the newest
+            self._rows = []
+            self._count = count
+        end = min(count, scroll + self.page_size)
+        if end > len(self._rows):
+            before = self._rows[-1][0] if self._rows else None
+            self._rows += self.profile.runs_before(before, end - len(self._rows) + self.prefetch)
+        return [run for _, run in self._rows[scroll:end]]
+
+
+def history_summary_lines(gs: GameState, profile) -> list:
+    """One line per played level, from the profile and global rollups only."""
+    lines = []
+    for lvl in profile.rollup_levels():
+        r = profile.rollup(lvl)
+        line = f"L{lvl}: {r.count} games, win {r.win_rate():.0%}, avg {r.mean_score():.0f}"
+        everyone = gs.rollup(lvl)
+        if everyone is not None:
+            line += f" (all {everyone.mean_score():.0f})"
+        line += f", best {r.score_max}"
+        kpw = r.kills_per_wave()
+        if kpw is not None:
+            line += f", kills/wave {kpw:.1f}"
+        lines.append(line)
+    return lines or ["Statistika po levelu: (nema još)"]
+
+
+def run_history(screen, gs: GameState, profile, levels: list):
+    font = get_font(28)
+    font_big = get_font(44)
 
     w, h = screen.get_size()
     panel = pygame.Rect(70, 70, w - 140, h - 140)
     btn_back = Button(pygame.Rect(panel.right - 180, panel.y + 16, 160, 44), "Back", True)
 
+    summary = history_summary_lines(gs, profile)
+    runs_top = panel.y + 72 + len(summary) * 24 + 34
+    pager = RunHistoryPager(profile, (panel.bottom - 40 - runs_top) // HISTORY_LINE_H)
     scroll = 0
-    clock = pygame.time.Clock()
+    drawn = None
 
     while True:
-        for e in pygame.event.get():
+        count = profile.run_count()
+        scroll = min(scroll, max(0, count - 1))
+        view = (scroll, count)
+        rows = pager.page(scroll, count)
+        if view != drawn:
+            draw_history(screen, panel, btn_back, summary, scroll, rows, count, font, font_big)
+            pygame.display.flip()
+            drawn = view
+
+        for e in wait_events():
             if e.type == pygame.QUIT:
                 return "quit"
             if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
@@ -167,47 +285,114 @@ def run_history(screen, profile):
                     scroll += 1
                 if e.key == pygame.K_UP:
                     scroll = max(0, scroll - 1)
+                if e.key == pygame.K_RETURN and rows and rows[0].replay is not None:
+                    # the highlighted (top) run
+                    lvl = _level_by_id(levels, rows[0].level)
+                    if lvl is not None:
+                        if run_replay(screen, lvl, Replay.decode(rows[0].replay.data)) == "quit":
+                            return "quit"
+                        drawn = None
 
-        screen.fill(COLORS["bg"])
-        pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
-        pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
 
-        title = font_big.render("Game History (ZODB)", True, COLORS["text"])
-        screen.blit(title, (panel.x + 20, panel.y + 18))
-        btn_back.draw(screen, font, COLORS)
+def draw_history(screen, panel, btn_back, summary, scroll, rows, count, font, font_big):
+    screen.fill(COLORS["bg"])
+    pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
+    pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
 
-        bs = profile.best_score_by_level
-        best_line = "Best score by level: " + ", ".join([f"L{lvl}:{bs[lvl]}" for lvl in bs.keys()]) if len(bs) else "Best score by level: (nema još)"
-        screen.blit(font.render(best_line, True, COLORS["muted"]), (panel.x + 20, panel.y + 72))
+    title = TEXT_CACHE.render(font_big, "Game History (ZODB)", COLORS["text"])
+    screen.blit(title, (panel.x + 20, panel.y + 18))
+    btn_back.draw(screen, font, COLORS)
 
-        hint = "UP/DOWN scroll, ESC back"
-        screen.blit(font.render(hint, True, COLORS["muted"]), (panel.x + 20, panel.y + 98))
+    y = panel.y + 72
+    for line in summary:
+        screen.blit(TEXT_CACHE.render(font, line, COLORS["muted"]), (panel.x + 20, y))
+        y += 24
 
-        runs = list(profile.runs)[::-1]
-        start_y = panel.y + 130
-        line_h = 28
-        max_lines = (panel.height - 160) // line_h
+    hint = "UP/DOWN scroll, ENTER replay, ESC back"
+    screen.blit(TEXT_CACHE.render(font, hint, COLORS["muted"]), (panel.x + 20, y + 2))
 
-        start_idx = scroll
-        end_idx = min(len(runs), start_idx + max_lines)
+    start_y = y + 34
 
-        if len(runs) == 0:
-            screen.blit(font.render("Nema još odigranih partija.", True, COLORS["muted"]), (panel.x + 20, start_y))
-        else:
-            for i in range(start_idx, end_idx):
-                r = runs[i]
-                won = r["won"]
-                col = COLORS["good"] if won else COLORS["bad"]
-                status = "WIN" if won else "LOSE"
-                line = f"{r['ts']}  |  L{r['level']}  |  Score {r['score']}  |  Kills {r['kills']}  |  {status}"
-                screen.blit(font.render(line, True, col if i == start_idx else COLORS["text"]), (panel.x + 20, start_y))
-                start_y += line_h
-
-            footer = f"Showing {start_idx+1}-{end_idx} of {len(runs)}"
-            screen.blit(font.render(footer, True, COLORS["muted"]), (panel.x + 20, panel.bottom - 36))
+    if count == 0:
+        screen.blit(TEXT_CACHE.render(font, "Nema još odigranih partija.", COLORS["muted"]), (panel.x + 20, start_y))
+    else:
+        for i, r in enumerate(rows):
+            col = COLORS["good"] if r.won else COLORS["bad"]
+            status = "WIN" if r.won else "LOSE"
+            line = f"{r.ts}  |  L{r.level}  |  Score {r.score}  |  Kills {r.kills}  |  {status}"
+            screen.blit(TEXT_CACHE.render(font, line, col if i == 0 else COLORS["text"]), (panel.x + 20, start_y))
+            start_y += HISTORY_LINE_H
 
-        pygame.display.flip()
-        clock.tick(60)
+        footer = f"Showing {scroll+1}-{scroll+len(rows)} of {count}"
+        screen.blit(TEXT_CACHE.render(font, footer, COLORS["muted"]), (panel.x + 20, panel.bottom - 36))
+
+
+WAVE_ROWS = 5
+
+
+def run_wave_select(screen, history) -> Optional[dict]:
+    """Pick a wave of the last game to start again from; returns its checkpoint or None."""
+    font = get_font(30)
+    font_big = get_font(52)
+
+    w, h = screen.get_size()
+    panel = pygame.Rect(w // 2 - 320, 90, 640, 500)
+
+    bx = panel.x + 24
+    bw = panel.w - 48
+
+    btn_back = Button(pygame.Rect(panel.right - 180, panel.y + 18, 160, 44), "Back", True)
+
+    waves = history.summaries()
+    start_y = panel.y + 120
+    wave_buttons = []
+    for wave, cp in waves:
+        label = f"Wave {wave} - lives {cp['lives']}, gold {cp['gold']}, towers {len(cp['towers'])}"
+        wave_buttons.append((cp, Button(pygame.Rect(bx, 0, bw, 52), label, True)))
+
+    scroll = max(0, len(wave_buttons) - WAVE_ROWS)  # newest waves first in view
+    drawn = None
+
+    while True:
+        visible = wave_buttons[scroll:scroll + WAVE_ROWS]
+        if drawn != scroll:
+            screen.fill(COLORS["bg"])
+            pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
+            pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
+
+            title = TEXT_CACHE.render(font_big, "Jump Back", COLORS["text"])
+            screen.blit(title, (panel.x + 24, panel.y + 22))
+            btn_back.draw(screen, font, COLORS)
+
+            hint = TEXT_CACHE.render(font, "Klikni wave za igru od tog vala.", COLORS["muted"])
+            screen.blit(hint, (panel.x + 24, panel.y + 72))
+
+            for i, (cp, btn) in enumerate(visible):
+                btn.rect.y = start_y + i * 64
+                btn.draw(screen, font, COLORS)
+
+            footer = f"Waves {scroll + 1}-{scroll + len(visible)} of {len(wave_buttons)}   UP/DOWN scroll"
+            screen.blit(TEXT_CACHE.render(font, footer, COLORS["muted"]), (panel.x + 24, panel.bottom - 44))
+
+            pygame.display.flip()
+            drawn = scroll
+
+        for e in wait_events():
+            if e.type == pygame.QUIT:
+                return None
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_ESCAPE:
+                    return None
+                if e.key == pygame.K_DOWN:
+                    scroll = min(scroll + 1, max(0, len(wave_buttons) - WAVE_ROWS))
+                if e.key == pygame.K_UP:
+                    scroll = max(0, scroll - 1)
+            if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
+                if btn_back.hit(e.pos):
+                    return None
+                for cp, btn in visible:
+                    if btn.hit(e.pos):
+                        return cp
 
 
 def draw_level_preview_map(screen, level_data: dict, rect: pygame.Rect):
@@ -252,8 +437,8 @@ def draw_level_preview_map(screen, level_data: dict, rect: pygame.Rect):
 
 
 def run_level_select(screen, levels: list):
-    font = pygame.font.Font(None, 30)
-    font_big = pygame.font.Font(None, 52)
+    font = get_font(30)
+    font_big = get_font(52)
 
     w, h = screen.get_size()
     panel = pygame.Rect(w // 2 - 320, 90, 640, 500)
@@ -270,10 +455,28 @@ def run_level_select(screen, levels: list):
         r = pygame.Rect(bx, start_y + i * 64, bw, 52)
         level_buttons.append((lvl, Button(r, f"{lvl.get('name', 'Level')} (ID {lvl['id']})", True)))
 
-    clock = pygame.time.Clock()
+    drawn = False
 
     while True:
-        for e in pygame.event.get():
+        if not drawn:
+            screen.fill(COLORS["bg"])
+            pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
+            pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
+
+            title = TEXT_CACHE.render(font_big, "Select Level", COLORS["text"])
+            screen.blit(title, (panel.x + 24, panel.y + 22))
+            btn_back.draw(screen, font, COLORS)
+
+            hint = TEXT_CACHE.render(font, "Klikni level za preview (Campaign/Endless).", COLORS["muted"])
+            screen.blit(hint, (panel.x + 24, panel.y + 72))
+
+            for lvl, btn in level_buttons:
+                btn.draw(screen, font, COLORS)
+
+            pygame.display.flip()
+            drawn = True
+
+        for e in wait_events():
             if e.type == pygame.QUIT:
                 return None
             if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
@@ -283,30 +486,10 @@ def run_level_select(screen, levels: list):
                     if btn.hit(e.pos):
                         return lvl
 
-        screen.fill(COLORS["bg"])
-        pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
-        pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
-
-        title = font_big.render("Select Level", True, COLORS["text"])
-        screen.blit(title, (panel.x + 24, panel.y + 22))
-        btn_back.draw(screen, font, COLORS)
-
-        hint = font.render("Klikni level za preview (Campaign/Endless).", True, COLORS["muted"])
-        screen.blit(hint, (panel.x + 24, panel.y + 72))
-
-        for lvl, btn in level_buttons:
-            btn.draw(screen, font, COLORS)
-
-        pygame.display.flip()
-        clock.tick(60)
-
-def draw_wrapped_text(screen, font, text, x, y, max_width, color, line_h=28):
-    
-    if not text:
-        return y + line_h
-
+def wrap_text_lines(font, text, max_width):
     words = text.split(" ")
     line = ""
+    lines = []
 
     for w in words:
         test = (line + " " + w).strip()
@@ -314,28 +497,37 @@ def draw_wrapped_text(screen, font, text, x, y, max_width, color, line_h=28):
             line = test
         else:
             if line:
-                screen.blit(font.render(line, True, color), (x, y))
-                y += line_h
+                lines.append(line)
                 line = w
             else:
                 
                 cut = w
                 while cut and font.size(cut + "…")[0] > max_width:
                     cut = cut[:-1]
-                screen.blit(font.render(cut + "…", True, color), (x, y))
-                y += line_h
+                lines.append(cut + "…")
                 line = ""
 
     if line:
-        screen.blit(font.render(line, True, color), (x, y))
+        lines.append(line)
+    return tuple(lines)
+
+
+def draw_wrapped_text(screen, font, text, x, y, max_width, color, line_h=28):
+    
+    if not text:
+        return y + line_h
+
+    lines = TEXT_CACHE.layout(("wrap", font, text, max_width), lambda: wrap_text_lines(font, text, max_width))
+    for line in lines:
+        screen.blit(TEXT_CACHE.render(font, line, color), (x, y))
         y += line_h
 
     return y
 
 
 def run_level_preview(screen, level_data: dict):
-    font = pygame.font.Font(None, 30)
-    font_big = pygame.font.Font(None, 50)
+    font = get_font(30)
+    font_big = get_font(50)
 
     w, h = screen.get_size()
     panel = pygame.Rect(w // 2 - 360, 90, 720, 500)
@@ -351,10 +543,59 @@ def run_level_preview(screen, level_data: dict):
     btn_endless = Button(pygame.Rect(right_x, 0, btn_w, btn_h), "Play Endless", True)
 
 
-    clock = pygame.time.Clock()
+    drawn = False
 
     while True:
-        for e in pygame.event.get():
+        if not drawn:
+            screen.fill(COLORS["bg"])
+            pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
+            pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
+
+            title = TEXT_CACHE.render(font_big, level_data.get("name", f"Level {level_data['id']}"), COLORS["text"])
+            screen.blit(title, (panel.x + 24, panel.y + 22))
+            btn_back.draw(screen, font, COLORS)
+
+        
+            draw_level_preview_map(screen, level_data, map_rect)
+
+        
+            info_y = panel.y + 120
+            max_w = panel.right - 24 - right_x  
+
+            lines = [
+                level_data.get("duration_text", f"Campaign: ~{level_data.get('campaign_waves', 6)} waves"),
+                level_data.get("difficulty_text", "Difficulty: (not set)"),
+                "",
+                "Mode options:",
+                "- Campaign: završava i pita za Endless",
+                "- Endless: beskonačno, broji waves cleared",
+            ]
+
+            for line in lines:
+                info_y = draw_wrapped_text(screen, font, line, right_x, info_y, max_w, COLORS["muted"], line_h=28)
+
+        
+            gap = 16
+            y_btn1 = info_y + gap
+            y_btn2 = y_btn1 + btn_h + 14
+
+            max_btn2_top = panel.bottom - 24 - btn_h
+            if y_btn2 > max_btn2_top:
+                shift = y_btn2 - max_btn2_top
+                y_btn1 -= shift
+                y_btn2 -= shift
+
+            btn_campaign.rect.y = y_btn1
+            btn_endless.rect.y = y_btn2
+
+
+            btn_campaign.draw(screen, font, COLORS)
+            btn_endless.draw(screen, font, COLORS)
+
+            pygame.display.flip()
+            drawn = True
+
+        for e in wait_events():
             if e.type == pygame.QUIT:
                 return None
             if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1:
@@ -365,67 +606,74 @@ def run_level_preview(screen, level_data: dict):
                 if btn_endless.hit(e.pos):
                     return "endless"
 
-        screen.fill(COLORS["bg"])
-        pygame.draw.rect(screen, COLORS["panel_bg"], panel, border_radius=16)
-        pygame.draw.rect(screen, COLORS["btn_border"], panel, width=2, border_radius=16)
-
-        title = font_big.render(level_data.get("name", f"Level {level_data['id']}"), True, COLORS["text"])
-        screen.blit(title, (panel.x + 24, panel.y + 22))
-        btn_back.draw(screen, font, COLORS)
-
-        
-        draw_level_preview_map(screen, level_data, map_rect)
-
-        
-        info_y = panel.y + 120
-        max_w = panel.right - 24 - right_x  
-
-        lines = [
-            level_data.get("duration_text", f"Campaign: ~{level_data.get('campaign_waves', 6)} waves"),
-            level_data.get("difficulty_text", "Difficulty: (not set)"),
-            "",
-            "Mode options:",
-            "- Campaign: završava i pita za Endless",
-            "- Endless: beskonačno, broji waves cleared",
-        ]
-
-        for line in lines:
-            info_y = draw_wrapped_text(screen, font, line, right_x, info_y, max_w, COLORS["muted"], line_h=28)
 
-        
-        gap = 16
-        y_btn1 = info_y + gap
-        y_btn2 = y_btn1 + btn_h + 14
+REPLAY_SEEK_SECONDS = 10
+REPLAY_MAX_SPEED = 32
 
-        max_btn2_top = panel.bottom - 24 - btn_h
-        if y_btn2 > max_btn2_top:
-            shift = y_btn2 - max_btn2_top
-            y_btn1 -= shift
-            y_btn2 -= shift
 
-        btn_campaign.rect.y = y_btn1
-        btn_endless.rect.y = y_btn2
+def run_replay(screen, level_data: dict, replay: Replay) -> str:
+    """Watch a recorded game: SPACE pause, LEFT/RIGHT seek, UP/DOWN speed, ESC back. Returns "back" or "quit"."""
+    clock = pygame.time.Clock()
+    eng = CampusDefenseEngine(screen, level_data, mode=replay.mode)
+    player = ReplayPlayer(replay, eng)
+    font = get_font(24)
+    seek_ticks = REPLAY_SEEK_SECONDS * replay.tick_rate
 
+    while True:
+        frame_dt = clock.tick(60) / 1000.0
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                return "quit"
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_ESCAPE:
+                    return "back"
+                if e.key == pygame.K_SPACE:
+                    player.paused = not player.paused
+                if e.key == pygame.K_RIGHT:
+                    player.seek(eng.tick + seek_ticks)
+                if e.key == pygame.K_LEFT:
+                    player.rewind(REPLAY_SEEK_SECONDS)
+                if e.key == pygame.K_UP:
+                    player.speed = min(REPLAY_MAX_SPEED, player.speed * 2)
+                if e.key == pygame.K_DOWN:
+                    player.speed = max(0.25, player.speed / 2)
 
-        btn_campaign.draw(screen, font, COLORS)
-        btn_endless.draw(screen, font, COLORS)
+        player.advance(frame_dt)
+        eng.draw()
 
+        played = (eng.tick - replay.start_tick) // replay.tick_rate
+        status = f"REPLAY {played}/{int(replay.seconds())} s  x{player.speed:g}"
+        if player.paused:
+            status += "  PAUSED"
+        status += "   SPACE, LEFT/RIGHT, UP/DOWN, ESC"
+        status_pos = (eng.grid_offset[0], eng.grid_offset[1] + eng.grid_px_h + 8)
+        screen.blit(TEXT_CACHE.render(font, status, COLORS["muted"]), status_pos)
         pygame.display.flip()
-        clock.tick(60)
 
 
-def run_game(screen, level_data: dict, mode: str, load_state: Optional[dict] = None):
+def run_game(screen, level_data: dict, mode: str, load_state: Optional[dict] = None, dirty_rects: bool = False,
+             autosave: Optional[Autosaver] = None):
     clock = pygame.time.Clock()
-    eng = CampusDefenseEngine(screen, level_data, mode=mode, load_state=load_state)
+    eng = CampusDefenseEngine(screen, level_data, mode=mode, load_state=load_state, dirty_rects=dirty_rects)
+    if autosave is not None:
+        eng.on_checkpoint = autosave.publish
+    recorder = ReplayRecorder(eng)
 
     while eng.running:
-        dt = clock.tick(60) / 1000.0
+        frame_dt = clock.tick(60) / 1000.0
         for e in pygame.event.get():
             eng.handle_event(e)
 
-        eng.update(dt)
-        eng.draw()
-        pygame.display.flip()
+        eng.advance(frame_dt)
+        rects = eng.draw()
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    if autosave is not None:
+        autosave.close()
+    replay = recorder.finish()
 
     if eng.exit_reason == "save" and eng.saved_checkpoint is not None:
         return {
@@ -444,6 +692,8 @@ def run_game(screen, level_data: dict, mode: str, load_state: Optional[dict] = N
         "campaign_completed": bool(eng.campaign_completed),
         "lost": bool(eng.lost),
         "exit_reason": str(eng.exit_reason),
+        "waves": int(eng.waves_cleared),
+        "replay": replay.encode(),
     }
 
 
@@ -454,61 +704,82 @@ def _level_by_id(levels: list, level_id: int):
     return None
 
 
-def main():
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Geometry Defense")
+    ap.add_argument("--dirty-rects", action="store_true",
+                    help="only push changed screen regions to the display (low fill-rate machines)")
+    ap.add_argument("--zeo", metavar="HOST:PORT",
+                    help="use the database served by this ZEO server instead of game_data.fs (shared between "
+                         "instances); serve it with python -m tools.serve_zeo")
+    ap.add_argument("--zeo-cache-mb", type=float, default=ZEO_CACHE_SIZE / (1024 * 1024),
+                    help="ZEO client cache size")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
     pygame.display.set_caption("Geometry Defense - Josip Koren")
 
-    db, conn, root = open_storage("game_data.fs")
+    db, conn, root = open_storage("game_data.fs", zeo=args.zeo, cache_size=int(args.zeo_cache_mb * 1024 * 1024))
+    worker = None
     try:
         gs = ensure_state(root)
-        
-        for p in gs.profiles.values():
-            if not hasattr(p, "saved_game"):
-                p.saved_game = None
-        commit()
+        # migrate old data now, while blocking is fine; from here on this connection only reads
+        if gs.upgrade():
+            commit()
+        worker = PersistenceWorker(db, notify=lambda: pygame.event.post(pygame.event.Event(PERSISTED))).start()
         username = "student"
 
         levels = get_levels()
 
         while True:
-            action, username = run_menu(screen, gs, username)
+            action, username = run_menu(screen, gs, worker, username)
             if action == "quit":
                 break
 
-            profile = gs.get_or_create_profile(username)
-            commit()
+            if action in ("continue", "rewind"):
+                # the last game's save may still be queued; read the profile once it is committed
+                worker.flush()
+            profile = load_profile(gs, worker, username)
 
             if action == "history":
-                res = run_history(screen, profile)
+                res = run_history(screen, gs, profile, levels)
                 if res == "quit":
                     break
 
-            if action == "continue":
-                if not profile.has_saved_game():
+            if action in ("continue", "rewind"):
+                if action == "rewind":
+                    if profile.wave_history is None:
+                        continue
+                    saved = run_wave_select(screen, profile.wave_history)
+                    if saved is None:
+                        continue
+                elif profile.has_saved_game():
+                    saved = profile.saved_checkpoint()
+                else:
                     continue
 
-                saved = profile.saved_game
                 lvl = _level_by_id(levels, int(saved.get("level_id", 1)))
                 if lvl is None:
                     
-                    profile.clear_saved_game()
-                    commit()
+                    worker.clear_saved_game(username)
                     continue
 
                 mode = str(saved.get("mode", "campaign"))
-                result = run_game(screen, lvl, mode=mode, load_state=saved)
+                result = run_game(screen, lvl, mode=mode, load_state=saved, dirty_rects=args.dirty_rects,
+                                  autosave=Autosaver(worker, username))
 
                 if result["action"] == "saved":
-                    profile.save_game(result["checkpoint"])
-                    commit()
+                    worker.save_game(username, result["checkpoint"])
                 else:
                     
                     if result.get("campaign_completed") or result.get("lost"):
-                        profile.clear_saved_game()
+                        worker.clear_saved_game(username)
                     ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    profile.record_run(ts_iso=ts, level=result["level_id"], score=result["score"], kills=result["kills"], won=result["won"])
-                    commit()
+                    worker.record_run(username, ts_iso=ts, level=result["level_id"], score=result["score"], kills=result["kills"], won=result["won"], waves=result["waves"],
+                                      replay=result["replay"])
 
                 continue
 
@@ -525,32 +796,37 @@ def main():
                         continue
 
                     
-                    profile.clear_saved_game()
-                    commit()
+                    worker.clear_saved_game(username)
+                    worker.start_game_history(username, lvl["id"], mode)
 
-                    result = run_game(screen, lvl, mode=mode)
+                    result = run_game(screen, lvl, mode=mode, dirty_rects=args.dirty_rects,
+                                      autosave=Autosaver(worker, username))
 
                     if result["action"] == "saved":
-                        profile.save_game(result["checkpoint"])
-                        commit()
+                        worker.save_game(username, result["checkpoint"])
                         break
 
                     ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    profile.record_run(
+                    worker.record_run(
+                        username,
                         ts_iso=ts,
                         level=result["level_id"],
                         score=result["score"],
                         kills=result["kills"],
                         won=result["won"],
+                        waves=result["waves"],
+                        replay=result["replay"],
                     )
 
                     if result.get("campaign_completed") or result.get("lost"):
-                        profile.clear_saved_game()
+                        worker.clear_saved_game(username)
 
-                    commit()
                     break
 
     finally:
+        if worker is not None:
+            worker.close()  # everything submitted is committed before the database closes
+        transaction.abort()
         conn.close()
         db.close()
         pygame.quit()
@@ -1,35 +1,357 @@
+import random
+import time
+
 from persistent import Persistent
 from persistent.mapping import PersistentMapping
 from persistent.list import PersistentList
+from typing import List, Optional, Tuple
+
+from BTrees.IOBTree import IOBTree
+from BTrees.Length import Length
+from BTrees.LOBTree import LOBTree, LOBucket
 from BTrees.OOBTree import OOBTree
+from ZODB.POSException import ConflictError
+
+from game import checkpoint_codec
+
+STAT_NAMES = ("games_played", "wins", "total_kills")
+
+# Version of the stored data layout; bump it with every migration added to GameState.upgrade().
+SCHEMA_VERSION = 1
+
+
+def _resolve_counters(old: dict, committed: dict, new: dict, lowest=(), highest=()) -> dict:
+    """Three-way merge of counter-style state for _p_resolveConflict.
+
+    Applies this transaction's change to each attribute on top of the
+    already committed state: ints and tuples of ints add their delta,
+    dicts of ints merge per key, names in `lowest`/`highest` keep the
+    min/max. Any other attribute may only have changed on one side.
+    """
+    out = dict(committed)
+    for name, mine in new.items():
+        base = old.get(name)
+        theirs = committed.get(name)
+        if mine == base:
+            continue
+        if theirs == base:
+            out[name] = mine
+        elif name in lowest or name in highest:
+            pick = min if name in lowest else max
+            out[name] = mine if theirs is None else theirs if mine is None else pick(mine, theirs)
+        elif isinstance(mine, int) and not isinstance(mine, bool):
+            out[name] = theirs + mine - base
+        elif isinstance(mine, tuple):
+            out[name] = tuple(t + m - b for t, m, b in zip(theirs, mine, base))
+        elif isinstance(mine, dict):
+            merged = dict(theirs)
+            for k in set(mine) | set(base):
+                n = merged.get(k, 0) + mine.get(k, 0) - base.get(k, 0)
+                if n:
+                    merged[k] = n
+                else:
+                    merged.pop(k, None)
+            out[name] = merged
+        else:
+            raise ConflictError
+    return out
+
+
+def _merge_items(old: tuple, committed: tuple, new: tuple) -> tuple:
+    """Three-way merge of flat (k1, v1, k2, v2, ...) bucket items; the same key changed on both sides conflicts."""
+    base, theirs, mine = (dict(zip(items[::2], items[1::2])) for items in (old, committed, new))
+    merged = dict(theirs)
+    for k, v in mine.items():
+        if k not in base:
+            if k in theirs and theirs[k] != v:
+                raise ConflictError
+            merged[k] = v
+        elif base[k] != v:
+            if theirs.get(k) != base[k]:
+                raise ConflictError
+            merged[k] = v
+    for k in base:
+        if k not in mine:
+            if theirs.get(k) != base[k]:
+                raise ConflictError
+            merged.pop(k, None)
+    if not merged:
+        raise ConflictError  # an emptied bucket has to be unlinked by the tree
+    flat = []
+    for k in sorted(merged):
+        flat += (k, merged[k])
+    return tuple(flat)
+
+
+class RunBucket(LOBucket):
+    def _p_resolveConflict(self, old, committed, new):
+        # the stock merge refuses two transactions that both append past the last key,
+        # which is exactly what concurrent finishes with time-ordered keys do
+        if not (old[1:] == committed[1:] == new[1:]):
+            raise ConflictError  # the bucket was split
+        return (_merge_items(old[0], committed[0], new[0]),) + tuple(committed[1:])
+
+
+class RunTree(LOBTree):
+    """LOBTree of RunRecords whose buckets merge concurrent appends."""
+
+    _bucket_type = RunBucket
+    # Appends all land in the last bucket, and every client appending while it splits
+    # conflicts on the split; twice the default leaf halves how often that happens.
+    max_leaf_size = 120
+
+    def _p_resolveConflict(self, old, committed, new):
+        # While the tree fits in one bucket it stores it inline: ((((k, v, ...),),),).
+        # Any other change to the tree itself is a split and a real conflict.
+        items = []
+        for state in (old, committed, new):
+            if state is None:
+                items.append(())
+            elif len(state) == 1 and len(state[0]) == 1:
+                items.append(state[0][0][0])
+            else:
+                raise ConflictError
+        return (((_merge_items(*items),),),)
+
+
+class RunRecord(Persistent):
+    """One finished game, stored as its own small object.
+
+    Recording a run writes only this record and the RunTree bucket that
+    points to it, however long the player's history is.
+    """
+
+    waves = None  # runs recorded before waves were tracked
+    replay = None  # RunReplay, for runs recorded with one
+
+    def __init__(self, ts: str, level: int, score: int, kills: int, won: bool, waves: Optional[int] = None,
+                 replay: Optional[bytes] = None):
+        self.ts = ts
+        self.level = int(level)
+        self.score = int(score)
+        self.kills = int(kills)
+        self.won = bool(won)
+        if waves is not None:
+            self.waves = int(waves)
+        if replay is not None:
+            self.replay = RunReplay(replay)
+
+    @classmethod
+    def from_mapping(cls, run) -> "RunRecord":
+        return cls(run["ts"], run["level"], run["score"], run["kills"], run["won"])
+
+
+class RunReplay(Persistent):
+    """An encoded game.replay.Replay, in its own record so paging through runs never loads it."""
+
+    def __init__(self, data: bytes):
+        self.data = bytes(data)
+
+
+class LevelRollup(Persistent):
+    """Running totals over every run on one level, updated in O(1) per run.
+
+    Holds counts, sums, score min/max and a histogram of scores in
+    power-of-two bins: bin 0 is score 0, bin i is [2**(i-1), 2**i), and the
+    last bin takes everything above. Queries read only this object, never
+    the run records.
+    """
+
+    HIST_BINS = 24
+
+    def __init__(self, level: int):
+        self.level = int(level)
+        self.count = 0
+        self.wins = 0
+        self.score_sum = 0
+        self.kills_sum = 0
+        self.score_min = None
+        self.score_max = None
+        # waves are optional per run, so they get their own count
+        self.waves_runs = 0
+        self.waves_sum = 0
+        self.waves_kills_sum = 0
+        self.hist = (0,) * self.HIST_BINS
+
+    @classmethod
+    def score_bin(cls, score: int) -> int:
+        return min(max(0, int(score)).bit_length(), cls.HIST_BINS - 1)
+
+    def add(self, score: int, kills: int, won: bool, waves: Optional[int] = None):
+        score = int(score)
+        self.count += 1
+        self.wins += 1 if won else 0
+        self.score_sum += score
+        self.kills_sum += int(kills)
+        self.score_min = score if self.score_min is None else min(self.score_min, score)
+        self.score_max = score if self.score_max is None else max(self.score_max, score)
+        if waves is not None:
+            self.waves_runs += 1
+            self.waves_sum += int(waves)
+            self.waves_kills_sum += int(kills)
+        i = self.score_bin(score)
+        hist = list(self.hist)
+        hist[i] += 1
+        self.hist = tuple(hist)
+
+    def merge(self, other: "LevelRollup"):
+        """Fold another rollup of the same level into this one."""
+        if not other.count:
+            return
+        self.count += other.count
+        self.wins += other.wins
+        self.score_sum += other.score_sum
+        self.kills_sum += other.kills_sum
+        self.score_min = other.score_min if self.score_min is None else min(self.score_min, other.score_min)
+        self.score_max = other.score_max if self.score_max is None else max(self.score_max, other.score_max)
+        self.waves_runs += other.waves_runs
+        self.waves_sum += other.waves_sum
+        self.waves_kills_sum += other.waves_kills_sum
+        self.hist = tuple(a + b for a, b in zip(self.hist, other.hist))
+
+    def _p_resolveConflict(self, old, committed, new):
+        # every finish on a level bumps the same rollup (the global one from all kiosks)
+        return _resolve_counters(old, committed, new, lowest=("score_min",), highest=("score_max",))
+
+    def win_rate(self) -> float:
+        return self.wins / self.count if self.count else 0.0
+
+    def mean_score(self) -> float:
+        return self.score_sum / self.count if self.count else 0.0
+
+    def mean_kills(self) -> float:
+        return self.kills_sum / self.count if self.count else 0.0
+
+    def mean_waves(self) -> Optional[float]:
+        return self.waves_sum / self.waves_runs if self.waves_runs else None
+
+    def kills_per_wave(self) -> Optional[float]:
+        """Over the runs that recorded waves; None if none did."""
+        return self.waves_kills_sum / self.waves_sum if self.waves_sum else None
+
+    def histogram(self) -> List[Tuple[int, Optional[int], int]]:
+        """Non-empty bins as (low, high, count), scores low <= s < high; high is None for the last bin."""
+        out = []
+        for i, n in enumerate(self.hist):
+            if n:
+                lo = 0 if i == 0 else 1 << (i - 1)
+                hi = None if i == self.HIST_BINS - 1 else 1 << i
+                out.append((lo, hi, n))
+        return out
+
+
+# checkpoint fields a WaveCheckpoint delta records when they change
+_WAVE_FIELDS = ("mode", "lives", "gold", "score", "kills", "waves_cleared", "current_wave_number", "selected_tower")
+
+
+def _tower_table(checkpoint: dict) -> dict:
+    return {(t["gx"], t["gy"]): (t["kind"], t["cooldown_left"]) for t in checkpoint["towers"]}
+
+
+class WaveCheckpoint(Persistent):
+    """One wave-start checkpoint of a game: either the full encoded checkpoint or a delta on the previous wave."""
+
+    def __init__(self, wave: int, checkpoint: dict, prev: Optional[dict] = None):
+        self.wave = int(wave)
+        if prev is None:
+            self.full = checkpoint_codec.encode(checkpoint)
+            return
+        self.full = None
+        self.changes = {k: checkpoint[k] for k in _WAVE_FIELDS if checkpoint[k] != prev[k]}
+        old, new = _tower_table(prev), _tower_table(checkpoint)
+        # ((gx, gy), kind, cooldown_left) for built or changed towers; (gx, gy) for removed ones
+        self.towers_set = tuple((pos, kind, cd) for pos, (kind, cd) in new.items() if old.get(pos) != (kind, cd))
+        self.towers_removed = tuple(pos for pos in old if pos not in new)
 
+    def apply(self, prev: Optional[dict]) -> dict:
+        """This wave's checkpoint, given the previous wave's (ignored for full checkpoints)."""
+        if self.full is not None:
+            return checkpoint_codec.decode(self.full)
+        cp = dict(prev, **self.changes)
+        towers = _tower_table(prev)
+        for pos in self.towers_removed:
+            del towers[pos]
+        for pos, kind, cd in self.towers_set:
+            towers[pos] = (kind, cd)
+        cp["towers"] = [{"kind": kind, "gx": gx, "gy": gy, "cooldown_left": cd}
+                        for (gx, gy), (kind, cd) in towers.items()]
+        return cp
 
-def _to_persistent(obj):
-    
-    if isinstance(obj, PersistentMapping) or isinstance(obj, PersistentList):
-        return obj
-    if isinstance(obj, dict):
-        pm = PersistentMapping()
-        for k, v in obj.items():
-            pm[k] = _to_persistent(v)
-        return pm
-    if isinstance(obj, list):
-        pl = PersistentList()
-        pl.extend([_to_persistent(x) for x in obj])
-        return pl
-    return obj
+
+class GameHistory(Persistent):
+    """Every wave-start checkpoint of one game, keyed by wave number.
+
+    Most are deltas on the wave before, so appending a wave writes one small
+    WaveCheckpoint and a bucket; every KEYFRAME_EVERY waves a full checkpoint
+    bounds how many deltas checkpoint() has to apply.
+    """
+
+    KEYFRAME_EVERY = 8
+
+    def __init__(self, level_id: int, mode: str):
+        self.level_id = int(level_id)
+        self.mode = str(mode)
+        self.waves = IOBTree()  # current_wave_number -> WaveCheckpoint
+
+    def append(self, checkpoint: dict):
+        """Record the checkpoint for its wave, dropping that wave and any later ones (a replayed timeline)."""
+        cp = checkpoint_codec.migrate(checkpoint)
+        cp.pop("snapshot", None)
+        wave = cp["current_wave_number"]
+        for w in list(self.waves.keys(wave)):
+            del self.waves[w]
+
+        prev = None
+        if len(self.waves):
+            last = self.waves.maxKey()
+            since_full = 0
+            for w in reversed(list(self.waves.keys(max=last))):
+                if self.waves[w].full is not None:
+                    break
+                since_full += 1
+            if since_full + 1 < self.KEYFRAME_EVERY:
+                prev = self.checkpoint(last)
+        self.waves[wave] = WaveCheckpoint(wave, cp, prev)
+
+    def wave_numbers(self) -> List[int]:
+        return list(self.waves.keys())
+
+    def checkpoint(self, wave: int) -> Optional[dict]:
+        """The checkpoint at the start of `wave`, rebuilt from the nearest full one before it."""
+        if wave not in self.waves:
+            return None
+        chain = []
+        for w in reversed(list(self.waves.keys(max=wave))):
+            chain.append(self.waves[w])
+            if chain[-1].full is not None:
+                break
+        cp = None
+        for entry in reversed(chain):
+            cp = entry.apply(cp)
+        return cp
+
+    def summaries(self) -> List[Tuple[int, dict]]:
+        """(wave, checkpoint) for every wave, oldest first, in one pass."""
+        out = []
+        cp = None
+        for w, entry in self.waves.items():
+            cp = entry.apply(cp)
+            out.append((w, cp))
+        return out
 
 
 class PlayerProfile(Persistent):
+    # GameHistory of the current (or last) game; set when it records its first wave
+    wave_history = None
+
     def __init__(self, username: str):
         self.username = username
-        self.stats = PersistentMapping({
-            "games_played": 0,
-            "wins": 0,
-            "total_kills": 0,
-        })
-        self.best_score_by_level = OOBTree()
-        self.runs = PersistentList()
+        # Length counters merge concurrent increments instead of raising ConflictError
+        self.stats = PersistentMapping({name: Length() for name in STAT_NAMES})
+        # RunRecords keyed by a time-ordered id (see _new_run_key), oldest first
+        self.runs = RunTree()
+        self.run_total = Length()
+        self.rollups = IOBTree()  # level id -> LevelRollup
 
         
         self.saved_game = None
@@ -44,34 +366,264 @@ class PlayerProfile(Persistent):
 
     def save_game(self, save_dict):
         self._ensure_saved_game_field()
-        self.saved_game = save_dict  # presliikavanje save-a
+        self.saved_game = checkpoint_codec.encode(save_dict)  # presliikavanje save-a
+
+    def start_game_history(self, level_id: int, mode: str):
+        self.wave_history = GameHistory(level_id, mode)
+
+    def record_wave(self, checkpoint: dict):
+        if self.wave_history is None or self.wave_history.level_id != int(checkpoint["level_id"]):
+            self.start_game_history(checkpoint["level_id"], checkpoint.get("mode", "campaign"))
+        self.wave_history.append(checkpoint)
+
+    def saved_checkpoint(self) -> Optional[dict]:
+        """The saved game as a checkpoint dict, whether it was stored encoded or (older saves) as a dict."""
+        return checkpoint_codec.load(getattr(self, "saved_game", None))
+
+    def _migrate_saved_game(self):
+        self._ensure_saved_game_field()
+        if self.saved_game is not None and not isinstance(self.saved_game, bytes):
+            self.saved_game = checkpoint_codec.encode(self.saved_game)
 
     def clear_saved_game(self):
         self._ensure_saved_game_field()
         self.saved_game = None
 
-    def record_run(self, ts_iso: str, level: int, score: int, kills: int, won: bool):
-        self.stats["games_played"] += 1
+    def _upgrade_runs(self):
+        # Profiles from before run records kept every run in one PersistentList of
+        # mappings, and best scores in best_score_by_level. Move the runs into a RunTree
+        # (list positions become keys, which sort before every time-ordered one); the
+        # rollups built from them carry the best scores, so the old table goes.
+        if isinstance(self.runs, PersistentList):
+            runs = RunTree()
+            for seq, run in enumerate(self.runs):
+                runs[seq] = RunRecord.from_mapping(run)
+            self.runs = runs
+            self.run_total = Length(len(runs))
+        self._ensure_rollups()
+        if hasattr(self, "best_score_by_level"):
+            del self.best_score_by_level
+
+    def _migrate_stats(self):
+        # plain ints from before stats were Length counters
+        for name in STAT_NAMES:
+            if not isinstance(self.stats.get(name), Length):
+                self.stats[name] = Length(int(self.stats.get(name, 0)))
+
+    def stat(self, name: str) -> int:
+        value = self.stats[name]
+        return value() if isinstance(value, Length) else int(value)
+
+    def _new_run_key(self) -> int:
+        # Microseconds since the epoch plus 10 random bits: ordered by finish time and
+        # distinct across clients, so concurrent finishes insert different keys, which
+        # RunBucket's conflict resolution merges.
+        key = (time.time_ns() // 1000 << 10) | random.getrandbits(10)
+        while key in self.runs:
+            key += 1
+        return key
+
+    def run_count(self) -> int:
+        return self.run_total()
+
+    def runs_before(self, before: Optional[int], limit: int) -> List[Tuple[int, RunRecord]]:
+        """Up to `limit` (key, run) pairs older than key `before` (None = newest), newest first.
+
+        Each step is a maxKey() descent, so only the records returned are loaded.
+        """
+        runs = self.runs
+        out = []
+        try:
+            key = runs.maxKey() if before is None else runs.maxKey(before - 1)
+            while len(out) < limit:
+                out.append((key, runs[key]))
+                key = runs.maxKey(key - 1)
+        except ValueError:  # no older key
+            pass
+        return out
+
+    def _ensure_rollups(self):
+        # profiles saved before rollups existed: build them from the run records once
+        if hasattr(self, "rollups"):
+            return
+        self.rollups = IOBTree()
+        for run in self.runs.values():
+            self.rollup(run.level, create=True).add(run.score, run.kills, run.won, run.waves)
+
+    def rollup(self, level: int, create: bool = False) -> Optional[LevelRollup]:
+        self._ensure_rollups()
+        r = self.rollups.get(int(level))
+        if r is None and create:
+            r = LevelRollup(level)
+            self.rollups[int(level)] = r
+        return r
+
+    def rollup_levels(self) -> List[int]:
+        self._ensure_rollups()
+        return list(self.rollups.keys())
+
+    def best_score(self, level: int) -> int:
+        r = self.rollup(level)
+        return r.score_max if r is not None else 0
+
+    def record_run(self, ts_iso: str, level: int, score: int, kills: int, won: bool, waves: Optional[int] = None,
+                   replay: Optional[bytes] = None):
+        self._migrate_stats()
+        self.stats["games_played"].change(1)
         if won:
-            self.stats["wins"] += 1
-        self.stats["total_kills"] += kills
+            self.stats["wins"].change(1)
+        self.stats["total_kills"].change(int(kills))
+
+        self.runs[self._new_run_key()] = RunRecord(ts_iso, level, score, kills, won, waves, replay)
+        self.run_total.change(1)
+        # the rollup's score_max is also the level's best score
+        self.rollup(level, create=True).add(score, kills, won, waves)
+
+
+class Leaderboard(Persistent):
+    """Best score per player on one level, kept sorted as players finish runs.
+
+    `entries` is keyed by (-score, ts, username), so the top of the board is
+    the start of the tree and equal scores rank by who got there first.
+    `band_counts` counts players per BAND-wide score band: a rank sums the
+    bands above the player's and walks only the entries in its own band.
+    Concurrent submits from different players touch different entry keys,
+    and band counts merge in _p_resolveConflict.
+    """
+
+    BAND = 64
+
+    def __init__(self, level: int):
+        self.level = int(level)
+        self.entries = OOBTree()  # (-score, ts, username) -> kills
+        self.by_user = OOBTree()  # username -> entry key
+        self.band_counts = {}  # score // BAND -> players
+
+    def _p_resolveConflict(self, old, committed, new):
+        return _resolve_counters(old, committed, new)
+
+    def _count(self, score: int, delta: int):
+        counts = dict(self.band_counts)
+        band = score // self.BAND
+        n = counts.get(band, 0) + delta
+        if n:
+            counts[band] = n
+        else:
+            counts.pop(band, None)
+        self.band_counts = counts
+
+    def submit(self, username: str, score: int, ts: str, kills: int = 0) -> bool:
+        """Record a finished run. Returns True if it is the player's new best on this level."""
+        score = int(score)
+        old = self.by_user.get(username)
+        if old is not None:
+            if -old[0] >= score:
+                return False
+            del self.entries[old]
+            self._count(-old[0], -1)
 
-        prev = self.best_score_by_level.get(level, 0)
-        if score > prev:
-            self.best_score_by_level[level] = score
+        key = (-score, ts, username)
+        self.entries[key] = int(kills)
+        self.by_user[username] = key
+        self._count(score, 1)
+        return True
 
-        self.runs.append(PersistentMapping({
-            "ts": ts_iso,
-            "level": int(level),
-            "score": int(score),
-            "kills": int(kills),
-            "won": bool(won),
-        }))
+    def best(self, username: str) -> Optional[int]:
+        key = self.by_user.get(username)
+        return None if key is None else -key[0]
+
+    def top(self, n: int = 10) -> List[Tuple[int, str, str]]:
+        """The first `n` players as (score, username, ts)."""
+        out = []
+        for neg_score, ts, username in self.entries.keys():
+            if len(out) >= n:
+                break
+            out.append((-neg_score, username, ts))
+        return out
+
+    def rank(self, username: str) -> Optional[int]:
+        """1-based position of the player on this board, or None if they have no run here."""
+        key = self.by_user.get(username)
+        if key is None:
+            return None
+        band = -key[0] // self.BAND
+        above = sum(n for b, n in self.band_counts.items() if b > band)
+        # higher scores in the same band, then equal scores reached earlier
+        band_top = (band + 1) * self.BAND - 1
+        above += len(self.entries.keys((-band_top,), key, excludemax=True))
+        return above + 1
+
+    def player_count(self) -> int:
+        return sum(self.band_counts.values())
 
 
 class GameState(Persistent):
+    schema = 0  # states written before the layout was versioned
+
     def __init__(self):
+        self.schema = SCHEMA_VERSION
         self.profiles = OOBTree()
+        self.leaderboards = OOBTree()  # level id -> Leaderboard
+        self.rollups = IOBTree()  # level id -> LevelRollup over every profile
+
+    def _ensure_leaderboards(self):
+        # state saved before leaderboards existed: fill them once from every profile's best scores
+        if hasattr(self, "leaderboards"):
+            return
+        self.leaderboards = OOBTree()
+        for username, profile in self.profiles.items():
+            for level in profile.rollup_levels():
+                self.leaderboard(level).submit(username, profile.best_score(level), "")
+
+    def leaderboard(self, level: int) -> Leaderboard:
+        self._ensure_leaderboards()
+        board = self.leaderboards.get(int(level))
+        if board is None:
+            board = Leaderboard(level)
+            self.leaderboards[int(level)] = board
+        return board
+
+    def _ensure_rollups(self):
+        # state saved before global rollups existed: merge every profile's rollups once
+        if hasattr(self, "rollups"):
+            return
+        self.rollups = IOBTree()
+        for profile in self.profiles.values():
+            for level in profile.rollup_levels():
+                self.rollup(level, create=True).merge(profile.rollup(level))
+
+    def rollup(self, level: int, create: bool = False) -> Optional[LevelRollup]:
+        self._ensure_rollups()
+        r = self.rollups.get(int(level))
+        if r is None and create:
+            r = LevelRollup(level)
+            self.rollups[int(level)] = r
+        return r
+
+    def record_run(self, username: str, ts_iso: str, level: int, score: int, kills: int, won: bool,
+                   waves: Optional[int] = None, replay: Optional[bytes] = None) -> PlayerProfile:
+        """Record a finished run on the player's profile, the level leaderboard and the global rollup."""
+        profile = self.get_or_create_profile(username)
+        profile.record_run(ts_iso=ts_iso, level=level, score=score, kills=kills, won=won, waves=waves, replay=replay)
+        self.leaderboard(level).submit(username, score, ts_iso, kills)
+        self.rollup(level, create=True).add(score, kills, won, waves)
+        return profile
+
+    def upgrade(self) -> bool:
+        """Migrate data written by an older version now, so that later reads write nothing.
+
+        Returns False without touching the profiles if the state is current.
+        """
+        if self.schema >= SCHEMA_VERSION:
+            return False
+        for profile in self.profiles.values():
+            profile._migrate_saved_game()
+            profile._migrate_stats()
+            profile._upgrade_runs()
+        self._ensure_rollups()
+        self._ensure_leaderboards()
+        self.schema = SCHEMA_VERSION
+        return True
 
     def get_or_create_profile(self, username: str) -> PlayerProfile:
         p = self.profiles.get(username)
@@ -1,6 +1,6 @@
 # objects/enemies.py
 import pygame
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 Vec2 = pygame.Vector2
 
@@ -14,6 +14,14 @@ class Enemy:
     max_hp: int
     path_index: int = 0
     alive: bool = True
+    dist: float = 0.0  # arc length walked along the path
+    # position at the start of the last tick; the renderer interpolates from it to pos.
+    # A move replaces pos with a new vector instead of changing it in place.
+    prev: Vec2 = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.prev is None:
+            self.prev = self.pos
 
     def rect(self) -> pygame.Rect:
         return pygame.Rect(int(self.pos.x - 10), int(self.pos.y - 10), 20, 20)
@@ -1,6 +1,6 @@
 # objects/projectiles.py
 import pygame
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 Vec2 = pygame.Vector2
 
@@ -11,3 +11,10 @@ class Bullet:
     vel: Vec2
     dmg: int
     alive: bool = True
+    # position at the start of the last tick; the renderer interpolates from it to pos.
+    # A move replaces pos with a new vector instead of changing it in place.
+    prev: Vec2 = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.prev is None:
+            self.prev = self.pos
@@ -1,7 +1,7 @@
 # objects/towers.py
 import pygame
-from dataclasses import dataclass
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import List, Tuple
 
 Vec2 = pygame.Vector2
 
@@ -15,6 +15,8 @@ class Tower:
     fire_cd: float
     dmg: int
     cooldown_left: float = 0.0
+    # path arc-length intervals inside range_px, see PathTable.coverage
+    coverage: List[Tuple[float, float]] = field(default_factory=list)
 
     def center_px(self, cell: int, offset: Tuple[int, int]) -> Vec2:
         ox, oy = offset
@@ -0,0 +1,237 @@
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Any, Callable, List, Optional
+
+import transaction
+from ZODB.POSException import ConflictError
+
+from models import GameState
+
+# A write: applied to the worker connection's GameState. It must not return
+# persistent objects, they belong to the worker's connection.
+Write = Callable[[GameState], Any]
+
+_STOP = object()
+
+
+class PersistenceWorker:
+    """Game writes applied and committed on a background thread with its own connection.
+
+    The UI thread submits writes and gets a Future back instead of waiting
+    on the commit. Writes arriving within `batch_window` of each other are
+    applied in order and committed as one transaction. A ConflictError
+    aborts and reapplies the whole batch; any other error fails only the
+    write that raised it. Finished futures are handed back by poll(), and
+    `notify` is called from the worker thread after each batch so a UI
+    blocked on input can wake up and refresh its connection.
+    """
+
+    def __init__(self, db, batch_window: float = 0.02, max_batch: int = 64, max_retries: int = 10,
+                 notify: Optional[Callable[[], None]] = None):
+        self.db = db
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.notify = notify
+        self.commits = 0
+        self.retries = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._done: "queue.Queue[Future]" = queue.Queue()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+
+    def start(self) -> "PersistenceWorker":
+        self._thread.start()
+        return self
+
+    def close(self, timeout: Optional[float] = None):
+        """Commit everything already submitted, then stop the thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    # ----- writes -----
+
+    def submit(self, write: Write) -> Future:
+        fut = Future()
+        self._queue.put((write, fut))
+        return fut
+
+    def ensure_profile(self, username: str) -> Future:
+        def write(gs: GameState):
+            gs.get_or_create_profile(username)
+        return self.submit(write)
+
+    def record_run(self, username: str, ts_iso: str, level: int, score: int, kills: int, won: bool,
+                   waves: Optional[int] = None, replay: Optional[bytes] = None) -> Future:
+        def write(gs: GameState):
+            gs.record_run(username, ts_iso, level, score, kills, won, waves, replay)
+        return self.submit(write)
+
+    def save_game(self, username: str, checkpoint: dict) -> Future:
+        return self.submit(lambda gs: gs.get_or_create_profile(username).save_game(checkpoint))
+
+    def clear_saved_game(self, username: str) -> Future:
+        return self.submit(lambda gs: gs.get_or_create_profile(username).clear_saved_game())
+
+    def save_waves(self, username: str, checkpoints: List[dict]) -> Future:
+        """Add wave-start checkpoints to the player's wave history; the last one becomes the saved game."""
+        def write(gs: GameState):
+            profile = gs.get_or_create_profile(username)
+            for cp in checkpoints:
+                profile.record_wave(cp)
+            profile.save_game(checkpoints[-1])
+        return self.submit(write)
+
+    def start_game_history(self, username: str, level_id: int, mode: str) -> Future:
+        return self.submit(lambda gs: gs.get_or_create_profile(username).start_game_history(level_id, mode))
+
+    # ----- results -----
+
+    def poll(self) -> List[Future]:
+        """Futures finished since the last poll, without blocking."""
+        done = []
+        while True:
+            try:
+                done.append(self._done.get_nowait())
+            except queue.Empty:
+                return done
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every write submitted so far is committed or has failed.
+
+        Writes are applied in order, so this waits on a no-op write queued
+        behind them. Returns False on timeout.
+        """
+        done, _ = wait([self.submit(lambda gs: None)], timeout)
+        return bool(done)
+
+    # ----- worker thread -----
+
+    def _run(self):
+        tm = transaction.TransactionManager()
+        conn = self.db.open(transaction_manager=tm)
+        try:
+            while not self._stopping:
+                batch = self._next_batch()
+                if batch:
+                    self._apply(tm, conn, batch)
+                    if self.notify is not None:
+                        self.notify()
+        finally:
+            tm.abort()
+            conn.close()
+
+    def _next_batch(self) -> list:
+        item = self._queue.get()
+        if item is _STOP:
+            self._stopping = True
+            return []
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    def _apply(self, tm, conn, batch: list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                tm.begin()
+                gs = conn.root()["game_state"]
+                results = [write(gs) for write, _ in batch]
+                tm.commit()
+            except ConflictError as e:
+                tm.abort()
+                self.retries += 1
+                error = e
+                time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+                continue
+            except Exception as e:
+                tm.abort()
+                if len(batch) > 1:  # find the write that failed; the others still go in
+                    for item in batch:
+                        self._apply(tm, conn, [item])
+                    return
+                self._finish(batch[0][1], error=e)
+                return
+            self.commits += 1
+            for (_, fut), result in zip(batch, results):
+                self._finish(fut, result=result)
+            return
+        for _, fut in batch:
+            self._finish(fut, error=error)
+
+    def _finish(self, fut: Future, result=None, error: Optional[BaseException] = None):
+        if error is None:
+            fut.set_result(result)
+        else:
+            fut.set_exception(error)
+        self._done.put(fut)
+
+
+class Autosaver:
+    """Saves one player's wave checkpoints through a PersistenceWorker, coalescing bursts.
+
+    publish() never blocks. Checkpoints published while the previous write
+    is still in flight wait and go out together as one write when it
+    finishes, so at most one write is in flight. Each of them is added to
+    the wave history; only the newest becomes the saved game.
+    """
+
+    def __init__(self, worker: PersistenceWorker, username: str):
+        self.worker = worker
+        self.username = username
+        self.published = 0
+        self.written = 0
+        # reentrant: add_done_callback runs the callback at once if the write already finished
+        self._lock = threading.RLock()
+        self._pending: List[dict] = []
+        self._in_flight: Optional[Future] = None
+        self._closed = False
+
+    def publish(self, checkpoint: dict):
+        with self._lock:
+            self.published += 1
+            self._pending.append(checkpoint)
+            if self._in_flight is None and not self._closed:
+                self._submit()
+
+    def close(self):
+        """Submit the checkpoints still waiting, if any, and stop.
+
+        Writes are applied in order, so it lands before anything submitted
+        to the worker after close(), e.g. clearing the save when the game is lost.
+        """
+        with self._lock:
+            self._closed = True
+            if self._pending:
+                self._submit()
+
+    def _submit(self):
+        checkpoints, self._pending = self._pending, []
+        fut = self.worker.save_waves(self.username, checkpoints)
+        self._in_flight = fut
+        fut.add_done_callback(self._written)
+
+    def _written(self, fut: Future):
+        # runs on the worker thread
+        with self._lock:
+            if fut is self._in_flight:
+                self._in_flight = None
+            if fut.exception() is None:
+                self.written += 1
+            if self._pending and not self._closed:
+                self._submit()
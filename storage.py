@@ -1,10 +1,53 @@
+from typing import Callable, Optional, Tuple, Union
+
 from ZODB import DB
 from ZODB.FileStorage import FileStorage
 import transaction
 
+# ZEO's own default; the client cache holds object records so repeated
+# reads (history pages, profile lookups) don't go back to the server
+ZEO_CACHE_SIZE = 20 * 1024 * 1024
+
+
+def parse_zeo_address(address: str) -> Union[str, Tuple[str, int]]:
+    """"host:port" or ":port" -> (host, port); anything else is a unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def make_storage(path="game_data.fs", zeo: Optional[str] = None, cache_size: int = ZEO_CACHE_SIZE):
+    """A FileStorage on `path`, or a client of the ZEO server at `zeo`.
+
+    A FileStorage is locked by the process that opens it; to share one
+    database between several game instances serve it with ZEO, e.g.
+
+        python -m tools.serve_zeo --addr 127.0.0.1:8100 --path game_data.fs
+
+    and start every instance with --zeo 127.0.0.1:8100. The server has to
+    be able to import `models`, or it cannot merge concurrent finishes and
+    they fail with ConflictError; tools.serve_zeo takes care of that, a
+    bare `runzeo` needs the game directory on its PYTHONPATH.
+    """
+    if zeo is None:
+        return FileStorage(path)
+    from ZEO.ClientStorage import ClientStorage
+    return ClientStorage(parse_zeo_address(zeo), cache_size=cache_size, wait_timeout=30)
+
+
+def start_zeo_server(path: Optional[str] = None, port: int = 0) -> Tuple[Tuple[str, int], Callable[[], None]]:
+    """Serve `path` (in memory if None) from a thread in this process.
+
+    Returns the address and a stop function. Meant for tools and tests;
+    a shared game database should be served by tools.serve_zeo.
+    """
+    import ZEO
+    return ZEO.server(path=path, port=port)
+
 
-def open_storage(path="game_data.fs"):
-    storage = FileStorage(path)
+def open_storage(path="game_data.fs", zeo: Optional[str] = None, cache_size: int = ZEO_CACHE_SIZE):
+    storage = make_storage(path, zeo, cache_size)
     db = DB(storage)
     conn = db.open()
     root = conn.root()
@@ -0,0 +1,90 @@
+# tests/test_checkpoint_codec.py
+import pytest
+
+from game import checkpoint_codec
+from game.simulation import Simulation
+from levels.level1 import get_level_1
+
+LAYOUT = [("basic", 2, 4), ("shotgun", 7, 3), ("sniper", 9, 5)]
+
+
+def built_game() -> Simulation:
+    sim = Simulation(get_level_1())
+    sim.gold = 10000
+    for kind, gx, gy in LAYOUT:
+        sim.selected_tower = kind
+        sim._try_build(gx, gy)
+    return sim
+
+
+def mid_wave_game(ticks: int = 300) -> Simulation:
+    sim = built_game()
+    sim.run_wave()
+    sim._start_wave()
+    for _ in range(ticks):
+        sim.update(1 / 60)
+    return sim
+
+
+def test_build_phase_checkpoint_round_trips():
+    cp = built_game()._make_checkpoint()
+    data = checkpoint_codec.encode(cp)
+    assert data[:4] == checkpoint_codec.MAGIC
+    assert checkpoint_codec.decode(data) == cp
+    assert checkpoint_codec.load(data) == cp
+
+
+def test_mid_wave_checkpoint_resumes_tick_for_tick():
+    sim = mid_wave_game()
+    sim._save_and_exit()
+    cp = checkpoint_codec.decode(checkpoint_codec.encode(sim.saved_checkpoint))
+    assert {k: v for k, v in cp.items() if k != "snapshot"} == {
+        k: v for k, v in sim.saved_checkpoint.items() if k != "snapshot"}
+
+    resumed = Simulation(get_level_1(), load_state=cp)
+    for _ in range(300):
+        sim.update(1 / 60)
+        resumed.update(1 / 60)
+    resumed.msg = sim.msg  # "Loaded save: ..." instead of the wave banner
+    assert resumed.snapshot() == sim.snapshot()
+
+
+def test_snapshot_round_trip_drops_only_coverage():
+    snap = mid_wave_game().snapshot()
+    decoded = checkpoint_codec.decode_snapshot(checkpoint_codec.encode_snapshot(snap))
+    assert [t[-1] for t in decoded["towers"]] == [None] * len(LAYOUT)
+    assert [t[:-1] for t in decoded["towers"]] == [t[:-1] for t in snap["towers"]]
+    assert {k: v for k, v in decoded.items() if k != "towers"} == {k: v for k, v in snap.items() if k != "towers"}
+
+    restored = Simulation(get_level_1())
+    restored.restore(decoded)
+    assert restored.snapshot() == snap
+
+
+def test_migrate_fills_in_and_coerces_old_dicts():
+    old = {"level_id": "2", "gold": 75.0, "towers": [{"kind": "sniper", "gx": 1, "gy": "2"}]}
+    assert checkpoint_codec.migrate(old) == {
+        "version": 1, "level_id": 2, "mode": "campaign", "lives": 15, "gold": 75, "score": 0.0, "kills": 0,
+        "waves_cleared": 0, "current_wave_number": 1, "selected_tower": "basic",
+        "towers": [{"kind": "sniper", "gx": 1, "gy": 2, "cooldown_left": 0.0}],
+    }
+    assert checkpoint_codec.load(old) == checkpoint_codec.migrate(old)
+    assert checkpoint_codec.load(None) is None
+
+
+def test_migrated_dict_encodes_as_itself():
+    cp = checkpoint_codec.migrate({"level_id": 3, "mode": "endless", "score": 12.5})
+    assert checkpoint_codec.decode(checkpoint_codec.encode(cp)) == cp
+
+
+@pytest.mark.parametrize("data", [b"", b"xx", b"NOPE\x02", b"GDCK\x09"])
+def test_decode_rejects_other_data(data):
+    with pytest.raises(checkpoint_codec.CheckpointFormatError):
+        checkpoint_codec.decode(data)
+
+
+def test_decode_rejects_truncated_data():
+    data = checkpoint_codec.encode(built_game()._make_checkpoint())
+    for end in (6, 20, len(data) - 3):
+        with pytest.raises(checkpoint_codec.CheckpointFormatError):
+            checkpoint_codec.decode(data[:end])
@@ -0,0 +1,118 @@
+# tests/test_conflicts.py
+"""Three-way merges done by the _p_resolveConflict methods in models.
+
+Each test builds the old state two transactions started from, the state
+one of them committed and the state the other wants to commit, the way
+ZODB hands them over, and checks the merge.
+"""
+import pytest
+from ZODB.POSException import ConflictError
+
+from models import Leaderboard, LevelRollup, RunBucket, RunTree, _merge_items, _resolve_counters
+
+
+def states(obj, mine, theirs):
+    """(old, committed, new) states of `obj` after `theirs` commits and `mine` tries to."""
+    old = obj.__getstate__()
+    committed = type(obj).__new__(type(obj))
+    committed.__setstate__(old)
+    theirs(committed)
+    new = type(obj).__new__(type(obj))
+    new.__setstate__(old)
+    mine(new)
+    return old, committed.__getstate__(), new.__getstate__()
+
+
+def test_counters_add_both_deltas():
+    old = {"count": 1, "hist": (1, 0), "bands": {1: 1}, "name": "a"}
+    committed = {"count": 2, "hist": (1, 1), "bands": {1: 2}, "name": "a"}
+    new = {"count": 3, "hist": (2, 0), "bands": {1: 0, 2: 1}, "name": "a"}
+    out = _resolve_counters(old, committed, new)
+    assert out == {"count": 4, "hist": (2, 1), "bands": {1: 1, 2: 1}, "name": "a"}
+
+
+def test_counters_keep_min_and_max():
+    old = {"lo": 10, "hi": 10}
+    out = _resolve_counters(old, {"lo": 5, "hi": 12}, {"lo": 7, "hi": 20}, lowest=("lo",), highest=("hi",))
+    assert out == {"lo": 5, "hi": 20}
+    out = _resolve_counters({"lo": None}, {"lo": None}, {"lo": 3}, lowest=("lo",))
+    assert out == {"lo": 3}
+
+
+def test_counters_take_a_one_sided_change():
+    out = _resolve_counters({"name": "a", "n": 1}, {"name": "a", "n": 2}, {"name": "b", "n": 1})
+    assert out == {"name": "b", "n": 2}
+
+
+def test_counters_refuse_other_changes_on_both_sides():
+    with pytest.raises(ConflictError):
+        _resolve_counters({"name": "a"}, {"name": "b"}, {"name": "c"})
+
+
+def test_level_rollup_merges_concurrent_runs():
+    r = LevelRollup(1)
+    r.add(100, 5, False, waves=2)
+    old, committed, new = states(r, lambda x: x.add(3000, 40, True, waves=9), lambda x: x.add(7, 1, False))
+    merged = LevelRollup.__new__(LevelRollup)
+    merged.__setstate__(r._p_resolveConflict(old, committed, new))
+
+    expected = LevelRollup(1)
+    for args in ((100, 5, False, 2), (7, 1, False, None), (3000, 40, True, 9)):
+        expected.add(*args)
+    assert merged.__getstate__() == expected.__getstate__()
+
+
+def test_leaderboard_merges_band_counts():
+    board = Leaderboard(1)
+    board.band_counts = {0: 1}
+    old, committed, new = states(board, lambda b: b._count(200, 1), lambda b: b._count(10, 1))
+    out = board._p_resolveConflict(old, committed, new)
+    assert out["band_counts"] == {0: 2, 200 // Leaderboard.BAND: 1}
+
+
+def test_merge_items_takes_both_inserts():
+    assert _merge_items((1, "a"), (1, "a", 2, "b"), (1, "a", 3, "c")) == (1, "a", 2, "b", 3, "c")
+
+
+@pytest.mark.parametrize("committed, new", [
+    ((1, "a", 2, "b"), (1, "a", 2, "c")),  # same key inserted on both sides
+    ((1, "b"), (1, "c")),  # same key changed on both sides
+    ((1, "b"), ()),  # changed on one side, deleted on the other
+    ((), ()),  # emptied bucket
+])
+def test_merge_items_conflicts(committed, new):
+    with pytest.raises(ConflictError):
+        _merge_items((1, "a"), committed, new)
+
+
+def test_run_bucket_merges_appends():
+    bucket = RunBucket()
+    bucket[1] = "a"
+    old, committed, new = states(bucket, lambda b: b.__setitem__(3, "c"), lambda b: b.__setitem__(2, "b"))
+    merged = RunBucket()
+    merged.__setstate__(bucket._p_resolveConflict(old, committed, new))
+    assert list(merged.items()) == [(1, "a"), (2, "b"), (3, "c")]
+
+
+def test_run_bucket_refuses_a_split():
+    bucket = RunBucket()
+    with pytest.raises(ConflictError):
+        bucket._p_resolveConflict(((1, "a"),), ((1, "a"),), ((1, "a"), object()))
+
+
+def test_run_tree_merges_its_inline_bucket():
+    tree = RunTree()
+    tree[1] = "a"
+    old, committed, new = states(tree, lambda t: t.__setitem__(3, "c"), lambda t: t.__setitem__(2, "b"))
+    merged = RunTree()
+    merged.__setstate__(tree._p_resolveConflict(old, committed, new))
+    assert list(merged.items()) == [(1, "a"), (2, "b"), (3, "c")]
+    assert tree._p_resolveConflict(None, ((((1, "a"),),),), ((((2, "b"),),),)) == ((((1, "a", 2, "b"),),),)
+
+
+def test_run_tree_refuses_a_split():
+    tree = RunTree()
+    for k in range(RunTree.max_leaf_size + 1):
+        tree[k] = "x"
+    with pytest.raises(ConflictError):
+        tree._p_resolveConflict(((((1, "a"),),),), tree.__getstate__(), ((((1, "a"),),),))
@@ -0,0 +1,73 @@
+# tests/test_leaderboard.py
+import random
+
+from models import Leaderboard
+
+BAND = Leaderboard.BAND
+
+
+def brute_force_order(best):
+    """Usernames best first, ties by who got there first, as Leaderboard ranks them."""
+    return [u for u, _ in sorted(best.items(), key=lambda item: (-item[1][0], item[1][1], item[0]))]
+
+
+def test_equal_scores_rank_by_who_got_there_first():
+    board = Leaderboard(1)
+    board.submit("late", 500, "2026-01-02")
+    board.submit("early", 500, "2026-01-01")
+    board.submit("top", 900, "2026-01-03")
+    assert [board.rank(u) for u in ("top", "early", "late")] == [1, 2, 3]
+    assert board.top() == [(900, "top", "2026-01-03"), (500, "early", "2026-01-01"), (500, "late", "2026-01-02")]
+    assert board.player_count() == 3
+
+
+def test_improving_moves_the_player_between_bands_once():
+    board = Leaderboard(1)
+    board.submit("a", 10, "t1")
+    board.submit("b", 3 * BAND, "t2")
+    assert board.band_counts == {0: 1, 3: 1}
+    assert board.rank("a") == 2
+
+    assert board.submit("a", 5 * BAND + 1, "t3")
+    assert board.band_counts == {3: 1, 5: 1}
+    assert board.player_count() == 2
+    assert board.best("a") == 5 * BAND + 1
+    assert board.rank("a") == 1 and board.rank("b") == 2
+    assert len(board.entries) == 2
+
+
+def test_submit_below_the_best_changes_nothing():
+    board = Leaderboard(1)
+    board.submit("a", 700, "t1", kills=9)
+    before = (dict(board.entries), dict(board.by_user), dict(board.band_counts))
+    assert not board.submit("a", 700, "t2", kills=50)
+    assert not board.submit("a", 20, "t3")
+    assert (dict(board.entries), dict(board.by_user), dict(board.band_counts)) == before
+
+
+def test_unknown_player_has_no_rank():
+    board = Leaderboard(1)
+    board.submit("a", 1, "t1")
+    assert board.rank("nobody") is None
+    assert board.best("nobody") is None
+
+
+def test_rank_matches_a_brute_force_sort():
+    rng = random.Random(7)
+    board = Leaderboard(2)
+    best = {}  # username -> (score, ts) of the best run
+    for i in range(2000):
+        username = f"p{rng.randrange(150)}"
+        # few distinct scores, so ties and band edges come up often
+        score = rng.choice((0, BAND - 1, BAND, 2 * BAND)) if rng.random() < 0.2 else rng.randrange(20 * BAND)
+        ts = f"{i:06d}"
+        improved = board.submit(username, score, ts)
+        assert improved == (username not in best or score > best[username][0])
+        if improved:
+            best[username] = (score, ts)
+
+    order = brute_force_order(best)
+    assert [board.rank(u) for u in order] == list(range(1, len(order) + 1))
+    assert [u for _, u, _ in board.top(len(order))] == order
+    assert board.player_count() == len(best)
+    assert sum(board.band_counts.values()) == len(best)
@@ -0,0 +1,186 @@
+# tests/test_persistence.py
+import threading
+import time
+
+import pytest
+import transaction
+from ZODB import DB
+from ZODB.POSException import ConflictError
+
+from game import checkpoint_codec
+from models import GameState
+from persistence import Autosaver, PersistenceWorker
+
+
+@pytest.fixture
+def db():
+    db = DB(None)
+    with db.transaction() as conn:
+        conn.root()["game_state"] = GameState()
+    yield db
+    db.close()
+
+
+def read(db, fn):
+    conn = db.open(transaction_manager=transaction.TransactionManager())
+    try:
+        return fn(conn.root()["game_state"])
+    finally:
+        conn.close()
+
+
+def usernames(db):
+    return read(db, lambda gs: sorted(gs.profiles))
+
+
+def add(username, calls=None):
+    def write(gs):
+        if calls is not None:
+            calls.append(username)
+        gs.get_or_create_profile(username)
+        return username
+    return write
+
+
+def test_conflict_retries_the_whole_batch(db):
+    calls = []
+    conflicts = [ConflictError()]
+
+    def conflicting(gs):
+        calls.append("b")
+        gs.get_or_create_profile("b")
+        if conflicts:
+            raise conflicts.pop()
+
+    worker = PersistenceWorker(db, batch_window=0.5)
+    futures = [worker.submit(add("a", calls)), worker.submit(conflicting), worker.submit(add("c", calls))]
+    worker.start()  # all three are queued, so they form one batch
+    assert worker.flush(5)
+    worker.close(5)
+
+    assert calls == ["a", "b", "a", "b", "c"]
+    assert [f.result() for f in futures] == ["a", None, "c"]
+    assert worker.retries == 1
+    assert worker.commits == 1  # the flush no-op joins the same batch
+    assert usernames(db) == ["a", "b", "c"]
+
+
+def test_failing_write_fails_only_its_own_future(db):
+    def failing(gs):
+        gs.get_or_create_profile("bad")
+        raise ValueError("bad write")
+
+    worker = PersistenceWorker(db, batch_window=0.5)
+    ok1, bad, ok2 = worker.submit(add("a")), worker.submit(failing), worker.submit(add("c"))
+    worker.start()
+    assert worker.flush(5)
+    worker.close(5)
+
+    assert ok1.result() == "a" and ok2.result() == "c"
+    with pytest.raises(ValueError):
+        bad.result()
+    assert usernames(db) == ["a", "c"]
+    assert set(worker.poll()) >= {ok1, bad, ok2}
+
+
+def test_flush_waits_for_earlier_writes(db):
+    release = threading.Event()
+
+    def slow(gs):
+        release.wait(5)
+        gs.get_or_create_profile("slow")
+
+    worker = PersistenceWorker(db, batch_window=0).start()
+    fut = worker.submit(slow)
+    assert not worker.flush(0.1)  # still held up by the slow write
+    release.set()
+    assert worker.flush(5)
+    assert fut.done()
+    assert usernames(db) == ["slow"]
+    worker.close(5)
+
+
+def wave(n):
+    return checkpoint_codec.migrate({"level_id": 1, "current_wave_number": n, "gold": 100 + n})
+
+
+def blocked_worker(db):
+    """A started worker held up by a write until the returned event is set."""
+    release = threading.Event()
+    worker = PersistenceWorker(db, batch_window=0).start()
+    worker.submit(lambda gs: release.wait(5))
+    return worker, release
+
+
+def saved_game(db, username):
+    def get(gs):
+        profile = gs.profiles[username]
+        return profile.saved_checkpoint(), profile.wave_history.wave_numbers()
+    return read(db, get)
+
+
+def wait_for(cond, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_autosaver_keeps_one_write_in_flight(db):
+    worker, release = blocked_worker(db)
+    sizes, in_flight, most = [], [], []
+    save_waves = worker.save_waves
+
+    def counting(username, checkpoints):
+        sizes.append(len(checkpoints))
+        in_flight.append(1)
+        most.append(len(in_flight))
+        fut = save_waves(username, checkpoints)
+        fut.add_done_callback(lambda f: in_flight.pop())
+        return fut
+
+    worker.save_waves = counting
+    saver = Autosaver(worker, "p")
+    for n in range(1, 5):
+        saver.publish(wave(n))
+    assert sizes == [1]
+    release.set()
+    wait_for(lambda: saver.written == 2)
+    assert worker.flush(5)
+    worker.close(5)
+
+    assert sizes == [1, 3]
+    assert max(most) == 1
+    assert saver.published == 4
+
+
+def test_checkpoints_published_during_a_write_go_out_together(db):
+    worker, release = blocked_worker(db)
+    saver = Autosaver(worker, "p")
+    for n in (1, 2, 3):
+        saver.publish(wave(n))
+    release.set()
+    wait_for(lambda: saver.written == 2)
+    assert worker.flush(5)
+    worker.close(5)
+
+    saved, waves = saved_game(db, "p")
+    assert saved == wave(3)
+    assert waves == [1, 2, 3]
+
+
+def test_close_sends_pending_checkpoints_before_a_later_clear(db):
+    worker, release = blocked_worker(db)
+    saver = Autosaver(worker, "p")
+    saver.publish(wave(1))
+    saver.publish(wave(2))  # waits behind wave 1
+    saver.close()
+    worker.clear_saved_game("p")  # the game was lost
+    release.set()
+    assert worker.flush(5)
+    worker.close(5)
+
+    assert saver.written == 2
+    saved, waves = saved_game(db, "p")
+    assert saved is None
+    assert waves == [1, 2]
@@ -0,0 +1,54 @@
+# tests/test_replay.py
+from game.constants import TICK_RATE
+from game.replay import Replay, ReplayPlayer, ReplayRecorder
+from game.simulation import Simulation
+from levels.level1 import get_level_1
+
+LAYOUT = [("basic", 2, 4), ("shotgun", 7, 3), ("sniper", 9, 5), ("basic", 4, 6), ("sniper", 11, 2)]
+
+
+def live_game(waves: int = 4):
+    """A game played through apply_input while a ReplayRecorder records it."""
+    sim = Simulation(get_level_1())
+    recorder = ReplayRecorder(sim, keyframe_every=5 * TICK_RATE)
+    pending = list(LAYOUT)
+    for _ in range(waves):
+        for _ in range(TICK_RATE):
+            if pending and sim.gold >= sim.tower_defs[pending[0][0]]["cost"]:
+                kind, gx, gy = pending.pop(0)
+                sim.apply_input(("select", kind))
+                sim.apply_input(("build", gx, gy))
+            sim.update(1 / TICK_RATE)
+        sim.apply_input(("start",))
+        while sim.wave_in_progress and not sim.lost:
+            sim.update(1 / TICK_RATE)
+    return sim, recorder.finish()
+
+
+def test_replay_reaches_the_live_final_state():
+    sim, replay = live_game()
+    assert len(replay.keyframes) > 2
+    assert any(action[0] == "build" for _, action in replay.inputs)
+
+    replay = Replay.decode(replay.encode())
+    player = ReplayPlayer(replay, Simulation(get_level_1()))
+    player.run_to_end()
+    assert player.matches()
+    assert player.sim.tick == sim.tick
+    assert player.sim.snapshot() == sim.snapshot()
+
+    player.seek(replay.start_tick + 7 * TICK_RATE)  # back through a keyframe
+    player.run_to_end()
+    assert player.sim.snapshot() == sim.snapshot()
+
+
+def test_off_grid_builds_are_ignored():
+    sim = Simulation(get_level_1())
+    sim.gold = 10000
+    seen = []
+    sim.on_input = lambda tick, action: seen.append(action)
+    for gx, gy in ((-1, 0), (0, -1), (sim.grid_w, 0), (0, sim.grid_h)):
+        assert not sim.apply_input(("build", gx, gy))
+    assert sim.towers == [] and seen == []
+    assert sim.apply_input(("build", 2, 4))
+    assert len(sim.towers) == 1 and seen == [("build", 2, 4)]
@@ -0,0 +1,69 @@
+# tests/test_rewind.py
+from game.constants import TICK_RATE
+from game.replay import ReplayPlayer, ReplayRecorder
+from game.rewind import RewindBuffer
+from game.simulation import Simulation
+from levels.level1 import get_level_1
+
+LAYOUT = [("basic", 2, 4), ("shotgun", 7, 3), ("sniper", 9, 5), ("basic", 4, 6)]
+
+
+def play(sim: Simulation, waves: int):
+    """One tower per build phase, then the wave, through apply_input like the game screen."""
+    dt = 1.0 / TICK_RATE
+    for kind, gx, gy in LAYOUT[:waves]:
+        for _ in range(TICK_RATE):
+            sim.update(dt)
+        sim.apply_input(("select", kind))
+        sim.apply_input(("build", gx, gy))
+        sim.apply_input(("start",))
+        while sim.wave_in_progress and not sim.lost:
+            sim.update(dt)
+
+
+def test_rewind_and_resume_reproduces_the_run():
+    sim = Simulation(get_level_1())
+    sim.gold = 10000
+    play(sim, 1)
+    sim.apply_input(("start",))
+    seen = {}
+    buffer = RewindBuffer()
+    for _ in range(20 * TICK_RATE):
+        sim.update(1 / TICK_RATE)
+        buffer.record(sim)
+        seen[sim.tick] = sim.snapshot()
+    end = sim.tick
+
+    assert buffer.rewind(sim, 5)
+    assert end - 6 * TICK_RATE < sim.tick <= end - 5 * TICK_RATE
+    assert sim.snapshot() == seen[sim.tick]
+    while sim.tick < end:
+        sim.update(1 / TICK_RATE)
+        assert sim.snapshot() == seen[sim.tick]
+    assert not buffer.rewind(sim, 60)
+
+
+def recorded_game():
+    sim = Simulation(get_level_1())
+    sim.gold = 10000
+    recorder = ReplayRecorder(sim, keyframe_every=10 ** 6)  # only the starting keyframe
+    play(sim, len(LAYOUT))
+    return recorder.finish(), sim.snapshot()
+
+
+def test_replay_rewinds_through_its_buffer():
+    replay, final = recorded_game()
+    build = [tick for tick, action in replay.inputs if action[0] == "build"][-1]
+    player = ReplayPlayer(replay, Simulation(get_level_1()))
+    player.seek(build + 5 * TICK_RATE)
+
+    # back across the last build, without re-simulating from the starting keyframe
+    assert player.rewind(10) < TICK_RATE
+    assert player.sim.tick == build - 5 * TICK_RATE
+    fresh = ReplayPlayer(replay, Simulation(get_level_1()))
+    fresh.seek(player.sim.tick)
+    assert player.sim.snapshot() == fresh.sim.snapshot()
+
+    player.run_to_end()
+    assert player.matches()
+    assert player.sim.snapshot() == final
@@ -0,0 +1,75 @@
+# tests/test_wave_history.py
+import random
+
+from game import checkpoint_codec
+from models import GameHistory
+
+KINDS = ("basic", "shotgun", "sniper")
+
+
+def game(waves: int, seed: int = 3):
+    """Wave-start checkpoints of a made-up game: towers built, swapped, sold and cooling down."""
+    rng = random.Random(seed)
+    towers = {}  # (gx, gy) -> (kind, cooldown_left), in build order
+    out = []
+    for wave in range(1, waves + 1):
+        for _ in range(rng.randrange(3)):
+            towers[(rng.randrange(12), rng.randrange(8))] = (rng.choice(KINDS), 0.0)
+        for pos in list(towers):
+            roll = rng.random()
+            if roll < 0.1:
+                del towers[pos]
+            elif roll < 0.4:
+                towers[pos] = (towers[pos][0], round(rng.random(), 3))
+            elif roll < 0.5:
+                towers[pos] = (rng.choice(KINDS), towers[pos][1])
+        out.append(checkpoint_codec.migrate({
+            "level_id": 2, "mode": "endless" if wave > 10 else "campaign", "lives": 15 - wave // 4,
+            "gold": rng.randrange(500), "score": wave * 37.5, "kills": wave * 6, "waves_cleared": wave - 1,
+            "current_wave_number": wave, "selected_tower": rng.choice(KINDS),
+            "towers": [{"kind": kind, "gx": gx, "gy": gy, "cooldown_left": cd} for (gx, gy), (kind, cd) in towers.items()],
+        }))
+    return out
+
+
+def history(checkpoints) -> GameHistory:
+    h = GameHistory(2, "campaign")
+    for cp in checkpoints:
+        h.append(cp)
+    return h
+
+
+def test_every_wave_rebuilds_exactly():
+    cps = game(30)
+    h = history(cps)
+    assert h.wave_numbers() == list(range(1, 31))
+    for cp in cps:
+        assert h.checkpoint(cp["current_wave_number"]) == cp
+    assert h.summaries() == [(cp["current_wave_number"], cp) for cp in cps]
+    assert h.checkpoint(31) is None
+
+
+def test_full_checkpoint_every_keyframe_waves():
+    h = history(game(30))
+    full = [w for w, entry in h.waves.items() if entry.full is not None]
+    assert full == list(range(1, 31, GameHistory.KEYFRAME_EVERY))
+
+
+def test_snapshot_is_not_stored():
+    cp = dict(game(1)[0], snapshot=b"mid-wave state")
+    assert history([cp]).checkpoint(1) == game(1)[0]
+
+
+def test_earlier_wave_truncates_the_later_ones():
+    cps = game(12)
+    h = history(cps)
+    replayed = game(12, seed=4)
+    h.append(replayed[4])  # wave 5 again, on another timeline
+    assert h.wave_numbers() == [1, 2, 3, 4, 5]
+    assert h.checkpoint(5) == replayed[4]
+    assert h.checkpoint(4) == cps[3]
+
+    for cp in replayed[5:]:
+        h.append(cp)
+    assert h.wave_numbers() == list(range(1, 13))
+    assert [h.checkpoint(w) for w in range(6, 13)] == replayed[5:]
@@ -0,0 +1,229 @@
+# tools/batch_sim.py
+"""Headless balance sweeps over tower_defs / enemy_defs overrides.
+
+Every combination of the parameter grid is played on every level and
+tower layout, spread over a process pool. One result per run is streamed
+to JSONL or CSV as soon as it finishes.
+
+    python -m tools.batch_sim --param tower_defs.basic.dmg=16,20,24 \\
+        --param enemy_defs.fast.hp=40,50 --levels 1 2 3 --out sweep.jsonl
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from game.simulation import Simulation
+from levels.level1 import get_level_1
+from levels.level2 import get_level_2
+from levels.level3 import get_level_3
+
+LEVELS = {lvl["id"]: lvl for lvl in (get_level_1(), get_level_2(), get_level_3())}
+
+CSV_FIELDS = ["run", "level", "layout", "mode", "overrides", "waves_survived", "lives_lost",
+              "lost", "campaign_completed", "kills", "score", "gold_curve", "ticks", "seconds"]
+
+
+def make_simulation(level_data: dict, mode: str, backend: str) -> Simulation:
+    if backend == "vectorized":
+        from game.vectorized import VectorizedSimulation
+        return VectorizedSimulation(level_data, mode=mode)
+    return Simulation(level_data, mode=mode)
+
+
+def apply_overrides(sim: Simulation, overrides: Dict[str, Any]):
+    """Apply dotted overrides such as {"tower_defs.basic.dmg": 24} before any tower is built."""
+    for key, value in overrides.items():
+        path = key.split(".")
+        target = getattr(sim, path[0])
+        for part in path[1:-1]:
+            target = target[part]
+        target[path[-1]] = value
+
+
+def path_walk(path_grid: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Path cells in the order enemies walk over them."""
+    cells = []
+    for (x1, y1), (x2, y2) in zip(path_grid, path_grid[1:]):
+        dx = (x2 > x1) - (x2 < x1)
+        dy = (y2 > y1) - (y2 < y1)
+        for i in range(max(abs(x2 - x1), abs(y2 - y1))):
+            cells.append((x1 + dx * i, y1 + dy * i))
+    cells.append(tuple(path_grid[-1]))
+    return cells
+
+
+def path_hugging_layout(sim: Simulation, kinds: List[str]) -> List[Tuple[str, int, int]]:
+    """Free cells next to the path, earliest along the path first, cycling through `kinds`."""
+    spots = []
+    seen = set()
+    for px, py in path_walk(sim.path_grid):
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                c = (px + dx, py + dy)
+                if c in seen or c in sim.path_cells:
+                    continue
+                if 0 <= c[0] < sim.grid_w and 0 <= c[1] < sim.grid_h:
+                    seen.add(c)
+                    spots.append(c)
+    return [(kinds[i % len(kinds)], gx, gy) for i, (gx, gy) in enumerate(spots)]
+
+
+BUILTIN_LAYOUTS = {
+    "basic": ["basic"],
+    "sniper": ["sniper"],
+    "shotgun": ["shotgun"],
+    "mixed": ["basic", "sniper", "shotgun"],
+}
+
+
+def play(sim: Simulation, layout: List[Tuple[str, int, int]], max_waves: int) -> List[int]:
+    """Build the layout in order as gold allows, wave after wave. Returns gold after each wave."""
+    gold_curve = []
+    pending = list(layout)
+    for _ in range(max_waves):
+        while pending and sim.gold >= sim.tower_defs[pending[0][0]]["cost"]:
+            kind, gx, gy = pending.pop(0)
+            sim.selected_tower = kind
+            sim._try_build(gx, gy)
+
+        if sim.victory_choice_active:
+            break
+        sim.run_wave()
+        gold_curve.append(int(sim.gold))
+        if sim.lost:
+            break
+    return gold_curve
+
+
+def run_one(job: Dict[str, Any]) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    sim = make_simulation(LEVELS[job["level"]], job["mode"], job["backend"])
+    apply_overrides(sim, job["overrides"])
+
+    layout = job["layout"]
+    if isinstance(layout, str):
+        layout = path_hugging_layout(sim, BUILTIN_LAYOUTS[layout])
+    lives_start = sim.lives
+    gold_curve = play(sim, layout, job["max_waves"])
+
+    return {
+        "run": job["run"],
+        "level": job["level"],
+        "layout": job["layout_name"],
+        "mode": job["mode"],
+        "overrides": job["overrides"],
+        "waves_survived": int(sim.waves_cleared),
+        "lives_lost": int(lives_start - max(sim.lives, 0)),
+        "lost": bool(sim.lost),
+        "campaign_completed": bool(sim.campaign_completed),
+        "kills": int(sim.kills),
+        "score": int(sim.score),
+        "gold_curve": gold_curve,
+        "ticks": int(sim.tick),
+        "seconds": round(time.perf_counter() - t0, 4),
+    }
+
+
+def parse_value(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def build_grid(params: List[str], grid_file: Optional[str]) -> List[Dict[str, Any]]:
+    axes: Dict[str, List[Any]] = {}
+    if grid_file:
+        with open(grid_file, "r", encoding="utf-8") as f:
+            axes.update(json.load(f))
+    for p in params:
+        key, _, values = p.partition("=")
+        axes[key] = [parse_value(v) for v in values.split(",")]
+
+    keys = list(axes)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(axes[k] for k in keys))]
+
+
+def load_layouts(names: List[str], layout_file: Optional[str]) -> Dict[str, Any]:
+    """Builtin layouts by name, plus {"name": {"<level id>": [[kind, gx, gy], ...]}} from a file."""
+    layouts: Dict[str, Any] = {n: n for n in names}
+    if layout_file:
+        with open(layout_file, "r", encoding="utf-8") as f:
+            for name, per_level in json.load(f).items():
+                layouts[name] = {int(k): [tuple(t) for t in v] for k, v in per_level.items()}
+    return layouts
+
+
+def iter_jobs(args, grid, layouts) -> Iterator[Dict[str, Any]]:
+    run = 0
+    for overrides in grid:
+        for level in args.levels:
+            for name, layout in layouts.items():
+                if isinstance(layout, dict):
+                    if level not in layout:
+                        continue
+                    layout = layout[level]
+                yield {
+                    "run": run, "level": level, "mode": args.mode, "backend": args.backend,
+                    "overrides": overrides, "layout": layout, "layout_name": name,
+                    "max_waves": args.max_waves,
+                }
+                run += 1
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--param", action="append", default=[], metavar="KEY=V1,V2",
+                    help="dotted override axis, e.g. tower_defs.sniper.cd=0.8,1.0")
+    ap.add_argument("--grid", help="JSON file {key: [values]} merged with --param")
+    ap.add_argument("--levels", type=int, nargs="+", default=sorted(LEVELS))
+    ap.add_argument("--layouts", nargs="+", default=["mixed"], choices=sorted(BUILTIN_LAYOUTS))
+    ap.add_argument("--layout-file", help="JSON file with explicit per-level layouts")
+    ap.add_argument("--mode", choices=["campaign", "endless"], default="endless")
+    ap.add_argument("--max-waves", type=int, default=40)
+    ap.add_argument("--backend", choices=["python", "vectorized"], default="python")
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--chunksize", type=int, default=4)
+    ap.add_argument("--out", default="-", help="output path (.csv for CSV, otherwise JSONL); - for stdout")
+    args = ap.parse_args(argv)
+
+    grid = build_grid(args.param, args.grid)
+    layouts = load_layouts(args.layouts, args.layout_file)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+    writer = None
+    if args.out.endswith(".csv"):
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+    t0 = time.perf_counter()
+    done = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for res in pool.map(run_one, iter_jobs(args, grid, layouts), chunksize=args.chunksize):
+                if writer is not None:
+                    row = dict(res)
+                    row["overrides"] = json.dumps(row["overrides"], sort_keys=True)
+                    row["gold_curve"] = " ".join(map(str, row["gold_curve"]))
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(res, sort_keys=True) + "\n")
+                out.flush()
+                done += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"{done} runs in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# tools/bench.py
+"""Reproducible headless benchmarks for the engine update and draw hot paths.
+
+    python -m tools.bench --list
+    python -m tools.bench --scenario l3_endless_w40_shotgun --ticks 600 --out bench.json
+
+Each scenario builds a fixed game state, warms it up, then times a run of
+fixed-dt ticks. Drawing goes to an off-screen Surface through the dummy
+video driver. The report gives per-phase mean/p50/p99/max ms, entities
+updated per second and memory, as JSON, so runs on different commits can
+be diffed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+from game.constants import SCREEN_W, SCREEN_H, TICK_RATE
+from game.profiling import FrameProfiler
+from game.simulation import Simulation
+from objects.projectiles import Bullet
+from tools.batch_sim import LEVELS, make_simulation, path_hugging_layout
+
+DT = 1.0 / TICK_RATE
+
+
+# ----- state helpers (work on both backends) -----
+
+def is_vectorized(sim: Simulation) -> bool:
+    return hasattr(sim, "n_enemies")
+
+
+def entity_count(sim: Simulation) -> int:
+    return sum(sim.entity_counts()) + len(sim.towers)
+
+
+def enemy_count(sim: Simulation) -> int:
+    return sim.entity_counts()[0]
+
+
+def bullet_count(sim: Simulation) -> int:
+    return sim.entity_counts()[1]
+
+
+def place_enemy(sim: Simulation, kind: str, s: float, hp: int):
+    """Add an enemy `s` pixels along the path."""
+    table = sim.path_table
+    seg = table.segment_at(s)
+    x, y = table.point_on(seg, s)
+    sim._add_enemy(kind, float(sim.enemy_defs[kind]["speed"]), hp)
+    if is_vectorized(sim):
+        i = sim.n_enemies - 1
+        sim.e_dist[i] = s
+        sim.e_pos[i] = (x, y)
+        sim.e_path_index[i] = seg
+    else:
+        en = sim.enemies[-1]
+        en.dist = s
+        en.pos.update(x, y)
+        en.path_index = seg
+
+
+def add_bullets(sim: Simulation, rng: random.Random, count: int, dmg: int = 1):
+    pos = [(rng.uniform(30, SCREEN_W - 30), rng.uniform(30, SCREEN_H - 30)) for _ in range(count)]
+    vel = [(rng.uniform(-60, 60), rng.uniform(-60, 60)) for _ in range(count)]
+    if is_vectorized(sim):
+        import numpy as np
+        sim._push_bullets(np.array(pos), np.array(vel), np.full(count, dmg, dtype=np.int64))
+    else:
+        for p, v in zip(pos, vel):
+            sim.bullets.append(Bullet(pygame.Vector2(p), pygame.Vector2(v), dmg))
+
+
+def build_layout(sim: Simulation, layout):
+    sim.gold = 10 ** 9
+    for kind, gx, gy in layout:
+        sim.selected_tower = kind
+        sim._try_build(gx, gy)
+
+
+# ----- scenarios -----
+
+class Scenario:
+    def __init__(self, name: str, description: str, level: int, setup: Callable, refill: Optional[Callable] = None,
+                 warmup: int = 120):
+        self.name = name
+        self.description = description
+        self.level = level
+        self.setup = setup
+        self.refill = refill
+        self.warmup = warmup
+
+
+def _setup_endless_shotgun_grid(sim: Simulation, rng: random.Random):
+    sim.mode = "endless"
+    sim.current_wave_number = 40
+    sim.waves_cleared = 39
+    sim.lives = 10 ** 9
+    build_layout(sim, [("shotgun", gx, gy) for gx in range(sim.grid_w) for gy in range(sim.grid_h)])
+    sim._start_wave()
+
+
+def _refill_wave(sim: Simulation, rng: random.Random):
+    if not sim.wave_in_progress:
+        sim._start_wave()
+
+
+def _setup_500_enemies(sim: Simulation, rng: random.Random):
+    sim.lives = 10 ** 9
+    build_layout(sim, path_hugging_layout(sim, ["basic", "sniper", "shotgun"])[:24])
+    _refill_500_enemies(sim, rng)
+
+
+def _refill_500_enemies(sim: Simulation, rng: random.Random):
+    missing = 500 - enemy_count(sim)
+    for _ in range(missing):
+        place_enemy(sim, rng.choice(("fast", "tank")), rng.uniform(0, sim.path_table.length * 0.9), 10 ** 9)
+
+
+def _setup_bullets_only(sim: Simulation, rng: random.Random):
+    add_bullets(sim, rng, 10000)
+
+
+def _refill_bullets(sim: Simulation, rng: random.Random):
+    missing = 10000 - bullet_count(sim)
+    if missing > 0:
+        add_bullets(sim, rng, missing)
+
+
+SCENARIOS: Dict[str, Scenario] = {s.name: s for s in (
+    Scenario("l3_endless_w40_shotgun", "level 3, endless wave 40, shotgun on every free cell",
+             3, _setup_endless_shotgun_grid, _refill_wave, warmup=300),
+    Scenario("l1_500_enemies", "level 1, 500 unkillable enemies on the path, 24 mixed towers",
+             1, _setup_500_enemies, _refill_500_enemies),
+    Scenario("bullets_only", "level 2, 10k bullets in flight, no towers or enemies",
+             2, _setup_bullets_only, _refill_bullets, warmup=10),
+)}
+
+
+# ----- measurement -----
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ms = sorted(x * 1000.0 for x in samples)
+    return {
+        "mean_ms": round(sum(ms) / len(ms), 4),
+        "p50_ms": round(ms[len(ms) // 2], 4),
+        "p99_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 4),
+        "max_ms": round(ms[-1], 4),
+    }
+
+
+def make_state(sc: Scenario, backend: str, draw: bool, seed: int):
+    rng = random.Random(seed)
+    level = LEVELS[sc.level]
+    if draw and backend == "python":
+        from game.engine import CampusDefenseEngine
+        sim = CampusDefenseEngine(pygame.Surface((SCREEN_W, SCREEN_H)), level)
+    else:
+        sim = make_simulation(level, "campaign", backend)
+    sc.setup(sim, rng)
+    return sim, rng
+
+
+def run_scenario(sc: Scenario, ticks: int, backend: str, draw: bool, seed: int) -> Dict:
+    sim, rng = make_state(sc, backend, draw, seed)
+    for _ in range(sc.warmup):
+        sim.update(DT)
+        if sc.refill:
+            sc.refill(sim, rng)
+
+    can_draw = hasattr(sim, "draw")
+    prof = sim.profiler = FrameProfiler(history=ticks)
+    prof.enable()
+    update_times: List[float] = []
+    entities = 0
+    clock = time.perf_counter
+    for _ in range(ticks):
+        entities += entity_count(sim)
+        t0 = clock()
+        sim.update(DT)
+        update_times.append(clock() - t0)
+        if can_draw:
+            sim.draw()  # ends the profiler frame
+        else:
+            prof.end_frame()
+        if sc.refill:
+            sc.refill(sim, rng)
+    prof.enable(False)
+
+    phases = {"update": summarize(update_times)}
+    for phase in FrameProfiler.PHASES:
+        samples = prof.samples(phase)
+        if samples:
+            phases[phase] = summarize(samples)
+
+    update_total = sum(update_times)
+    result = {
+        "description": sc.description,
+        "backend": backend,
+        "ticks": ticks,
+        "phases": phases,
+        "entities_per_tick": round(entities / max(ticks, 1), 1),
+        "entities_per_second": round(entities / update_total) if update_total else None,
+    }
+
+    # Separate short pass with tracemalloc on (it would distort the timings above).
+    # Only allocations made while tracing count, so this is the per-tick churn on
+    # top of the warmed-up state; max_rss_kb is the process-wide high-water mark.
+    tracemalloc.start()
+    for _ in range(min(ticks, 30)):
+        sim.update(DT)
+        if can_draw:
+            sim.draw()
+        if sc.refill:
+            sc.refill(sim, rng)
+    result["peak_alloc_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    tracemalloc.stop()
+    result["max_rss_kb"] = max_rss_kb()
+    return result
+
+
+def max_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(rss / 1024) if sys.platform == "darwin" else int(rss)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all")
+    ap.add_argument("--ticks", type=int, default=600)
+    ap.add_argument("--backend", choices=["python", "vectorized"], default="python")
+    ap.add_argument("--no-draw", action="store_true", help="time update() only")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="-", help="JSON output path; - for stdout")
+    ap.add_argument("--list", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.list:
+        for sc in SCENARIOS.values():
+            print(f"{sc.name:28} {sc.description}")
+        return
+
+    pygame.font.init()
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        print(f"running {name} ...", file=sys.stderr)
+        report["scenarios"][name] = run_scenario(SCENARIOS[name], args.ticks, args.backend,
+                                                 not args.no_draw, args.seed)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
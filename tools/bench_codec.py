@@ -0,0 +1,155 @@
+# tools/bench_codec.py
+"""Size and speed of encoded checkpoints against the version 1 dicts.
+
+    python -m tools.bench_codec --towers 150 --out codec.json
+
+A checkpoint with `--towers` towers (build phase) and the same game saved
+mid-wave (with a full snapshot) are encoded with game.checkpoint_codec and
+pickled as dicts, the way ZODB stored them before. The report has the
+bytes of each form, encode/decode and pickle/unpickle times, and the
+FileStorage growth of `--saves` committed saves of each onto a profile.
+"""
+import argparse
+import json
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import transaction
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+
+from game import checkpoint_codec
+from game.simulation import Simulation
+from models import GameState
+from tools.batch_sim import LEVELS
+from tools.bench import git_revision, summarize
+
+# ZODB pickles records with protocol 3
+PICKLE_PROTOCOL = 3
+
+
+def build_game(level: int, towers: int, seed: int) -> Simulation:
+    rng = random.Random(seed)
+    sim = Simulation(LEVELS[level])
+    sim.gold = 10 ** 6
+    kinds = sorted(sim.tower_defs)
+    cells = [(gx, gy) for gy in range(sim.grid_h) for gx in range(sim.grid_w) if (gx, gy) not in sim.path_cells]
+    if towers > len(cells):
+        raise SystemExit(f"level {level} has room for {len(cells)} towers")
+    for gx, gy in rng.sample(cells, towers):
+        sim.selected_tower = rng.choice(kinds)
+        sim._try_build(gx, gy)
+    for t in sim.towers:
+        t.cooldown_left = rng.uniform(0, t.fire_cd)
+    return sim
+
+
+def time_calls(fn: Callable[[], object], repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def bench_form(cp: dict, repeat: int) -> Dict:
+    encoded = checkpoint_codec.encode(cp)
+    pickled = pickle.dumps(cp, PICKLE_PROTOCOL)
+    assert checkpoint_codec.encode(checkpoint_codec.decode(encoded)) == encoded
+    return {
+        "dict_pickle_bytes": len(pickled),
+        "encoded_bytes": len(encoded),
+        "ratio": round(len(encoded) / len(pickled), 3),
+        "encode": summarize(time_calls(lambda: checkpoint_codec.encode(cp), repeat)),
+        "decode": summarize(time_calls(lambda: checkpoint_codec.decode(encoded), repeat)),
+        "pickle": summarize(time_calls(lambda: pickle.dumps(cp, PICKLE_PROTOCOL), repeat)),
+        "unpickle": summarize(time_calls(lambda: pickle.loads(pickled), repeat)),
+    }
+
+
+def storage_growth(cp: dict, saves: int, workdir: str, encoded: bool) -> Dict:
+    path = os.path.join(workdir, f"{'encoded' if encoded else 'dict'}.fs")
+    db = DB(FileStorage(path))
+    conn = db.open()
+    gs = conn.root()["game_state"] = GameState()
+    profile = gs.get_or_create_profile("bench")
+    transaction.commit()
+
+    growth = []
+    times = []
+    for i in range(saves):
+        cp = dict(cp, gold=cp["gold"] + i)  # every save differs, as in play
+        size = os.path.getsize(path)
+        t0 = time.perf_counter()
+        if encoded:
+            profile.save_game(cp)
+        else:
+            profile.saved_game = cp  # how saves were stored before the codec
+        transaction.commit()
+        times.append(time.perf_counter() - t0)
+        growth.append(os.path.getsize(path) - size)
+    conn.close()
+    db.close()
+    return {"bytes_per_save": round(sum(growth) / len(growth)), "save_and_commit": summarize(times)}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--level", type=int, default=3, choices=sorted(LEVELS))
+    ap.add_argument("--towers", type=int, default=150)
+    ap.add_argument("--repeat", type=int, default=2000, help="timed encode/decode calls per form")
+    ap.add_argument("--saves", type=int, default=50, help="committed saves per storage layout")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default="-", help="JSON output path; - for stdout")
+    args = ap.parse_args(argv)
+
+    sim = build_game(args.level, args.towers, args.seed)
+    build_phase = sim._make_checkpoint()
+    sim.current_wave_number = 10
+    sim._start_wave()
+    while sim.wave_in_progress and sim.spawned_this_wave < sim.enemies_this_wave // 2:
+        sim.update(1.0 / 60)
+    sim._save_and_exit()
+    mid_wave = sim.saved_checkpoint
+    enemies, bullets = sim.entity_counts()
+
+    report = {
+        "revision": git_revision(),
+        "level": args.level,
+        "towers": args.towers,
+        "mid_wave_entities": {"enemies": enemies, "bullets": bullets},
+        "forms": {},
+        "storage": {},
+    }
+    for name, cp in (("build_phase", build_phase), ("mid_wave", mid_wave)):
+        print(f"timing {name} ...", file=sys.stderr)
+        report["forms"][name] = bench_form(cp, args.repeat)
+
+    workdir = tempfile.mkdtemp(prefix="bench_codec_")
+    try:
+        for encoded in (False, True):
+            report["storage"]["encoded" if encoded else "dict"] = storage_growth(build_phase, args.saves, workdir,
+                                                                                 encoded)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
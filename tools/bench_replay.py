@@ -0,0 +1,120 @@
+# tools/bench_replay.py
+"""Size, fast-forward speed and seek latency of recorded replays.
+
+    python -m tools.bench_replay --level 3 --waves 20 --seeks 200 --out replay.json
+    python -m tools.bench_replay --file game.replay
+
+Plays a game headless through Simulation.apply_input (the mixed path-hugging
+layout of tools.batch_sim, built between waves as gold allows, with
+`--build-seconds` of build phase before each wave) while a ReplayRecorder
+records it, or loads a replay saved with --save. The report has the encoded
+size, how long a full headless fast-forward takes and whether it reproduces
+the game, and the latency of seeks to random ticks.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from game.replay import KEYFRAME_EVERY, Replay, ReplayPlayer, ReplayRecorder
+from game.simulation import Simulation
+from tools.batch_sim import BUILTIN_LAYOUTS, LEVELS, path_hugging_layout
+from tools.bench import git_revision, summarize
+
+
+def record_game(level: int, waves: int, build_seconds: float, keyframe_every: int) -> Replay:
+    sim = Simulation(LEVELS[level])
+    recorder = ReplayRecorder(sim, keyframe_every=keyframe_every)
+    pending = path_hugging_layout(sim, BUILTIN_LAYOUTS["mixed"])
+    dt = 1.0 / recorder.replay.tick_rate
+    for _ in range(waves):
+        for _ in range(int(build_seconds / dt)):
+            if pending and sim.gold >= sim.tower_defs[pending[0][0]]["cost"]:
+                kind, gx, gy = pending.pop(0)
+                if sim.selected_tower != kind:
+                    sim.apply_input(("select", kind))
+                sim.apply_input(("build", gx, gy))
+            sim.update(dt)
+        sim.apply_input(("start",))
+        while sim.wave_in_progress and not sim.lost:
+            sim.update(dt)
+        if sim.lost:
+            break
+        if sim.victory_choice_active:
+            sim.apply_input(("endless",))
+    return recorder.finish()
+
+
+def bench_replay(replay: Replay, seeks: int, seed: int) -> Dict:
+    data = replay.encode()
+    keyframe_bytes = [len(kf[2]) for kf in replay.keyframes]
+    player = ReplayPlayer(replay, Simulation(LEVELS[replay.level_id], mode=replay.mode))
+    t0 = time.perf_counter()
+    ticks = player.run_to_end()
+    elapsed = time.perf_counter() - t0
+    matches = player.matches()
+
+    rng = random.Random(seed)
+    seek_times = []
+    resimulated = []
+    for _ in range(seeks):
+        target = rng.randint(replay.start_tick, replay.end_tick)
+        t0 = time.perf_counter()
+        resimulated.append(player.seek(target))
+        seek_times.append(time.perf_counter() - t0)
+
+    return {
+        "game_seconds": round(replay.seconds(), 1),
+        "ticks": replay.end_tick - replay.start_tick,
+        "inputs": len(replay.inputs),
+        "keyframes": len(replay.keyframes),
+        "keyframe_every": replay.keyframe_every,
+        "encoded_bytes": len(data),
+        "keyframe_bytes": {"mean": round(sum(keyframe_bytes) / len(keyframe_bytes)), "max": max(keyframe_bytes)},
+        "fast_forward": {"seconds": round(elapsed, 4), "ticks_per_second": round(ticks / elapsed),
+                         "speedup": round(replay.seconds() / elapsed, 1), "matches": matches},
+        "seek": summarize(seek_times),
+        "seek_resimulated_ticks": {"mean": round(sum(resimulated) / max(1, len(resimulated)), 1),
+                                   "max": max(resimulated, default=0)},
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--level", type=int, default=3, choices=sorted(LEVELS))
+    ap.add_argument("--waves", type=int, default=20)
+    ap.add_argument("--build-seconds", type=float, default=5.0, help="build phase before each wave")
+    ap.add_argument("--keyframe-every", type=int, default=KEYFRAME_EVERY, help="ticks between keyframes")
+    ap.add_argument("--seeks", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--file", help="benchmark this saved replay instead of recording one")
+    ap.add_argument("--save", help="also save the recorded replay to this path")
+    ap.add_argument("--out", default="-", help="JSON output path; - for stdout")
+    args = ap.parse_args(argv)
+
+    if args.file:
+        replay = Replay.load(args.file)
+    else:
+        print(f"recording {args.waves} waves on level {args.level} ...", file=sys.stderr)
+        replay = record_game(args.level, args.waves, args.build_seconds, args.keyframe_every)
+        if args.save:
+            replay.save(args.save)
+
+    report = {"revision": git_revision(), "level": replay.level_id, "mode": replay.mode,
+              "file": args.file, **bench_replay(replay, args.seeks, args.seed)}
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
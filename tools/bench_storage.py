@@ -0,0 +1,133 @@
+# tools/bench_storage.py
+"""Commit cost and file growth of recording runs on profiles with a long history.
+
+    python -m tools.bench_storage --runs 100000 --games 50 --out storage.json
+
+For each layout a profile with `--runs` runs is built in a fresh
+FileStorage and packed, then `--games` more games are recorded, one
+commit each, the way main.py does it. "list" is the old layout (one
+PersistentList of PersistentMappings, rewritten on every append), "btree"
+is the current PlayerProfile.runs LOBTree of RunRecords.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import transaction
+from BTrees.OOBTree import OOBTree
+from persistent.list import PersistentList
+from persistent.mapping import PersistentMapping
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+
+from models import GameState, PlayerProfile
+from tools.bench import git_revision, summarize
+
+BUILD_BATCH = 10000
+
+
+def legacy_record_run(profile: PlayerProfile, ts_iso: str, level: int, score: int, kills: int, won: bool):
+    """PlayerProfile.record_run as it was before runs moved to a RunTree (LOBTree)."""
+    profile.stats["games_played"] += 1
+    if won:
+        profile.stats["wins"] += 1
+    profile.stats["total_kills"] += kills
+    if score > profile.best_score_by_level.get(level, 0):
+        profile.best_score_by_level[level] = score
+    profile.runs.append(PersistentMapping({
+        "ts": ts_iso, "level": int(level), "score": int(score), "kills": int(kills), "won": bool(won),
+    }))
+
+
+def btree_record_run(profile: PlayerProfile, *args):
+    profile.record_run(*args)
+
+
+LAYOUTS: Dict[str, Callable] = {
+    "list": legacy_record_run,
+    "btree": btree_record_run,
+}
+
+
+def fake_run(i: int):
+    return f"2026-01-01 00:00:{i:06d}", 1 + i % 3, 1000 + i % 977, i % 60, i % 4 == 0
+
+
+def bench_layout(layout: str, runs: int, games: int, workdir: str) -> Dict:
+    record = LAYOUTS[layout]
+    path = os.path.join(workdir, f"{layout}.fs")
+    db = DB(FileStorage(path))
+    conn = db.open()
+    root = conn.root()
+    gs = root["game_state"] = GameState()
+    profile = gs.get_or_create_profile("bench")
+    if layout == "list":
+        profile.stats = PersistentMapping({"games_played": 0, "wins": 0, "total_kills": 0})
+        profile.best_score_by_level = OOBTree()
+        profile.runs = PersistentList()
+
+    t0 = time.perf_counter()
+    for i in range(runs):
+        record(profile, *fake_run(i))
+        # one commit for the list: committing it in batches would rewrite it every batch
+        if layout != "list" and i % BUILD_BATCH == BUILD_BATCH - 1:
+            transaction.commit()
+    transaction.commit()
+    build_s = time.perf_counter() - t0
+    db.pack()
+    base_size = os.path.getsize(path)
+
+    commit_times: List[float] = []
+    growth: List[int] = []
+    for i in range(runs, runs + games):
+        size = os.path.getsize(path)
+        t0 = time.perf_counter()
+        record(profile, *fake_run(i))
+        transaction.commit()
+        commit_times.append(time.perf_counter() - t0)
+        growth.append(os.path.getsize(path) - size)
+
+    conn.close()
+    db.close()
+    return {
+        "runs": runs,
+        "games": games,
+        "build_s": round(build_s, 2),
+        "packed_file_bytes": base_size,
+        "record_and_commit": summarize(commit_times),
+        "bytes_per_game": {"mean": round(sum(growth) / len(growth)), "max": max(growth)},
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=100000, help="history length before measuring")
+    ap.add_argument("--games", type=int, default=50, help="games recorded (and committed) while measuring")
+    ap.add_argument("--layout", action="append", choices=sorted(LAYOUTS), help="default: all")
+    ap.add_argument("--out", default="-", help="JSON output path; - for stdout")
+    args = ap.parse_args(argv)
+
+    report = {"revision": git_revision(), "layouts": {}}
+    workdir = tempfile.mkdtemp(prefix="bench_storage_")
+    try:
+        for layout in args.layout or list(LAYOUTS):
+            print(f"running {layout} ...", file=sys.stderr)
+            report["layouts"][layout] = bench_layout(layout, args.runs, args.games, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
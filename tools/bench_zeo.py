@@ -0,0 +1,174 @@
+# tools/bench_zeo.py
+"""Commit throughput and history-read latency of game clients sharing a ZEO server.
+
+    python -m tools.bench_zeo --clients 1 4 16 --seconds 10 --out zeo.json
+    python -m tools.bench_zeo --zeo 127.0.0.1:8100
+
+A FileStorage with `--users` profiles of `--history` runs each is served
+from a ZEO server thread in this process, or with --zeo filled through a
+server that is already running (say tools.serve_zeo on a scratch
+database; it must not have profiles yet). For each client count that many
+processes connect with their own ClientStorage and, until `--seconds` run
+out, record a game for a random profile (one commit, retried on
+ConflictError) and then open that profile's history: a fresh transaction,
+an emptied connection cache and the newest `--page` runs, so every read
+goes through the ZEO client cache or the server.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import transaction
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.POSException import ConflictError
+
+from models import GameState
+from storage import ZEO_CACHE_SIZE, make_storage, start_zeo_server
+from tools.bench import git_revision, summarize
+
+LEVELS = (1, 2, 3)
+
+
+def fill(db: DB, users: int, history: int, seed: int):
+    rng = random.Random(seed)
+    with db.transaction() as conn:
+        gs = conn.root()["game_state"] = GameState()
+        for u in range(users):
+            for i in range(history):
+                gs.record_run(f"bench_user{u}", f"2026-01-01 00:00:{i:06d}", rng.choice(LEVELS),
+                              rng.randint(0, 20000), rng.randint(0, 80), rng.random() < 0.3, rng.randint(1, 20))
+    db.pack()
+
+
+def client(zeo: str, index: int, users: int, seconds: float, start_at: float, cache_size: int, page: int,
+           seed: int) -> Dict:
+    db = DB(make_storage(zeo=zeo, cache_size=cache_size))
+    tm = transaction.TransactionManager()
+    conn = db.open(transaction_manager=tm)
+    rng = random.Random(seed * 1000 + index)
+    commit_times: List[float] = []
+    read_times: List[float] = []
+    retries = 0
+
+    time.sleep(max(0.0, start_at - time.time()))
+    end = start_at + seconds
+    while time.time() < end:
+        username = f"bench_user{rng.randrange(users)}"
+        args = (rng.choice(LEVELS), rng.randint(0, 20000), rng.randint(0, 80), rng.random() < 0.3, rng.randint(1, 20))
+        t0 = time.perf_counter()
+        while True:
+            try:
+                tm.begin()
+                gs = conn.root()["game_state"]
+                gs.record_run(username, time.strftime("%Y-%m-%d %H:%M:%S"), *args)
+                tm.commit()
+                break
+            except ConflictError:
+                tm.abort()
+                retries += 1
+        commit_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        tm.begin()
+        conn.cacheMinimize()
+        profile = conn.root()["game_state"].profiles[username]
+        rows = [(run.ts, run.level, run.score) for _, run in profile.runs_before(None, page)]
+        tm.abort()
+        read_times.append(time.perf_counter() - t0)
+        assert rows
+
+    conn.close()
+    db.close()
+    return {"commit_times": commit_times, "read_times": read_times, "retries": retries}
+
+
+def bench_clients(zeo: str, clients: int, args) -> Dict:
+    start_at = time.time() + 1.0 + 0.1 * clients
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(client, zeo, i, args.users, args.seconds, start_at, args.cache_size, args.page, args.seed)
+                   for i in range(clients)]
+        results = [f.result() for f in futures]
+
+    commit_times = [t for r in results for t in r["commit_times"]]
+    read_times = [t for r in results for t in r["read_times"]]
+    retries = sum(r["retries"] for r in results)
+    return {
+        "clients": clients,
+        "games": len(commit_times),
+        "commits_per_second": round(len(commit_times) / args.seconds, 1),
+        "retry_rate": round(retries / max(1, len(commit_times)), 4),
+        "record_and_commit": summarize(commit_times),
+        "history_page": summarize(read_times),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--seconds", type=float, default=10.0, help="measuring time per client count")
+    ap.add_argument("--users", type=int, default=16, help="profiles shared by the clients")
+    ap.add_argument("--history", type=int, default=1000, help="runs per profile before measuring")
+    ap.add_argument("--page", type=int, default=20, help="runs read per history page")
+    ap.add_argument("--cache-mb", type=float, default=ZEO_CACHE_SIZE / (1024 * 1024), help="ZEO client cache size")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--zeo", metavar="HOST:PORT", help="use this running ZEO server instead of starting one")
+    ap.add_argument("--out", default="-", help="JSON output path; - for stdout")
+    args = ap.parse_args(argv)
+    args.cache_size = int(args.cache_mb * 1024 * 1024)
+    # the server thread logs every queued commit lock at WARNING
+    logging.getLogger("ZEO").setLevel(logging.ERROR)
+
+    report = {"revision": git_revision(), "users": args.users, "history": args.history, "page": args.page,
+              "cache_mb": args.cache_mb, "seconds": args.seconds, "zeo": args.zeo, "runs": []}
+    workdir = None
+    stop = None
+    try:
+        if args.zeo is not None:
+            db = DB(make_storage(zeo=args.zeo, cache_size=args.cache_size))
+            with db.transaction() as conn:
+                gs = conn.root().get("game_state")
+                used = gs is not None and len(gs.profiles) > 0
+            if used:
+                db.close()
+                ap.error("the ZEO server's database already has profiles; serve an empty one")
+            zeo = args.zeo
+        else:
+            workdir = tempfile.mkdtemp(prefix="bench_zeo_")
+            path = os.path.join(workdir, "bench.fs")
+            db = DB(FileStorage(path))
+        print(f"filling {args.users} x {args.history} runs ...", file=sys.stderr)
+        try:
+            fill(db, args.users, args.history, args.seed)
+        finally:
+            db.close()
+        if args.zeo is None:
+            (host, port), stop = start_zeo_server(path)
+            zeo = f"{host}:{port}"
+        for n in args.clients:
+            print(f"running {n} clients ...", file=sys.stderr)
+            report["runs"].append(bench_clients(zeo, n, args))
+    finally:
+        if stop is not None:
+            stop()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# tools/serve_zeo.py
+"""Serve the game database over ZEO to several game instances.
+
+    python -m tools.serve_zeo --addr 127.0.0.1:8100 --path game_data.fs
+
+then start every instance with --zeo 127.0.0.1:8100.
+
+Concurrent finishes are merged on the server: ZEO loads the classes of
+the conflicting objects and calls their _p_resolveConflict (LevelRollup,
+Leaderboard, RunBucket, RunTree, Length). A plain `runzeo` started
+elsewhere cannot import `models`, skips those merges, and the clients
+get ConflictError instead. This runs runzeo with the game directory on
+its import path and checks that the classes load before serving.
+"""
+import argparse
+import os
+import sys
+
+GAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--addr", default="127.0.0.1:8100", help="HOST:PORT (or unix socket path) to listen on")
+    ap.add_argument("--path", default=os.path.join(GAME_DIR, "game_data.fs"), help="FileStorage to serve")
+    args = ap.parse_args(argv)
+
+    if GAME_DIR not in sys.path:
+        sys.path.insert(0, GAME_DIR)
+    import models  # fail now rather than on the first conflict
+
+    from ZEO import runzeo
+    runzeo.main(["-a", args.addr, "-f", args.path])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# tools/stress_profiles.py
+"""Concurrent finishes on one profile through a shared database.
+
+    python -m tools.stress_profiles --clients 8 --games 200 --users 1
+    python -m tools.stress_profiles --clients 8 --processes
+    python -m tools.stress_profiles --clients 8 --processes --zeo 127.0.0.1:8100
+
+Clients are threads sharing one DB, or with --processes separate processes
+talking to a ZEO server thread in this process, the way several game
+instances share a database. --zeo uses a server that is already running
+(say tools.serve_zeo on a scratch database) instead, which has to serve
+a database without profiles. Every client has its own connection and
+transaction manager and records
+games for the same few users as fast as it can, committing each one and
+retrying on ConflictError. Counters that resolve their own conflicts
+should leave almost nothing to retry. At the end the totals are checked
+against what the clients committed.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict
+
+import transaction
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.POSException import ConflictError
+
+from models import GameState
+from storage import make_storage, start_zeo_server
+
+LEVELS = (1, 2, 3)
+
+
+def client(db: DB, index: int, games: int, users: int, seed: int, wait: Callable[[], object]) -> Dict:
+    tm = transaction.TransactionManager()
+    conn = db.open(transaction_manager=tm)
+    rng = random.Random(seed * 1000 + index)
+    retries = Counter()
+    committed = Counter()
+    best: Dict[tuple, int] = {}
+    wait()
+
+    for i in range(games):
+        username = f"kiosk_user{rng.randrange(users)}"
+        level = rng.choice(LEVELS)
+        score = rng.randint(0, 20000)
+        kills = rng.randint(0, 80)
+        won = rng.random() < 0.3
+        while True:
+            try:
+                tm.begin()
+                gs = conn.root()["game_state"]
+                ts = time.strftime("%Y-%m-%d %H:%M:%S")
+                gs.record_run(username, ts, level, score, kills, won, waves=rng.randint(1, 20))
+                tm.commit()
+                break
+            except ConflictError as e:
+                tm.abort()
+                retries[type(e).__name__ + ":" + str(getattr(e, "class_name", None) or "?")] += 1
+
+        committed["games"] += 1
+        committed["wins"] += int(won)
+        committed["kills"] += kills
+        key = (username, level)
+        best[key] = max(best.get(key, 0), score)
+
+    conn.close()
+    return {"retries": retries, "committed": committed, "best": best}
+
+
+def process_client(zeo: str, index: int, games: int, users: int, seed: int, start_at: float) -> Dict:
+    db = DB(make_storage(zeo=zeo))
+    try:
+        return client(db, index, games, users, seed, lambda: time.sleep(max(0.0, start_at - time.time())))
+    finally:
+        db.close()
+
+
+def run_threads(db: DB, args):
+    barrier = threading.Barrier(args.clients)
+    results = [None] * args.clients
+
+    def run(i):
+        results[i] = client(db, i, args.games, args.users, args.seed, barrier.wait)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_processes(zeo: str, args):
+    start_at = time.time() + 1.0 + 0.1 * args.clients
+    with ProcessPoolExecutor(max_workers=args.clients) as pool:
+        futures = [pool.submit(process_client, zeo, i, args.games, args.users, args.seed, start_at)
+                   for i in range(args.clients)]
+        return [f.result() for f in futures]
+
+
+def check(db: DB, results) -> Dict:
+    """Compare what is stored with what the clients committed."""
+    committed = Counter()
+    best: Dict[tuple, int] = {}
+    for r in results:
+        committed.update(r["committed"])
+        for key, score in r["best"].items():
+            best[key] = max(best.get(key, 0), score)
+
+    conn = db.open()
+    gs = conn.root()["game_state"]
+    profiles = list(gs.profiles.values())
+    stored = {
+        "games": sum(p.stat("games_played") for p in profiles),
+        "wins": sum(p.stat("wins") for p in profiles),
+        "kills": sum(p.stat("total_kills") for p in profiles),
+        "runs": sum(p.run_count() for p in profiles),
+        "run_records": sum(len(p.runs) for p in profiles),
+        "global_rollup_games": sum(gs.rollup(lvl).count for lvl in LEVELS if gs.rollup(lvl) is not None),
+    }
+    boards_ok = all(gs.leaderboard(lvl).best(u) == score for (u, lvl), score in best.items())
+    conn.close()
+
+    expected = committed["games"]
+    ok = (stored["games"] == stored["runs"] == stored["run_records"] == stored["global_rollup_games"] == expected
+          and stored["wins"] == committed["wins"] and stored["kills"] == committed["kills"] and boards_ok)
+    return {"expected_games": expected, "stored": stored, "leaderboards_match": boards_ok, "consistent": ok}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--games", type=int, default=200, help="games per client")
+    ap.add_argument("--users", type=int, default=1, help="profiles shared by all clients")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--path", help="FileStorage to use (default: a fresh temporary one)")
+    ap.add_argument("--processes", action="store_true", help="one process per client, through a ZEO server")
+    ap.add_argument("--zeo", metavar="HOST:PORT", help="use this running ZEO server instead of a FileStorage")
+    args = ap.parse_args(argv)
+
+    workdir = None
+    path = args.path
+    if path is None and args.zeo is None:
+        workdir = tempfile.mkdtemp(prefix="stress_profiles_")
+        path = os.path.join(workdir, "stress.fs")
+
+    stop = None
+    zeo = args.zeo
+    if zeo is None and args.processes:
+        logging.getLogger("ZEO").setLevel(logging.ERROR)  # every queued commit lock is a WARNING
+        (host, port), stop = start_zeo_server(path)
+        zeo = f"{host}:{port}"
+    db = DB(make_storage(zeo=zeo)) if zeo is not None else DB(FileStorage(path))
+    try:
+        with db.transaction() as conn:
+            root = conn.root()
+            if "game_state" not in root:
+                root["game_state"] = GameState()
+            elif args.zeo is not None and len(root["game_state"].profiles):
+                ap.error("the ZEO server's database already has profiles; serve an empty one")
+
+        t0 = time.perf_counter()
+        results = run_processes(zeo, args) if args.processes else run_threads(db, args)
+        seconds = time.perf_counter() - t0
+
+        retries = Counter()
+        for r in results:
+            retries.update(r["retries"])
+        report = {
+            "clients": args.clients,
+            "processes": args.processes,
+            "zeo": args.zeo,
+            "games_per_client": args.games,
+            "users": args.users,
+            "seconds": round(seconds, 2),
+            "commits_per_second": round(args.clients * args.games / seconds, 1),
+            "retries": dict(retries),
+            "retry_rate": round(sum(retries.values()) / (args.clients * args.games), 4),
+        }
+        report.update(check(db, results))
+    finally:
+        db.close()
+        if stop is not None:
+            stop()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if not report["consistent"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()